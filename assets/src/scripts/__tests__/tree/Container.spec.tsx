@@ -3,39 +3,23 @@ import { render, screen } from "@testing-library/react";
 import React from "react";
 import { expect, it, vi } from "vitest";
 import { readValueFromPage } from "../../_utils";
-import Container from "../../tree/Container";
+import Container, { expandTreeTable } from "../../tree/Container";
 
 // Mock the readValueFromPage utility
 vi.mock("../../_utils", () => ({
   readValueFromPage: vi.fn(),
 }));
 
-const mockTreeData = [
-  {
-    title: "Section One",
-    children: [
-      {
-        id: "code-1",
-        name: "Code One",
-        status: "+" as const,
-        children: [],
-        depth: 0,
-      },
-    ],
-  },
-  {
-    title: "Section Two",
-    children: [
-      {
-        id: "code-2",
-        name: "Code Two",
-        status: "-" as const,
-        children: [],
-        depth: 0,
-      },
-    ],
-  },
-];
+const mockTreeData = {
+  nodes: [
+    { id: "code-1", name: "Code One", status: "+" as const, children: [] },
+    { id: "code-2", name: "Code Two", status: "-" as const, children: [] },
+  ],
+  sections: [
+    { title: "Section One", roots: [0] },
+    { title: "Section Two", roots: [1] },
+  ],
+};
 
 it("renders all sections from tree data", () => {
   // Mock the readValueFromPage to return our test data
@@ -59,7 +43,10 @@ it("renders all sections from tree data", () => {
 
 it("handles empty tree data", () => {
   // Mock empty tree data
-  (readValueFromPage as ReturnType<typeof vi.fn>).mockReturnValue([]);
+  (readValueFromPage as ReturnType<typeof vi.fn>).mockReturnValue({
+    nodes: [],
+    sections: [],
+  });
 
   render(<Container />);
 
@@ -67,3 +54,28 @@ it("handles empty tree data", () => {
   const sections = screen.queryAllByRole("region");
   expect(sections).toHaveLength(0);
 });
+
+it("expands shared subtrees for each depth they appear at", () => {
+  // a has children b and c, b has child c, and c has child d
+  const node = (id: string, children: number[]) => ({
+    id,
+    name: `Code ${id}`,
+    status: "+" as const,
+    children,
+  });
+  const [section] = expandTreeTable({
+    nodes: [node("a", [1, 2]), node("b", [2]), node("c", [3]), node("d", [])],
+    sections: [{ title: "Section", roots: [0] }],
+  });
+
+  const [a] = section.children;
+  const [b, c] = a.children;
+  expect(a.depth).toBe(0);
+  expect(b.id).toBe("b");
+  expect(c.id).toBe("c");
+  expect(c.depth).toBe(1);
+  expect(c.children[0].depth).toBe(2);
+  expect(b.children[0].id).toBe("c");
+  expect(b.children[0].depth).toBe(2);
+  expect(b.children[0].children[0].depth).toBe(3);
+});
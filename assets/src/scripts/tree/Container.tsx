@@ -9,8 +9,50 @@ interface SectionProps {
   title: string;
 }
 
+interface TreeTable {
+  nodes: {
+    id: string;
+    name: string;
+    status: CodeProps["status"];
+    children: number[];
+  }[];
+  sections: { title: string; roots: number[] }[];
+}
+
+export function expandTreeTable({
+  nodes,
+  sections,
+}: TreeTable): SectionProps[] {
+  // The page contains each code once, with the indices of its children, so
+  // that shared subtrees are not repeated.  Expand it into the nested form used
+  // by the components, building each code once for each depth it appears at.
+  const expanded = new Map<string, CodeProps>();
+
+  const expand = (ix: number, depth: number): CodeProps => {
+    const key = `${ix}:${depth}`;
+    let code = expanded.get(key);
+    if (!code) {
+      const node = nodes[ix];
+      code = {
+        id: node.id,
+        name: node.name,
+        status: node.status,
+        children: node.children.map((child) => expand(child, depth + 1)),
+        depth,
+      };
+      expanded.set(key, code);
+    }
+    return code;
+  };
+
+  return sections.map((section) => ({
+    title: section.title,
+    children: section.roots.map((ix) => expand(ix, 0)),
+  }));
+}
+
 export default function Container() {
-  const treeData = readValueFromPage("tree_data");
+  const treeData = expandTreeTable(readValueFromPage("tree_data"));
 
   return (
     <>
@@ -5,7 +5,9 @@ from django.db import transaction
 from django.db.models import Count
 from django.utils.text import slugify
 
+from codelists.listing import refresh_codelist
 from codelists.models import CodeObj, SearchResult, Status
+from codelists.search_index import unindex_codelist
 from coding_systems.base.import_data_utils import check_and_update_compatibile_versions
 from coding_systems.versioning.models import CodingSystemRelease
 
@@ -188,6 +190,8 @@ def save(*, draft):
         raise DraftNotReadyError()
     draft.status = Status.UNDER_REVIEW
     draft.save()
+    draft.cache_csv_data()
+    refresh_codelist(draft.codelist_id)
 
     # If there any more recent releases for this version's coding system, check them
     # for compatibility now that the draft has been saved for review.
@@ -213,7 +217,10 @@ def save(*, draft):
 def discard_draft(*, draft):
     """Delete draft."""
 
+    codelist_pk = draft.codelist_id
     if draft.codelist.versions.count() == 1:
+        unindex_codelist(codelist_pk)
         draft.codelist.delete()
     else:
         draft.delete()
+    refresh_codelist(codelist_pk)
@@ -13,7 +13,9 @@ def load_draft(view_fn):
     @wraps(view_fn)
     def wrapped_view(request, hash, **kwargs):
         id = unhash(hash, "CodelistVersion")
-        version = get_object_or_404(CodelistVersion, id=id)
+        version = get_object_or_404(
+            CodelistVersion.objects.with_cached_hierarchy(), id=id
+        )
         if version.is_draft:
             rsp = view_fn(request, version, **kwargs)
             # make sure the draft version has not just been discarded
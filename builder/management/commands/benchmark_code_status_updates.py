@@ -0,0 +1,104 @@
+"""
+Benchmark the incremental status propagation used by Codeset.update() (and so by
+builder.actions.update_code_statuses) against the previous implementation, which called
+Hierarchy.node_status() for every affected code.
+
+For each draft, each of the draft's highest-level included codes is excluded in turn,
+which is what happens when a user clicks a high-level concept in the builder.  This is
+the most expensive kind of update, since every descendant of the code is affected.
+
+By default the largest drafts in the given coding system are benchmarked.
+
+./manage.py benchmark_code_status_updates --coding-system snomedct --num-drafts 5
+"""
+
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count
+
+from codelists.models import CodelistVersion, Status
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument("--coding-system", default="snomedct")
+        parser.add_argument("--num-drafts", type=int, default=5)
+        parser.add_argument("--num-updates", type=int, default=10)
+        parser.add_argument(
+            "--draft", help="Hash of a single draft to benchmark", default=None
+        )
+
+    def handle(self, coding_system, num_drafts, num_updates, draft, **kwargs):
+        if draft:
+            drafts = [
+                version
+                for version in CodelistVersion.objects.filter(status=Status.DRAFT)
+                if version.hash == draft
+            ]
+            if not drafts:
+                raise CommandError(f"No draft found with hash '{draft}'")
+        else:
+            drafts = (
+                CodelistVersion.objects.filter(
+                    status=Status.DRAFT, codelist__coding_system_id=coding_system
+                )
+                .annotate(num_codes=Count("code_objs"))
+                .order_by("-num_codes")[:num_drafts]
+            )
+
+        for version in drafts:
+            self.benchmark(version, num_updates)
+
+    def benchmark(self, version, num_updates):
+        codeset = version.codeset
+        hierarchy = codeset.hierarchy
+        included = codeset.codes("+")
+        excluded = codeset.codes("-")
+
+        updates = sorted(hierarchy.filter_to_ultimate_ancestors(included))[:num_updates]
+
+        # Each implementation is timed with a hierarchy loaded afresh from the cache, so
+        # that neither benefits from ancestors and descendants memoised by the other.
+        data = version.cached_hierarchy.serialised_hierarchy
+
+        def fresh_hierarchy():
+            return type(hierarchy).from_cache(data)
+
+        previous_time = 0
+        incremental_time = 0
+        num_affected = 0
+
+        for code in updates:
+            new_included = included - {code}
+            new_excluded = excluded | {code}
+            codes_to_update = {code} | hierarchy.descendants(code)
+            num_affected += len(codes_to_update)
+
+            previous_hierarchy = fresh_hierarchy()
+            start = perf_counter()
+            previous = {
+                c: previous_hierarchy.node_status(c, new_included, new_excluded)
+                for c in codes_to_update
+            }
+            previous_time += perf_counter() - start
+
+            incremental_hierarchy = fresh_hierarchy()
+            start = perf_counter()
+            incremental = incremental_hierarchy.node_statuses(
+                codes_to_update, new_included, new_excluded
+            )
+            incremental_time += perf_counter() - start
+
+            if previous != incremental:
+                raise CommandError(
+                    f"Statuses differ for {version.hash} after excluding {code}"
+                )
+
+        self.stdout.write(
+            f"{version.hash}: {len(codeset.all_codes())} codes, {len(updates)} updates, "
+            f"{num_affected} affected codes: "
+            f"node_status {previous_time:.3f}s, node_statuses {incremental_time:.3f}s"
+        )
@@ -15,6 +15,10 @@ from django.test.client import Client
 
 from codelists.actions import export_to_builder
 from codelists.models import Codelist
+from coding_systems.snomedct.import_data import (
+    build_description_search_index,
+    build_is_a_closure,
+)
 from coding_systems.snomedct.models import Concept
 from opencodelists.tests.fixtures import build_fixtures
 
@@ -32,6 +36,9 @@ class Command(BaseCommand):
                 snomed_fixtures_path / f"{fixture_name}.snomedct_test_20200101.json",
                 database="snomedct_test_20200101",
             )
+        with connections["snomedct_test_20200101"].cursor() as cursor:
+            build_is_a_closure(cursor)
+            build_description_search_index(cursor)
 
         # we also need to load the BNF data so `build_fixtures` will work (it makes bnf fixtures as
         # well as snomed ones)
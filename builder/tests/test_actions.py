@@ -464,6 +464,7 @@ def test_save(draft_with_no_searches):
 
     assert draft.author == draft_with_no_searches.author
     assert draft.is_under_review
+    assert draft.csv_data_is_cached()
 
 
 def test_discard_draft(draft_with_complete_searches):
@@ -0,0 +1,11 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+
+def test_benchmark_code_status_updates(draft):
+    out = StringIO()
+    call_command("benchmark_code_status_updates", draft=draft.hash, stdout=out)
+
+    assert out.getvalue().startswith(f"{draft.hash}: ")
+    assert "node_statuses" in out.getvalue()
@@ -17,8 +17,12 @@ from opencodelists.models import User
 from .codeset import Codeset
 from .coding_systems import most_recent_database_alias
 from .hierarchy import Hierarchy
+from .hierarchy_cache import hierarchy_cache
+from .listing import refresh_codelist
 from .models import CachedHierarchy, Codelist, CodeObj, Handle, Status
+from .render_cache import render_cache
 from .search import do_search
+from .search_index import index_codelist, unindex_codelist
 
 
 logger = structlog.get_logger()
@@ -212,6 +216,7 @@ def create_codelist_from_scratch(
         coding_system_release=coding_system.release,
     )
     cache_hierarchy(version=version)
+    refresh_codelist(codelist.pk)
     return codelist
 
 
@@ -242,6 +247,7 @@ def _create_codelist_with_handle(
         user = User.objects.get(username=signoff["user"])
         signoff = codelist.signoffs.create(user=user, date=signoff["date"])
 
+    index_codelist(codelist.pk)
     return codelist
 
 
@@ -271,6 +277,8 @@ def create_old_style_version(
         author=author,
     )
     cache_hierarchy(version=version)
+    version.cache_csv_data()
+    refresh_codelist(codelist.pk)
     logger.info("Created Version", version_pk=version.pk)
     return version
 
@@ -430,6 +438,7 @@ def _create_version_with_codes(
                 f"\n\n{suggested_reason}"
             )
             codelist.save()
+            index_codelist(codelist.pk)
             codes = found_codes
         else:
             raise ValueError(
@@ -453,6 +462,9 @@ def _create_version_with_codes(
     )
 
     cache_hierarchy(version=clv, hierarchy=hierarchy)
+    if status != Status.DRAFT:
+        clv.cache_csv_data()
+    refresh_codelist(codelist.pk)
 
     return clv
 
@@ -550,6 +562,8 @@ def update_codelist(
     for signoff in signoffs:
         codelist.signoffs.update_or_create(user=signoff["user"], defaults=signoff)
 
+    refresh_codelist(codelist.pk)
+    index_codelist(codelist.pk)
     logger.info("Updated Codelist", codelist_pk=codelist.pk)
 
     return codelist
@@ -564,7 +578,9 @@ def publish_version(*, version):
     assert version.is_under_review
     version.status = Status.PUBLISHED
     version.save()
+    version.cache_csv_data()
     version.codelist.versions.exclude(status=Status.PUBLISHED).delete()
+    refresh_codelist(version.codelist_id)
     logger.info("Published Version", version_pk=version.pk)
 
 
@@ -577,9 +593,13 @@ def delete_version(*, version):
 
     assert version.is_under_review
 
+    render_cache.invalidate(version.pk)
     codelist = version.codelist
+    codelist_pk = codelist.pk
     if codelist.versions.count() == 1:
+        unindex_codelist(codelist_pk)
         codelist.delete()
+        refresh_codelist(codelist_pk)
         logger.info(
             "Deleted Version and Codelist",
             codelist_pk=codelist.pk,
@@ -591,6 +611,7 @@ def delete_version(*, version):
         return True
     else:
         version.delete()
+        refresh_codelist(codelist_pk)
         logger.info("Deleted Version", version_pk=version.pk)
         return False
 
@@ -653,6 +674,7 @@ def export_to_builder(*, version, author, coding_system_database_alias):
     # occur when the coding system has changed since the original version was
     # created.
     add_new_descendants(version=draft)
+    refresh_codelist(version.codelist_id)
     return draft
 
 
@@ -708,12 +730,18 @@ def cache_hierarchy(*, version, hierarchy=None):
     if hierarchy is None:
         hierarchy = version.calculate_hierarchy()
     cached_hierarchy, _ = CachedHierarchy.objects.get_or_create(version=version)
-    cached_hierarchy.data = hierarchy.data_for_cache()
+    cached_hierarchy.binary_data = hierarchy.data_for_cache()
+    cached_hierarchy.data = None
     cached_hierarchy.save()
+    version.cached_hierarchy = cached_hierarchy
+    hierarchy_cache.invalidate(version.pk)
 
 
+@transaction.atomic
 def add_codelist_tag(*, codelist, tag):
     codelist.tags.add(tag)
+    refresh_codelist(codelist.pk)
+    index_codelist(codelist.pk)
 
 
 class DuplicateHandleError(IntegrityError):
@@ -914,5 +942,7 @@ def clone_codelist(codelist, new_owner):
                     raise NotImplementedError
 
     deep_copy_related_fields(latest_version, cloned_version)
+    cloned_version.cache_csv_data()
+    refresh_codelist(cloned_codelist.pk)
 
     return cloned_codelist
@@ -16,13 +16,16 @@ requiring a new version.
 
 import json
 import re
+from functools import reduce
+from operator import or_
 
+from django.core.exceptions import BadRequest
+from django.db.models import Q
 from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from opencodelists.models import Organisation, User
-
 from .actions import (
     create_old_style_codelist,
     create_old_style_version,
@@ -32,8 +35,12 @@ from .actions import (
     update_codelist,
 )
 from .api_decorators import require_authentication, require_permission
-from .models import Codelist, CodelistVersion, Handle, Status
-from .views.decorators import load_codelist, load_owner
+from .coding_systems import most_recent_database_alias
+from .diff import diff_versions
+from .listing import build_etag, filter_records, get_listing, get_records
+from .models import CodelistVersion, Handle, Status
+from .views.decorators import load_codelist, load_owner, load_version
+from .views.version_diff import find_version_to_diff
 
 
 CODELIST_VERSION_REGEX = re.compile(
@@ -123,79 +130,17 @@ def codelists_get(request, owner=None):
             allow filtering usage stats by an OpenCodelists codelist.
     """
 
-    filter_kwargs = {}
-
-    # Only filter on parameters that are present and not the empty string.
-    if coding_system_id := request.GET.get("coding_system_id"):
-        filter_kwargs["coding_system_id"] = coding_system_id
-
-    if tag := request.GET.get("tag"):
-        filter_kwargs["tags__name"] = tag
-
-    records = []
-
-    include_user_codelists = "include-users" in request.GET
-
-    if owner is None:
-        codelists = Codelist.objects.all()
-    else:
-        codelists = owner.codelists
-
-    for cl in sorted(
-        codelists.filter(**filter_kwargs)
-        .filter(handles__is_current=True)
-        .distinct()
-        .prefetch_related("handles", "versions"),
-        key=lambda cl: cl.slug,
-    ):
-        # Only include organisaion codelists by default
-        if not include_user_codelists and not cl.organisation:
-            continue
-
-        # If an owner is specified, only return codelists for which the owner is the
-        # codelist's current owner
-        if owner is not None and cl.owner != owner:
-            continue
-
-        record = {
-            "full_slug": cl.full_slug(),
-            "slug": cl.slug,
-            "name": cl.name,
-            "coding_system_id": cl.coding_system_id,
-            "organisation": cl.organisation.name if cl.organisation else "",
-            "user": cl.user.username if cl.user else "",
-            "versions": [],
-        }
-        for version in sorted(cl.versions.all(), key=lambda v: v.created_at):
-            record["versions"].append(
-                {
-                    "hash": version.hash,
-                    "tag": version.tag,
-                    "full_slug": version.full_slug(),
-                    "status": version.status,
-                    "downloadable": version.downloadable,
-                    "updated_date": version.updated_at.date(),
-                }
-            )
-
-        if "description" in request.GET:
-            record["description"] = cl.description
-
-        if "methodology" in request.GET:
-            record["methodology"] = cl.methodology
-
-        if "references" in request.GET:
-            record["references"] = []
-            for reference in cl.references.all():
-                record["references"].append(
-                    {
-                        "text": reference.text,
-                        "url": reference.url,
-                    }
-                )
-
-        records.append(record)
-    return JsonResponse({"codelists": records})
+    # The records are built from a materialised listing (see codelists/listing.py),
+    # which is rebuilt if any codelists have changed.  Responses have an ETag, so
+    # that clients polling for changes can make conditional requests.
+    listing = get_listing()
+    etag = build_etag(listing, request.GET, owner)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        records = filter_records(get_records(listing), request.GET, owner)
+        response = JsonResponse({"codelists": records})
+    response["ETag"] = etag
+    return response
 
 
 @require_authentication
@@ -363,6 +308,38 @@ def versions(request, codelist):
     return JsonResponse({"codelist_version": clv.get_absolute_url()})
 
 
+@require_http_methods(["GET"])
+@load_version
+def version_diff(request, clv, other_tag_or_hash):
+    """Return the differences between the codes of two versions.
+
+    The other version is identified in the same way as on the version diff page.  For
+    the codes that are only in this version, only in the other version, and in both,
+    the response contains the codes, and a summary of them as a list of their ultimate
+    ancestors, each with its descendants.
+    """
+
+    other_clv = find_version_to_diff(clv, other_tag_or_hash)
+    try:
+        diff = diff_versions(clv, other_clv)
+    except BadRequest as e:
+        return error(str(e))
+
+    return JsonResponse(
+        {
+            "lhs": clv.full_slug(),
+            "rhs": other_clv.full_slug(),
+            **{
+                key: {
+                    "codes": sorted(diff[f"{key}_codes"]),
+                    "summary": diff[f"{key}_summary"],
+                }
+                for key in ["lhs_only", "rhs_only", "common"]
+            },
+        }
+    )
+
+
 def error(msg):
     return JsonResponse({"error": msg}, status=400)
 
@@ -400,14 +377,29 @@ def codelists_check(requests):
             {"status": "error", "data": {"error": "Codelists manifest file is invalid"}}
         )
 
-    codelist_download_data = {}
-    # Fetch codelist CSV data
+    line_parts = {}
     for line in study_codelists.split("\n"):
         line = line.strip().rstrip("/")
         if not line or line.startswith("#"):
             continue
         matches = CODELIST_VERSION_REGEX.match(line)
         if not matches:
+            # report this line only if all the lines before it can be found
+            line_parts[line] = None
+            continue
+        line_parts[line] = matches.groupdict()
+
+    codelist_versions = _codelist_versions_by_line(
+        {line: parts for line, parts in line_parts.items() if parts is not None}
+    )
+    latest_dmd_release = None
+    if any(version.coding_system_id == "dmd" for version in codelist_versions.values()):
+        latest_dmd_release = most_recent_database_alias("dmd")
+
+    codelist_download_data = {}
+    # Fetch codelist CSV data
+    for line, parts in line_parts.items():
+        if parts is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -416,42 +408,18 @@ def codelists_check(requests):
                     },
                 }
             )
-
-        line_parts = matches.groupdict()
-        try:
-            codelist_version = CodelistVersion.objects.get_by_hash(
-                line_parts["tag_or_hash"]
+        codelist_version = codelist_versions.get(line)
+        if codelist_version is None:
+            return JsonResponse(
+                {"status": "error", "data": {"error": f"{line} could not be found"}}
             )
-        except (CodelistVersion.DoesNotExist, ValueError):
-            # it's an old version that predates hashes, find by owner/org
-            owner = line_parts["owner"]
-            codelist_slug = line_parts["codelist_slug"]
-            try:
-                if line_parts["user"]:
-                    user = User.objects.get(username=owner)
-                    handle = Handle.objects.get(slug=codelist_slug, user=user)
-                else:
-                    organisation = Organisation.objects.get(slug=owner)
-                    handle = Handle.objects.get(
-                        slug=codelist_slug, organisation=organisation
-                    )
-                codelist_version = CodelistVersion.objects.get(
-                    codelist=handle.codelist, tag=line_parts["tag_or_hash"]
-                )
-            except (
-                User.DoesNotExist,
-                Handle.DoesNotExist,
-                Organisation.DoesNotExist,
-                CodelistVersion.DoesNotExist,
-            ):
-                return JsonResponse(
-                    {"status": "error", "data": {"error": f"{line} could not be found"}}
-                )
         if not codelist_version.downloadable:
             return JsonResponse(
                 {"status": "error", "data": {"error": f"{line} is not downloadable"}}
             )
-        codelist_download_data[line] = codelist_version.csv_data_shas()
+        codelist_download_data[line] = codelist_version.csv_data_shas(
+            latest_dmd_release=latest_dmd_release
+        )
 
     # Compare with manifest file
     # The manifest file is generated when `opensafely codelists update` is run in a study repo
@@ -487,3 +455,69 @@ def codelists_check(requests):
             }
         )
     return JsonResponse({"status": "ok"})
+
+
+def _codelist_versions_by_line(line_parts):
+    """Return dict mapping lines of a study's codelists.txt to the CodelistVersions they
+    refer to, omitting any lines that can't be found.
+
+    line_parts maps each line to the groups matched by CODELIST_VERSION_REGEX.  A line
+    refers to a version either by its hash or, for old versions that predate hashes, by
+    the version's tag.  All lines are resolved with one query for hashes, and one query
+    each for the handles and versions of any lines that aren't found by hash.
+    """
+
+    by_hash = CodelistVersion.objects.in_bulk_by_hash(
+        {parts["tag_or_hash"] for parts in line_parts.values()}
+    )
+    codelist_versions = {
+        line: by_hash[parts["tag_or_hash"]]
+        for line, parts in line_parts.items()
+        if parts["tag_or_hash"] in by_hash
+    }
+
+    # it's an old version that predates hashes, find by owner/org
+    by_tag = {
+        line: parts
+        for line, parts in line_parts.items()
+        if line not in codelist_versions
+    }
+    if not by_tag:
+        return codelist_versions
+
+    handle_filters = [
+        Q(slug=parts["codelist_slug"], user__username=parts["owner"])
+        if parts["user"]
+        else Q(slug=parts["codelist_slug"], organisation__slug=parts["owner"])
+        for parts in by_tag.values()
+    ]
+    codelist_ids = {
+        (bool(username), username or organisation_slug, slug): codelist_id
+        for slug, username, organisation_slug, codelist_id in Handle.objects.filter(
+            reduce(or_, handle_filters)
+        ).values_list("slug", "user__username", "organisation__slug", "codelist_id")
+    }
+
+    codelist_id_and_tag = {}
+    for line, parts in by_tag.items():
+        key = (bool(parts["user"]), parts["owner"], parts["codelist_slug"])
+        if key in codelist_ids:
+            codelist_id_and_tag[line] = (codelist_ids[key], parts["tag_or_hash"])
+    if not codelist_id_and_tag:
+        return codelist_versions
+
+    version_filters = [
+        Q(codelist_id=codelist_id, tag=tag)
+        for codelist_id, tag in codelist_id_and_tag.values()
+    ]
+    by_codelist_id_and_tag = {
+        (version.codelist_id, version.tag): version
+        for version in CodelistVersion.objects.select_related("codelist").filter(
+            reduce(or_, version_filters)
+        )
+    }
+    for line, key in codelist_id_and_tag.items():
+        if key in by_codelist_id_and_tag:
+            codelist_versions[line] = by_codelist_id_and_tag[key]
+
+    return codelist_versions
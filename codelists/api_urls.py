@@ -14,6 +14,10 @@ urlpatterns = [
 for subpath, view in [
     ("", api.codelists),
     ("<slug:codelist_slug>/versions/", api.versions),
+    (
+        "<slug:codelist_slug>/<str:tag_or_hash>/diff/<str:other_tag_or_hash>/",
+        api.version_diff,
+    ),
 ]:
     urlpatterns.append(
         path(
@@ -31,14 +31,18 @@ class Codeset:
 
     @classmethod
     def from_definition(cls, directly_included, directly_excluded, hierarchy):
-        """Build Codeset from definition and hierarchy."""
+        """Build Codeset from definition and hierarchy.
 
-        directly_included_or_excluded = directly_included | directly_excluded
+        The statuses of all nodes are computed in a single top-down pass over the
+        hierarchy.  Nodes which are neither directly included or excluded, and which
+        have no directly included or excluded ancestors, are not in the Codeset.
+        """
+
+        node_to_status = hierarchy.node_statuses(
+            hierarchy.nodes, directly_included, directly_excluded
+        )
         code_to_status = {
-            code: hierarchy.node_status(code, directly_included, directly_excluded)
-            for code in hierarchy.nodes
-            if code in directly_included_or_excluded
-            or hierarchy.ancestors(code) & directly_included_or_excluded
+            code: status for code, status in node_to_status.items() if status != "?"
         }
         return cls(code_to_status, hierarchy)
 
@@ -200,10 +204,9 @@ class Codeset:
             codes_to_update.add(node)
             codes_to_update |= self.hierarchy.descendants(node)
 
-        code_to_status_updates = {
-            code: self.hierarchy.node_status(code, directly_included, directly_excluded)
-            for code in codes_to_update
-        }
+        code_to_status_updates = self.hierarchy.node_statuses(
+            codes_to_update, directly_included, directly_excluded
+        )
 
         updated_code_to_status = {**self.code_to_status, **code_to_status_updates}
         return type(self)(updated_code_to_status, self.hierarchy)
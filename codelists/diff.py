@@ -0,0 +1,260 @@
+"""Compute the differences between the codes of two codelist versions.
+
+The codes that only one version has, and the codes that both have, are each summarised
+as a list of ultimate ancestors with their descendants.  Previously the hierarchy for
+each summary was built afresh with Hierarchy.from_codes(), which queries the coding
+system for the ancestors and descendants of every code.  Each version's hierarchy
+already contains its codes and all their ancestors and descendants in its coding system
+release, so the summaries are now answered from the versions' cached hierarchies: codes
+that only the left-hand version has, and codes that both have, from the left-hand
+version's hierarchy, and codes that only the right-hand version has from the right-hand
+version's.  This matches the coding system releases that each summary has always used.
+
+When the versions are from different coding system releases, a code's ancestors and
+descendants may differ between the releases, so every summary is answered from the
+two hierarchies merged (see MergedHierarchy), in which a code's ancestors and
+descendants are those it has in either release.
+
+Since a version's codes can only change while it is a draft, the diff of two versions
+that are not drafts is cached in each process by diff_cache, keyed by the pair of
+versions, with their updated_at as the revision.  Its size is set by DIFF_CACHE_SIZE,
+and a size of zero disables it.
+"""
+
+from django.core.exceptions import BadRequest
+
+from .hierarchy import Hierarchy
+from .hierarchy_cache import HierarchyCache
+
+
+diff_cache = HierarchyCache(size_setting="DIFF_CACHE_SIZE", name="diff_cache")
+
+
+def diff_versions(lhs, rhs):
+    """Return the codes that are in each of lhs and rhs, and summaries of the codes that
+    are only in lhs, only in rhs, and in both.
+
+    Raises BadRequest if the codes of an old-style version can't be identified.
+    """
+
+    if lhs.is_draft or rhs.is_draft:
+        return _diff_versions(lhs, rhs)
+
+    return diff_cache.get(
+        (lhs.pk, rhs.pk),
+        (lhs.updated_at, rhs.updated_at),
+        lambda: _diff_versions(lhs, rhs),
+    )
+
+
+def _diff_versions(lhs, rhs):
+    lhs_codes, lhs_csv_data_codes_to_terms = _get_codes(lhs)
+    rhs_codes, rhs_csv_data_codes_to_terms = _get_codes(rhs)
+
+    lhs_only_codes = lhs_codes - rhs_codes
+    rhs_only_codes = rhs_codes - lhs_codes
+    common_codes = lhs_codes & rhs_codes
+
+    lhs_hierarchy = _get_cached_hierarchy(lhs)
+    rhs_hierarchy = _get_cached_hierarchy(rhs)
+    if (
+        lhs.coding_system_release_id != rhs.coding_system_release_id
+        and lhs_hierarchy is not None
+        and rhs_hierarchy is not None
+    ):
+        lhs_hierarchy = rhs_hierarchy = MergedHierarchy(lhs_hierarchy, rhs_hierarchy)
+
+    return {
+        "lhs_codes": lhs_codes,
+        "rhs_codes": rhs_codes,
+        "lhs_only_codes": lhs_only_codes,
+        "rhs_only_codes": rhs_only_codes,
+        "common_codes": common_codes,
+        "lhs_only_summary": summarise(
+            lhs_only_codes,
+            lhs.coding_system,
+            lhs_csv_data_codes_to_terms,
+            lhs_hierarchy,
+        ),
+        "rhs_only_summary": summarise(
+            rhs_only_codes,
+            rhs.coding_system,
+            rhs_csv_data_codes_to_terms,
+            rhs_hierarchy,
+        ),
+        "common_summary": summarise(
+            common_codes,
+            lhs.coding_system,
+            lhs_csv_data_codes_to_terms,
+            lhs_hierarchy,
+        ),
+    }
+
+
+def _get_codes(clv):
+    if clv.csv_data:
+        csv_data_codes_to_terms = get_csv_data_code_to_terms(clv)
+        if csv_data_codes_to_terms is None:
+            raise BadRequest("Could not identify code columns")
+        return set(csv_data_codes_to_terms), csv_data_codes_to_terms
+    return set(clv.codes), None
+
+
+def _get_cached_hierarchy(clv):
+    if not clv.has_hierarchy or not hasattr(clv, "cached_hierarchy"):
+        return None
+    return clv.hierarchy
+
+
+class MergedHierarchy:
+    """The hierarchies of two releases of a coding system, merged so that a node's
+    ancestors and descendants are those it has in either.
+
+    This supports just the parts of the Hierarchy interface that summarise() uses, and
+    answers them from the two hierarchies, so that nothing is rebuilt.
+    """
+
+    def __init__(self, *hierarchies):
+        self.hierarchies = hierarchies
+        self.nodes = set().union(*(hierarchy.nodes for hierarchy in hierarchies))
+
+    def descendants(self, node):
+        return set().union(
+            *(
+                hierarchy.descendants(node)
+                for hierarchy in self.hierarchies
+                if node in hierarchy.nodes
+            )
+        )
+
+    def ancestors(self, node):
+        return set().union(
+            *(
+                hierarchy.ancestors(node)
+                for hierarchy in self.hierarchies
+                if node in hierarchy.nodes
+            )
+        )
+
+    def filter_to_ultimate_ancestors(self, nodes):
+        """Given a set of nodes, return subset which have no ancestors in the set."""
+
+        return {node for node in nodes if not self.ancestors(node) & nodes}
+
+
+def summarise(codes, coding_system, csv_data_codes_to_terms=None, hierarchy=None):
+    """Return a summary of codes, as a list of their ultimate ancestors, each with the
+    codes that are its descendants.
+
+    If hierarchy is given, and contains all the codes, it is used to find their
+    ancestors and descendants.  Otherwise, a hierarchy is built from the coding system.
+    """
+
+    csv_data_codes_to_terms = csv_data_codes_to_terms or {}
+    code_to_term = coding_system.code_to_term(codes)
+
+    def get_term(code):
+        term = code_to_term[code]
+        if term == "Unknown" and csv_data_codes_to_terms.get(code) is not None:
+            term = f"[Unknown] {csv_data_codes_to_terms[code]}"
+        return term
+
+    if not coding_system.is_builder_compatible():
+        # if the coding system has no hierarchy to look up, just return the codes
+        # themselves with their terms
+        summary = [{"code": code, "term": get_term(code)} for code in codes]
+    else:
+        summary = []
+        nodes = hierarchy.nodes if hierarchy is not None else set()
+        if not all(code in nodes for code in codes):
+            hierarchy = Hierarchy.from_codes(coding_system, codes)
+        ancestor_codes = hierarchy.filter_to_ultimate_ancestors(codes)
+
+        for ancestor_code in ancestor_codes:
+            descendants = sorted(
+                (
+                    {"code": code, "term": get_term(code)}
+                    for code in (
+                        hierarchy.descendants(ancestor_code) & codes - {ancestor_code}
+                    )
+                ),
+                key=lambda d: d["term"],
+            )
+            summary.append(
+                {
+                    "code": ancestor_code,
+                    "term": get_term(ancestor_code),
+                    "descendants": descendants,
+                }
+            )
+    summary.sort(key=lambda d: d["term"])
+    return summary
+
+
+def get_csv_data_code_to_terms(clv):
+    if not clv.csv_data:
+        return
+
+    # Old style codelists (i.e. those created with CSV data via the version_create view
+    # /codelist/<org or user>/add/) are now required to contain a column named "code"
+    # or "dmd_id".
+    # However, older ones could be uploaded with any column names, so we need to
+    # check the headers to identify the most likely one
+    # These represent the valid case-insensitive code column names across all existing
+    # old-style codelists
+    possible_columns_by_coding_system = {
+        "dmd": {
+            "code": ["code", "dmd_id", "id", "snomed_id", "dmd"],
+            "term": ["term", "name", "dmd_name", "nm"],
+            "type": ["dmd_type", "obj_type", "type"],
+        },
+        "snomedct": {
+            "code": ["code", "id", "snomed_id", "snomedcode", "dmd_id"],
+            "term": ["term", "name", "dmd_name"],
+        },
+        "icd10": {
+            "code": ["code", "id", "icd code", "icd_code", "icd", "icd10_code"],
+            "term": ["term", "description", "diag_desc"],
+        },
+        "ctv3": {
+            "code": ["code", "ctv3id", "ctv3code", "ctv3_id"],
+            "term": [
+                "term",
+                "ctv3preferredtermdesc",
+                "ctv3_description",
+                "ctv3_description",
+                "ctvterm",
+                "readterm",
+                "ctvterm",
+            ],
+        },
+    }
+
+    headers, *rows = clv.table
+    headers = [header.lower().strip() for header in headers]
+    possible_columns = possible_columns_by_coding_system.get(
+        clv.codelist.coding_system_id, {"code": ["code"], "term": ["term"]}
+    )
+
+    def _get_col_ix(col_type):
+        column = next(
+            (col for col in possible_columns.get(col_type, []) if col in headers), None
+        )
+        if column:
+            return headers.index(column)
+
+    code_ix = _get_col_ix("code")
+    if code_ix is None:
+        return
+    term_ix = _get_col_ix("term")
+    type_ix = _get_col_ix("type")
+
+    def get_term(row):
+        if term_ix is None:
+            return
+        term = row[term_ix]
+        if type_ix is not None:
+            term = f"{term} ({row[type_ix]})"
+        return term
+
+    return {row[code_ix]: get_term(row) for row in rows}
@@ -1,5 +1,10 @@
+import copy
 import json
-from collections import defaultdict
+import sys
+import zlib
+from array import array
+from collections import defaultdict, namedtuple
+from collections.abc import Mapping
 from itertools import chain
 
 
@@ -39,7 +44,7 @@ class Hierarchy:
 
         return (
             self.root == other.root
-            and self.nodes == other.nodes
+            and {n or "null" for n in self.nodes} == {n or "null" for n in other.nodes}
             and resolve_deser_nulls(self.child_map)
             == resolve_deser_nulls(other.child_map)
             and resolve_deser_nulls(self.parent_map)
@@ -72,6 +77,19 @@ class Hierarchy:
 
     @classmethod
     def from_cache(cls, data):
+        """Build a hierarchy from data returned by data_for_cache().
+
+        data is either bytes in the current binary format, or a str in the legacy JSON
+        format, which CachedHierarchy rows created before the binary format was
+        introduced may still contain.
+        """
+
+        if isinstance(data, str):
+            return cls._from_json_cache(data)
+        return cls._from_binary_cache(unpack_cache_data(data))
+
+    @classmethod
+    def _from_json_cache(cls, data):
         instance = cls.__new__(cls)
         data = json.loads(data)
         instance.root = data["root"]
@@ -93,26 +111,75 @@ class Hierarchy:
         instance.dirty = False
         return instance
 
+    @classmethod
+    def _from_binary_cache(cls, unpacked):
+        instance = cls.__new__(cls)
+        codes = unpacked.codes
+        instance.root = codes[unpacked.root_id]
+        instance.nodes = set(codes[: unpacked.num_nodes])
+        instance.child_map = _csr_to_map(codes, *unpacked.child_csr)
+        instance.parent_map = _csr_to_map(codes, *unpacked.parent_csr)
+        instance._descendants_cache = _csr_to_map(
+            codes, *unpacked.descendants_csr[1:], keys=unpacked.descendants_csr[0]
+        )
+        instance._ancestors_cache = _csr_to_map(
+            codes, *unpacked.ancestors_csr[1:], keys=unpacked.ancestors_csr[0]
+        )
+        instance.dirty = False
+        return instance
+
+    # Whether the memo caches are shared with a copy, and so must be copied before they
+    # are added to
+    _memo_caches_shared = False
+
+    def copy(self):
+        """Return a copy of the hierarchy with its own dirty flag.
+
+        The graph is never modified once built, so it is shared with the copy.  The memo
+        caches are also shared, until either hierarchy adds to them, when that hierarchy
+        copies them first.
+        """
+
+        instance = copy.copy(self)
+        self._memo_caches_shared = instance._memo_caches_shared = True
+        return instance
+
+    def _unshare_memo_caches(self):
+        if self._memo_caches_shared:
+            self._descendants_cache = dict(self._descendants_cache)
+            self._ancestors_cache = dict(self._ancestors_cache)
+            self._memo_caches_shared = False
+
     def data_for_cache(self):
-        data = {
-            "root": self.root,
-            "nodes": list(self.nodes),
-            "child_map": {
-                parent: list(children) for parent, children in self.child_map.items()
-            },
-            "parent_map": {
-                child: list(parents) for child, parents in self.parent_map.items()
-            },
-            "_descendants_cache": {
-                ancestor: list(descendants)
-                for ancestor, descendants in self._descendants_cache.items()
-            },
-            "_ancestors_cache": {
-                descendant: list(ancestors)
-                for descendant, ancestors in self._ancestors_cache.items()
-            },
-        }
-        return json.dumps(data)
+        """Return the hierarchy, including its memo caches, in the binary format."""
+
+        codes = list(self.nodes)
+        index = {code: node_id for node_id, code in enumerate(codes)}
+        num_nodes = len(codes)
+
+        def intern(code):
+            if code not in index:
+                index[code] = len(codes)
+                codes.append(code)
+            return index[code]
+
+        root_id = intern(self.root)
+        descendants_keys = [intern(node) for node in self._descendants_cache]
+        ancestors_keys = [intern(node) for node in self._ancestors_cache]
+
+        return pack_cache_data(
+            codes=codes,
+            num_nodes=num_nodes,
+            root_id=root_id,
+            child_csr=_map_to_csr(codes, index, self.child_map, range(num_nodes))[1:],
+            parent_csr=_map_to_csr(codes, index, self.parent_map, range(num_nodes))[1:],
+            descendants_csr=_map_to_csr(
+                codes, index, self._descendants_cache, descendants_keys
+            ),
+            ancestors_csr=_map_to_csr(
+                codes, index, self._ancestors_cache, ancestors_keys
+            ),
+        )
 
     def descendants(self, node):
         """Return set of descendants of node.
@@ -126,6 +193,7 @@ class Hierarchy:
             for child in self.child_map.get(node, []):
                 descendants.add(child)
                 descendants |= self.descendants(child)
+            self._unshare_memo_caches()
             self._descendants_cache[node] = descendants
             self.dirty = True
 
@@ -142,6 +210,7 @@ class Hierarchy:
             for parent in self.parent_map.get(node, []):
                 ancestors.add(parent)
                 ancestors |= self.ancestors(parent)
+            self._unshare_memo_caches()
             self._ancestors_cache[node] = ancestors
             self.dirty = True
 
@@ -238,3 +307,548 @@ class Hierarchy:
         # some ancestors are included and some are excluded, and neither set of
         # ancestors overrides the other
         return "!"
+
+    def node_statuses(self, nodes, included, excluded):
+        """Return mapping from each of the given nodes to its status.
+
+        This gives the same results as calling node_status() for each node, but visits
+        the nodes top-down, carrying each node's nearest included or excluded
+        ancestors to its children.  This means the work done is proportional to the
+        number of nodes, rather than to the number of nodes multiplied by the number
+        of their ancestors.
+
+        Nodes whose parents aren't in nodes have their nearest included or excluded
+        ancestors found from their ancestors, so nodes can be any set of nodes, but is
+        typically a node together with all of its descendants.
+        """
+
+        defining = included | excluded
+        nodes = set(nodes)
+
+        # maps a node to the set of its nearest ancestors that are included or excluded
+        # (the "significant" ancestors in node_status())
+        nearest = {}
+
+        def nearest_via(parent):
+            # return the nearest included or excluded ancestors of a node with the
+            # given parent, that are reached through that parent
+            if parent in defining:
+                return {parent}
+            if parent not in nearest:
+                # parent isn't being visited, so find its nearest ancestors directly
+                nearest[parent] = self._nearest(self.ancestors(parent) & defining)
+            return nearest[parent]
+
+        # count the parents of each node which also need visiting, so that a node is
+        # only visited after all of its parents have been
+        num_unvisited_parents = {
+            node: sum(1 for parent in self.parent_map.get(node, ()) if parent in nodes)
+            for node in nodes
+        }
+        to_visit = [node for node, n in num_unvisited_parents.items() if n == 0]
+
+        statuses = {}
+        while to_visit:
+            node = to_visit.pop()
+
+            candidate_sets = [
+                nearest_via(parent) for parent in self.parent_map.get(node, ())
+            ]
+            if len(candidate_sets) == 1:
+                # the common case of a node with one parent, whose nearest ancestors
+                # can be shared with the node
+                nearest[node] = candidate_sets[0]
+            else:
+                nearest[node] = self._nearest(set().union(*candidate_sets))
+
+            if node in included:
+                statuses[node] = "+"
+            elif node in excluded:
+                statuses[node] = "-"
+            else:
+                statuses[node] = _status_from_nearest(nearest[node], included)
+
+            for child in self.child_map.get(node, ()):
+                if child in num_unvisited_parents:
+                    num_unvisited_parents[child] -= 1
+                    if num_unvisited_parents[child] == 0:
+                        to_visit.append(child)
+
+        return statuses
+
+    def _nearest(self, nodes):
+        """Given a set of ancestors of some node, return the subset which are not
+        ancestors of any other node in the set."""
+
+        if len(nodes) < 2:
+            return nodes
+        return {
+            node
+            for node in nodes
+            if not any(node in self.ancestors(other) for other in nodes)
+        }
+
+
+def _status_from_nearest(nearest, included):
+    """Return the status of a node which is neither included nor excluded, given its
+    nearest included or excluded ancestors."""
+
+    if not nearest:
+        return "?"
+    num_included = len(nearest & included)
+    if num_included == len(nearest):
+        return "(+)"
+    if num_included == 0:
+        return "(-)"
+    return "!"
+
+
+class CompactHierarchy(Hierarchy):
+    """A Hierarchy that stores its graph in a compact, integer-indexed form.
+
+    Codes are interned to dense integer ids, and the parent/child adjacency is stored
+    in CSR-style arrays (an array of offsets into an array of neighbour ids) rather
+    than in dicts of sets of strings.  Memoised descendants are stored as bitsets
+    (Python ints, offset by the lowest id they contain) and memoised ancestors as
+    arrays of ids, since ancestor sets are always small.
+
+    This exposes the same API as Hierarchy, so it can be used anywhere a Hierarchy is
+    used, but uses a fraction of the memory for large hierarchies.  The memo caches are
+    not serialised by data_for_cache(), so a CompactHierarchy is never dirty.
+    """
+
+    def __init__(self, root, edges):
+        self.root = root
+
+        self._index = {}
+        self._codes = []
+        pairs = set()
+        for parent, child in edges:
+            pairs.add((self._intern(parent), self._intern(child)))
+
+        self._child_offsets, self._child_ids = _build_csr(len(self._codes), pairs)
+        self._parent_offsets, self._parent_ids = _build_csr(
+            len(self._codes), {(child, parent) for parent, child in pairs}
+        )
+
+        self.child_map = _AdjacencyMap(self, self._child_offsets, self._child_ids)
+        self.parent_map = _AdjacencyMap(self, self._parent_offsets, self._parent_ids)
+
+        self._descendant_bits_cache = {}
+        self._ancestor_ids_cache = {}
+        self.dirty = False
+
+    def _intern(self, code):
+        try:
+            return self._index[code]
+        except KeyError:
+            self._index[code] = len(self._codes)
+            self._codes.append(code)
+            return self._index[code]
+
+    @property
+    def nodes(self):
+        return self._index.keys()
+
+    @classmethod
+    def _from_json_cache(cls, data):
+        data = json.loads(data)
+        edges = (
+            (parent, child)
+            for parent, children in data["child_map"].items()
+            for child in children
+        )
+        return cls(data["root"], edges)
+
+    @classmethod
+    def _from_binary_cache(cls, unpacked):
+        # The code table and adjacency arrays are used as they are, and the memo
+        # caches are recomputed lazily.
+        instance = cls.__new__(cls)
+        instance.root = unpacked.codes[unpacked.root_id]
+        instance._codes = unpacked.codes[: unpacked.num_nodes]
+        instance._index = {
+            code: node_id for node_id, code in enumerate(instance._codes)
+        }
+        instance._child_offsets, instance._child_ids = unpacked.child_csr
+        instance._parent_offsets, instance._parent_ids = unpacked.parent_csr
+        instance.child_map = _AdjacencyMap(
+            instance, instance._child_offsets, instance._child_ids
+        )
+        instance.parent_map = _AdjacencyMap(
+            instance, instance._parent_offsets, instance._parent_ids
+        )
+        instance._descendant_bits_cache = {}
+        instance._ancestor_ids_cache = {}
+        instance.dirty = False
+        return instance
+
+    def _unshare_memo_caches(self):
+        if self._memo_caches_shared:
+            self._descendant_bits_cache = dict(self._descendant_bits_cache)
+            self._ancestor_ids_cache = dict(self._ancestor_ids_cache)
+            self._memo_caches_shared = False
+
+    def data_for_cache(self):
+        codes = list(self._codes)
+        num_nodes = len(codes)
+        if self.root in self._index:
+            root_id = self._index[self.root]
+        else:
+            root_id = len(codes)
+            codes.append(self.root)
+
+        return pack_cache_data(
+            codes=codes,
+            num_nodes=num_nodes,
+            root_id=root_id,
+            child_csr=(self._child_offsets, self._child_ids),
+            parent_csr=(self._parent_offsets, self._parent_ids),
+            descendants_csr=([], [0], []),
+            ancestors_csr=([], [0], []),
+        )
+
+    def _neighbour_ids(self, offsets, ids, node_id):
+        return ids[offsets[node_id] : offsets[node_id + 1]]
+
+    def _descendant_bits(self, node_id):
+        """Return (offset, bits) for the descendants of the node with given id."""
+
+        if node_id not in self._descendant_bits_cache:
+            found = set()
+            to_visit = [node_id]
+            while to_visit:
+                for child_id in self._neighbour_ids(
+                    self._child_offsets, self._child_ids, to_visit.pop()
+                ):
+                    if child_id not in found:
+                        found.add(child_id)
+                        to_visit.append(child_id)
+            self._unshare_memo_caches()
+            self._descendant_bits_cache[node_id] = _ids_to_bits(found)
+
+        return self._descendant_bits_cache[node_id]
+
+    def _ancestor_ids(self, node_id):
+        """Return array of the ids of the ancestors of the node with given id."""
+
+        if node_id not in self._ancestor_ids_cache:
+            found = set()
+            to_visit = [node_id]
+            while to_visit:
+                for parent_id in self._neighbour_ids(
+                    self._parent_offsets, self._parent_ids, to_visit.pop()
+                ):
+                    if parent_id not in found:
+                        found.add(parent_id)
+                        to_visit.append(parent_id)
+            self._unshare_memo_caches()
+            self._ancestor_ids_cache[node_id] = array("l", sorted(found))
+
+        return self._ancestor_ids_cache[node_id]
+
+    def _ids_for(self, nodes):
+        return {self._index[node] for node in nodes if node in self._index}
+
+    def descendants(self, node):
+        if node not in self._index:
+            return set()
+        offset, bits = self._descendant_bits(self._index[node])
+        return {self._codes[node_id] for node_id in _bits_to_ids(offset, bits)}
+
+    def ancestors(self, node):
+        if node not in self._index:
+            return set()
+        return {
+            self._codes[node_id] for node_id in self._ancestor_ids(self._index[node])
+        }
+
+    def filter_to_ultimate_ancestors(self, nodes):
+        node_ids = self._ids_for(nodes)
+        return {
+            node
+            for node in nodes
+            if node not in self._index
+            or node_ids.isdisjoint(self._ancestor_ids(self._index[node]))
+        }
+
+    def node_status(self, node, included, excluded):
+        if node in included:
+            return "+"
+        if node in excluded:
+            return "-"
+        if node not in self._index:
+            return "?"
+
+        included_ids = self._ids_for(included)
+        excluded_ids = self._ids_for(excluded)
+
+        # See Hierarchy.node_status for an explanation of the following
+        included_or_excluded_ancestor_ids = (included_ids | excluded_ids).intersection(
+            self._ancestor_ids(self._index[node])
+        )
+        if not included_or_excluded_ancestor_ids:
+            return "?"
+
+        significant_ids = {
+            ancestor_id
+            for ancestor_id in included_or_excluded_ancestor_ids
+            if not any(
+                _bits_contain(self._descendant_bits(ancestor_id), other_id)
+                for other_id in included_or_excluded_ancestor_ids
+            )
+        }
+        has_included_ancestors = not significant_ids.isdisjoint(included_ids)
+        has_excluded_ancestors = not significant_ids.isdisjoint(excluded_ids)
+
+        if has_included_ancestors and not has_excluded_ancestors:
+            return "(+)"
+        if has_excluded_ancestors and not has_included_ancestors:
+            return "(-)"
+        return "!"
+
+
+class _AdjacencyMap(Mapping):
+    """A read-only mapping from code to the set of codes adjacent to it in one
+    direction of a CompactHierarchy.
+
+    As with Hierarchy.child_map and Hierarchy.parent_map, only codes with at least one
+    neighbour are keys.
+    """
+
+    def __init__(self, hierarchy, offsets, ids):
+        self._hierarchy = hierarchy
+        self._offsets = offsets
+        self._ids = ids
+
+    def __getitem__(self, code):
+        node_id = self._hierarchy._index.get(code)
+        if node_id is None or self._offsets[node_id] == self._offsets[node_id + 1]:
+            raise KeyError(code)
+        codes = self._hierarchy._codes
+        return {
+            codes[neighbour_id]
+            for neighbour_id in self._hierarchy._neighbour_ids(
+                self._offsets, self._ids, node_id
+            )
+        }
+
+    def __iter__(self):
+        codes = self._hierarchy._codes
+        for node_id in range(len(codes)):
+            if self._offsets[node_id] != self._offsets[node_id + 1]:
+                yield codes[node_id]
+
+    def __len__(self):
+        return sum(
+            1
+            for node_id in range(len(self._offsets) - 1)
+            if self._offsets[node_id] != self._offsets[node_id + 1]
+        )
+
+
+def _build_csr(num_nodes, pairs):
+    """Build CSR-style adjacency arrays from (source id, target id) pairs.
+
+    The targets of source i are ids[offsets[i]:offsets[i + 1]].
+    """
+
+    offsets = array("l", bytes(array("l").itemsize * (num_nodes + 1)))
+    ids = array("l")
+    pairs = sorted(pairs)
+    for source, _ in pairs:
+        offsets[source + 1] += 1
+    for i in range(num_nodes):
+        offsets[i + 1] += offsets[i]
+    ids.extend(target for _, target in pairs)
+    return offsets, ids
+
+
+def _ids_to_bits(ids):
+    """Return a bitset of the given ids, as a tuple of (offset, bits)."""
+
+    if not ids:
+        return (0, 0)
+    offset = min(ids)
+    buffer = bytearray((max(ids) - offset) // 8 + 1)
+    for node_id in ids:
+        position = node_id - offset
+        buffer[position >> 3] |= 1 << (position & 7)
+    return (offset, int.from_bytes(buffer, "little"))
+
+
+def _bits_to_ids(offset, bits):
+    return [
+        offset + position
+        for position, bit in enumerate(reversed(bin(bits)[2:]))
+        if bit == "1"
+    ]
+
+
+def _bits_contain(offset_and_bits, node_id):
+    offset, bits = offset_and_bits
+    return node_id >= offset and bool(bits >> (node_id - offset) & 1)
+
+
+# Hierarchies are cached in a compact binary format, so that large hierarchies can be
+# loaded without parsing (and allocating) a large JSON document.  The format is:
+#
+#   magic (4 bytes) | format version (1 byte) | zlib-compressed body
+#
+# and the body is a sequence of little-endian uint32 values and arrays:
+#
+#   number of codes | number of nodes | root id | id of None (or NO_ID) |
+#   length of code table | code table |
+#   child adjacency (offsets, ids) | parent adjacency (offsets, ids) |
+#   descendants memo (keys, offsets, ids) | ancestors memo (keys, offsets, ids)
+#
+# The code table contains the codes, encoded as UTF-8 and separated by NUL bytes.  The
+# first "number of nodes" codes are the nodes of the hierarchy, and any others are the
+# root (if it isn't a node) or keys of the memo caches that aren't nodes.  Adjacency
+# is stored in CSR form with one offset per node, and each memo cache as CSR over its
+# keys.  Every array is preceded by its length.
+
+CACHE_MAGIC = b"OCLH"
+CACHE_FORMAT_VERSION = 1
+NO_ID = 0xFFFFFFFF
+
+_ARRAY_TYPECODE = "I"
+assert array(_ARRAY_TYPECODE).itemsize == 4
+
+UnpackedCacheData = namedtuple(
+    "UnpackedCacheData",
+    [
+        "codes",
+        "num_nodes",
+        "root_id",
+        "child_csr",
+        "parent_csr",
+        "descendants_csr",
+        "ancestors_csr",
+    ],
+)
+
+
+def pack_cache_data(
+    *,
+    codes,
+    num_nodes,
+    root_id,
+    child_csr,
+    parent_csr,
+    descendants_csr,
+    ancestors_csr,
+):
+    """Return the binary representation of a hierarchy.
+
+    See the comment above for a description of the format.
+    """
+
+    none_id = NO_ID
+    encoded_codes = []
+    for code_id, code in enumerate(codes):
+        if code is None:
+            none_id = code_id
+            encoded_codes.append(b"")
+        else:
+            encoded_codes.append(str(code).encode("utf8"))
+    code_table = b"\0".join(encoded_codes)
+
+    parts = [
+        _pack_array([len(codes), num_nodes, root_id, none_id, len(code_table)]),
+        code_table,
+    ]
+    for values in chain(child_csr, parent_csr, descendants_csr, ancestors_csr):
+        parts.append(_pack_array([len(values)]))
+        parts.append(_pack_array(values))
+
+    body = zlib.compress(b"".join(parts))
+    return CACHE_MAGIC + bytes([CACHE_FORMAT_VERSION]) + body
+
+
+def unpack_cache_data(data):
+    """Return UnpackedCacheData from the binary representation of a hierarchy."""
+
+    data = bytes(data)
+    if data[:4] != CACHE_MAGIC:
+        raise ValueError("Not a cached hierarchy")
+    if data[4] != CACHE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported cached hierarchy format version: {data[4]}")
+    body = memoryview(zlib.decompress(data[5:]))
+
+    num_codes, num_nodes, root_id, none_id, code_table_length = _unpack_array(body, 5)
+    position = 20
+    code_table = bytes(body[position : position + code_table_length])
+    position += code_table_length
+
+    codes = code_table.decode("utf8").split("\0") if num_codes else []
+    if none_id != NO_ID:
+        codes[none_id] = None
+
+    arrays = []
+    for _ in range(10):
+        (length,) = _unpack_array(body[position:], 1)
+        position += 4
+        arrays.append(_unpack_array(body[position:], length))
+        position += 4 * length
+
+    return UnpackedCacheData(
+        codes=codes,
+        num_nodes=num_nodes,
+        root_id=root_id,
+        child_csr=tuple(arrays[0:2]),
+        parent_csr=tuple(arrays[2:4]),
+        descendants_csr=tuple(arrays[4:7]),
+        ancestors_csr=tuple(arrays[7:10]),
+    )
+
+
+def _pack_array(values):
+    values = array(_ARRAY_TYPECODE, values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_array(buffer, length):
+    values = array(_ARRAY_TYPECODE)
+    values.frombytes(buffer[: 4 * length])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _map_to_csr(codes, index, mapping, key_ids):
+    """Return (keys, offsets, ids) arrays for a mapping from code to set of codes.
+
+    key_ids gives the order of the keys, as ids of codes in the code table.
+    """
+
+    keys = array(_ARRAY_TYPECODE, key_ids)
+    offsets = array(_ARRAY_TYPECODE, [0])
+    ids = array(_ARRAY_TYPECODE)
+    for key_id in keys:
+        ids.extend(sorted(index[code] for code in mapping.get(codes[key_id], ())))
+        offsets.append(len(ids))
+    return keys, offsets, ids
+
+
+def _csr_to_map(codes, offsets, ids, keys=None):
+    """Return a mapping from code to set of codes, from CSR arrays.
+
+    If keys is None, the offsets are indexed by code id, and only codes with at least
+    one value are included.
+    """
+
+    if keys is None:
+        return {
+            codes[key_id]: {
+                codes[i] for i in ids[offsets[key_id] : offsets[key_id + 1]]
+            }
+            for key_id in range(len(offsets) - 1)
+            if offsets[key_id] != offsets[key_id + 1]
+        }
+    return {
+        codes[key_id]: {codes[i] for i in ids[offsets[n] : offsets[n + 1]]}
+        for n, key_id in enumerate(keys)
+    }
@@ -0,0 +1,108 @@
+"""A process-wide LRU cache of Hierarchies loaded from CachedHierarchy rows.
+
+CodelistVersion.hierarchy is a cached_property, so without this each request that
+needs a version's hierarchy would load and parse its CachedHierarchy, even for popular
+published versions whose hierarchies never change.
+
+Entries are keyed by version id, and store a revision alongside the hierarchy.  The
+revision identifies the content of the CachedHierarchy row (see
+CodelistVersion.hierarchy), so that a hierarchy which has been recached by another
+process is not served stale.  cache_hierarchy() also invalidates entries directly.
+
+A cached hierarchy is shared by every request in the process, so it must not be
+modified.  CodelistVersion.hierarchy returns a copy of it, which fills its own memo
+caches.
+
+Each gunicorn worker has its own cache.  Its size is set by HIERARCHY_CACHE_SIZE, and
+a size of zero disables it.
+"""
+
+import threading
+from collections import OrderedDict
+
+import structlog
+from django.conf import settings
+from opentelemetry import trace
+
+
+logger = structlog.get_logger()
+
+
+class HierarchyCache:
+    """An LRU cache of values that are built for a version, such as its hierarchy.
+
+    The number of entries is read from the setting named by size_setting, and whether
+    each lookup was a hit or a miss is recorded on the current span under name.  See
+    also codelists/render_cache.py.
+    """
+
+    def __init__(self, size_setting="HIERARCHY_CACHE_SIZE", name="hierarchy_cache"):
+        self.size_setting = size_setting
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, version_id, revision, load):
+        """Return the value for the given version and revision, calling load() to
+        build it if it is not in the cache."""
+
+        maxsize = getattr(settings, self.size_setting)
+
+        with self._lock:
+            entry = self._entries.get(version_id)
+            if entry is not None and entry[0] == revision:
+                self._entries.move_to_end(version_id)
+                self.hits += 1
+                self._record("hit")
+                return entry[1]
+            self.misses += 1
+
+        self._record("miss")
+        value = load()
+        if maxsize <= 0:
+            return value
+
+        with self._lock:
+            self._entries[version_id] = (revision, value)
+            self._entries.move_to_end(version_id)
+            while len(self._entries) > maxsize:
+                evicted_version_id, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                logger.debug(
+                    "Evicted cache entry",
+                    cache=self.name,
+                    version_pk=evicted_version_id,
+                )
+
+        return value
+
+    def invalidate(self, version_id):
+        """Remove any cached value for the given version."""
+
+        with self._lock:
+            self._entries.pop(version_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _record(self, result):
+        trace.get_current_span().set_attribute(self.name, result)
+
+
+hierarchy_cache = HierarchyCache()
@@ -0,0 +1,305 @@
+"""The materialised listing of codelists that is returned by the codelists API.
+
+Building the listing means loading every codelist and version, and checking whether
+each version is downloadable, which for old-style versions means parsing their CSV
+data.  Clients such as opensafely-cli and OpenSAFELY Interactive poll the API, so
+instead the record for each codelist is stored in a CodelistsListingRecord row, and
+each request filters them.  Requests never write to the listing.
+
+The listing is kept up to date from the write paths:
+
+* Actions that change a codelist, its handles or its versions call refresh_codelist()
+  in their transaction, which writes just that codelist's row, and only if its record
+  has changed.
+* Changes made any other way (eg in the admin, or by scripts) are picked up by
+  refresh_listing(), which the refresh_codelists_listing command runs hourly.  It
+  computes a fingerprint of the codelist tables with a few aggregate queries, and if it
+  differs from the fingerprint the listing was built from, rebuilds the records, and
+  writes the rows of just those that have changed.
+
+Each response has a strong ETag derived from the listing's sha and the request's
+parameters, so that clients can make conditional requests, and get a 304 response
+without the listing's records being loaded at all.  The listing's sha is derived from
+the number of rows and when they were last written, which is a single aggregate query.
+"""
+
+import hashlib
+import json
+import threading
+
+from django.db import transaction
+from django.db.models import Count, Max
+from taggit.models import Tag, TaggedItem
+
+from opencodelists.models import Organisation, User
+
+from .models import (
+    Codelist,
+    CodelistsListing,
+    CodelistsListingRecord,
+    CodelistVersion,
+    Handle,
+    Reference,
+)
+
+
+# The parameters of a request to the codelists API that affect its response
+PARAMETERS = [
+    "coding_system_id",
+    "tag",
+    "include-users",
+    "description",
+    "methodology",
+    "references",
+]
+
+# The primary key of the single CodelistsListing row
+LISTING_PK = 1
+
+# The records of the most recently loaded listing, and its sha, which each process
+# keeps so that the records are only loaded when the listing changes
+_loaded = {"sha": None, "records": None}
+_lock = threading.Lock()
+
+
+class Listing:
+    """The state of the listing, identified by its sha.  records is None unless the
+    listing has not been built yet, when they are built in memory.  See get_records()."""
+
+    def __init__(self, sha, records=None):
+        self.sha = sha
+        self.records = records
+
+
+def get_listing():
+    """Return the Listing, without its records.
+
+    If the listing has not been built yet, its records are built in memory.
+    """
+
+    if not CodelistsListing.objects.filter(pk=LISTING_PK).values("pk").exists():
+        records = build_records()
+        return Listing(sha=build_sha(records), records=records)
+
+    return Listing(
+        sha=build_sha(
+            CodelistsListingRecord.objects.aggregate(Count("pk"), Max("updated_at"))
+        )
+    )
+
+
+def get_records(listing):
+    """Return the records of listing, loading them only if this process hasn't already
+    loaded them."""
+
+    if listing.records is not None:
+        return listing.records
+
+    with _lock:
+        sha, records = _loaded["sha"], _loaded["records"]
+    if sha == listing.sha:
+        return records
+
+    records = list(CodelistsListingRecord.objects.values_list("record", flat=True))
+    records.sort(key=record_sort_key)
+    with _lock:
+        _loaded.update(sha=listing.sha, records=records)
+    return records
+
+
+def refresh_listing():
+    """Rebuild the listing if codelists have changed since it was built, and return
+    whether it was rebuilt."""
+
+    fingerprint = build_fingerprint()
+    if (
+        CodelistsListing.objects.filter(pk=LISTING_PK, fingerprint=fingerprint)
+        .values("pk")
+        .exists()
+    ):
+        return False
+
+    records = build_records()
+    with transaction.atomic():
+        # If anything changed while the records were being built, they may already be
+        # out of date, so leave the listing to be rebuilt by the next refresh.
+        if build_fingerprint() != fingerprint:
+            return False
+        _save(records, CodelistsListingRecord.objects.all())
+        CodelistsListing.objects.update_or_create(
+            pk=LISTING_PK, defaults={"fingerprint": fingerprint}
+        )
+    return True
+
+
+def refresh_codelist(codelist_id):
+    """Replace the record for the codelist with the given id, removing it if the
+    codelist has been deleted or has no current handle.
+
+    This should be called by every action that changes a codelist, its handles or its
+    versions, in the action's transaction.  The listing's fingerprint is left alone, so
+    that any changes made other than by actions are still picked up by
+    refresh_listing().
+    """
+
+    _save(
+        build_records(Codelist.objects.filter(pk=codelist_id)),
+        CodelistsListingRecord.objects.filter(pk=codelist_id),
+    )
+
+
+def _save(records, existing):
+    """Make the rows in the existing queryset match records, writing only the rows
+    whose records have changed."""
+
+    with transaction.atomic():
+        existing_shas = dict(existing.values_list("pk", "sha"))
+        for record in records:
+            sha = build_sha(record)
+            if existing_shas.pop(record["id"], None) != sha:
+                CodelistsListingRecord.objects.update_or_create(
+                    pk=record["id"], defaults={"record": record, "sha": sha}
+                )
+        CodelistsListingRecord.objects.filter(pk__in=existing_shas).delete()
+
+
+def build_sha(data):
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, default=str).encode("utf8")
+    ).hexdigest()
+
+
+def build_fingerprint():
+    """Return a value that changes whenever the data in the listing changes.
+
+    This relies on the updated_at fields of codelists, versions and handles, and on the
+    count and the greatest id of other related objects.  Changes to a codelist's
+    references are also covered by updated_at, since they are only made by
+    update_codelist(), which saves the codelist too.  Organisations, users and tags are
+    included in full, since they have no updated_at, and their names appear in the
+    records.
+    """
+
+    aggregates = [
+        Codelist.objects.aggregate(Count("id"), Max("updated_at")),
+        CodelistVersion.objects.aggregate(Count("id"), Max("updated_at")),
+        Handle.objects.aggregate(Count("id"), Max("updated_at")),
+        Reference.objects.aggregate(Count("id"), Max("id")),
+        TaggedItem.objects.aggregate(Count("id"), Max("id")),
+        sorted(Organisation.objects.values_list("slug", "name")),
+        sorted(User.objects.values_list("username", "name")),
+        sorted(Tag.objects.values_list("id", "name")),
+    ]
+    return hashlib.sha256(
+        json.dumps(aggregates, sort_keys=True, default=str).encode("utf8")
+    ).hexdigest()
+
+
+def build_records(codelists=None):
+    """Return a record for each of codelists (or every codelist) with a current handle,
+    ordered by slug.
+
+    Each record has the codelist's data as returned by the API in "codelist", and the
+    data used to filter records, or that is returned only when requested, alongside.
+    """
+
+    if codelists is None:
+        codelists = Codelist.objects.all()
+    codelists = (
+        codelists.filter(handles__is_current=True)
+        .distinct()
+        .prefetch_related(
+            "handles__organisation",
+            "handles__user",
+            "versions",
+            "references",
+            "tags",
+        )
+    )
+
+    records = []
+    for cl in codelists:
+        versions = sorted(cl.versions.all(), key=lambda v: v.created_at)
+        records.append(
+            {
+                "id": cl.pk,
+                "codelist": {
+                    "full_slug": cl.full_slug(),
+                    "slug": cl.slug,
+                    "name": cl.name,
+                    "coding_system_id": cl.coding_system_id,
+                    "organisation": cl.organisation.name if cl.organisation else "",
+                    "user": cl.user.username if cl.user else "",
+                    "versions": [
+                        {
+                            "hash": version.hash,
+                            "tag": version.tag,
+                            "full_slug": version.full_slug(),
+                            "status": version.status,
+                            "downloadable": version.downloadable,
+                            "updated_date": version.updated_at.date().isoformat(),
+                        }
+                        for version in versions
+                    ],
+                },
+                "owner": owner_key(cl.owner),
+                "tags": sorted(tag.name for tag in cl.tags.all()),
+                "description": cl.description,
+                "methodology": cl.methodology,
+                "references": [
+                    {"text": reference.text, "url": reference.url}
+                    for reference in cl.references.all()
+                ],
+            }
+        )
+    records.sort(key=record_sort_key)
+    return records
+
+
+def record_sort_key(record):
+    return (record["codelist"]["slug"], record["id"])
+
+
+def filter_records(records, params, owner=None):
+    """Return the API response data for the records that match the parameters of a
+    request, and the owner if given."""
+
+    codelists = []
+    for record in records:
+        codelist = record["codelist"]
+
+        # Only include organisaion codelists by default
+        if "include-users" not in params and not codelist["organisation"]:
+            continue
+
+        if owner is not None and record["owner"] != owner_key(owner):
+            continue
+
+        # Only filter on parameters that are present and not the empty string.
+        if (coding_system_id := params.get("coding_system_id")) and codelist[
+            "coding_system_id"
+        ] != coding_system_id:
+            continue
+
+        if (tag := params.get("tag")) and tag not in record["tags"]:
+            continue
+
+        codelist = dict(codelist)
+        for key in ["description", "methodology", "references"]:
+            if key in params:
+                codelist[key] = record[key]
+        codelists.append(codelist)
+    return codelists
+
+
+def build_etag(listing, params, owner=None):
+    """Return a strong ETag for the response to a request with the given parameters."""
+
+    key = [listing.sha, owner and owner_key(owner)]
+    key.extend((name, params.get(name)) for name in PARAMETERS if name in params)
+    digest = hashlib.sha256(json.dumps(key).encode("utf8")).hexdigest()
+    return f'"{digest}"'
+
+
+def owner_key(owner):
+    return f"{owner._meta.model_name}:{owner.pk}"
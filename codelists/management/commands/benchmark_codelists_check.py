@@ -0,0 +1,84 @@
+"""
+Benchmark the codelists_check API endpoint, which Job Server and opensafely-cli call
+for every job request, with a study manifest of many codelists.
+
+A codelists.txt and matching codelists.json manifest are built from the most recently
+updated downloadable versions.  Each request is timed against the previous
+implementation, which looked up each line of codelists.txt with get_by_hash() and then
+called csv_data_shas(), and the number of queries made by each is reported.
+
+SHAs are computed for each version before timing, as they would have been for any
+version that has been checked or downloaded before.
+
+./manage.py benchmark_codelists_check --num-codelists 200 --repeats 5
+"""
+
+import json
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from codelists.api import codelists_check
+from codelists.models import CodelistVersion, Status
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument("--num-codelists", type=int, default=200)
+        parser.add_argument("--repeats", type=int, default=5)
+
+    def handle(self, num_codelists, repeats, **kwargs):
+        versions = []
+        for version in (
+            CodelistVersion.objects.exclude(status=Status.DRAFT)
+            .select_related("codelist")
+            .order_by("-updated_at")
+        ):
+            if version.downloadable:
+                versions.append(version)
+            if len(versions) == num_codelists:
+                break
+        if not versions:
+            raise CommandError("No downloadable codelist versions found")
+
+        lines = []
+        files = {}
+        for version in versions:
+            line = version.full_slug()
+            lines.append(line)
+            files[line.replace("/", "-") + ".csv"] = {
+                "id": line,
+                "sha": version.csv_data_shas()[0],
+            }
+        data = {"codelists": "\n".join(lines), "manifest": json.dumps({"files": files})}
+        request = RequestFactory().post("/api/v1/check/", data)
+
+        previous_time = 0
+        bulk_time = 0
+        for _ in range(repeats):
+            with CaptureQueriesContext(connection) as previous_queries:
+                start = perf_counter()
+                for version in versions:
+                    CodelistVersion.objects.get_by_hash(version.hash).csv_data_shas()
+                previous_time += perf_counter() - start
+
+            with CaptureQueriesContext(connection) as bulk_queries:
+                start = perf_counter()
+                response = codelists_check(request)
+                bulk_time += perf_counter() - start
+
+            status = json.loads(response.content)["status"]
+            if status != "ok":
+                raise CommandError(f"Unexpected response: {response.content.decode()}")
+
+        self.stdout.write(
+            f"{len(versions)} codelists, {repeats} repeats: "
+            f"per line {previous_time / repeats:.3f}s "
+            f"({len(previous_queries)} queries), "
+            f"bulk {bulk_time / repeats:.3f}s ({len(bulk_queries)} queries)"
+        )
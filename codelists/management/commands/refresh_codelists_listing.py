@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from ...listing import refresh_listing
+
+
+class Command(BaseCommand):
+    """Rebuild the codelists listing returned by the codelists API, if codelists have
+    been changed other than by actions since it was built.
+
+    This is run hourly.  See codelists/listing.py.
+    """
+
+    def handle(self, **kwargs):
+        if refresh_listing():
+            self.stdout.write("Rebuilt codelists listing")
+        else:
+            self.stdout.write("Codelists listing is up to date")
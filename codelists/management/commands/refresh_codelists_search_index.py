@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from ...search_index import refresh_search_index
+
+
+class Command(BaseCommand):
+    """Rebuild the full-text index used to search codelists, if handles, codelists or
+    their tags have been changed other than by actions since it was built.
+
+    This is run periodically.  See codelists/search_index.py.
+    """
+
+    def handle(self, **kwargs):
+        if refresh_search_index():
+            self.stdout.write("Rebuilt codelists search index")
+        else:
+            self.stdout.write("Codelists search index is up to date")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codelists', '0064_move_and_publish_ukhsa_ssi_codelists'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedhierarchy',
+            name='binary_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='cachedhierarchy',
+            name='data',
+            field=models.TextField(null=True),
+        ),
+    ]
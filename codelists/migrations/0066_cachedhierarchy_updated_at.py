@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codelists', '0065_cachedhierarchy_binary_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedhierarchy',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    # The index is rebuilt by the first refresh_codelists_search_index after the
+    # migration, since there is no fingerprint for the data it was built from yet, but
+    # it is built here so that searches work in the meantime.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS codelists_handlesearch
+            USING fts5(name, description, methodology, tags, tokenize = 'trigram')
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO codelists_handlesearch (rowid, name, description, methodology, tags)
+            SELECT
+                h.id,
+                h.name,
+                c.description,
+                c.methodology,
+                (
+                    SELECT group_concat(t.name, ', ')
+                    FROM taggit_taggeditem ti
+                    JOIN taggit_tag t ON t.id = ti.tag_id
+                    JOIN django_content_type ct ON ct.id = ti.content_type_id
+                    WHERE ct.app_label = 'codelists'
+                    AND ct.model = 'codelist'
+                    AND ti.object_id = c.id
+                )
+            FROM codelists_handle h
+            JOIN codelists_codelist c ON c.id = h.codelist_id
+            """
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS codelists_handlesearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codelists', '0067_codelistslisting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodelistSearchIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, reverse_code=drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def delete_listing(apps, schema_editor):
+    # The records are no longer stored in the listing, so it is deleted so that the
+    # next refresh_codelists_listing builds them.  Until then, the codelists API builds
+    # them for each request.
+    apps.get_model("codelists", "CodelistsListing").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codelists', '0068_codelistsearchindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodelistsListingRecord',
+            fields=[
+                ('codelist', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing_record', serialize=False, to='codelists.codelist')),
+                ('record', models.JSONField()),
+                ('sha', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='codelistslisting',
+            name='records',
+        ),
+        migrations.RemoveField(
+            model_name='codelistslisting',
+            name='sha',
+        ),
+        migrations.RunPython(delete_listing, reverse_code=migrations.RunPython.noop),
+    ]
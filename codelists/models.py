@@ -1,5 +1,6 @@
 import hashlib
 
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core.validators import MinLengthValidator, RegexValidator
 from django.db import models
@@ -13,14 +14,23 @@ from mappings.bnfdmd.mappers import bnf_to_dmd
 from mappings.dmdvmpprevmap.mappers import vmpprev_full_mappings
 from opencodelists.csv_utils import (
     csv_data_to_rows,
-    dict_rows_to_csv_data,
+    iter_csv_data,
+    iter_csv_data_rows,
+    iter_dict_rows_csv_data,
     rows_to_csv_data,
 )
 from opencodelists.hash_utils import hash, unhash
+from opencodelists.http_utils import iter_slices
 
 from .codeset import Codeset
 from .coding_systems import CODING_SYSTEMS, most_recent_database_alias
-from .hierarchy import Hierarchy
+from .hierarchy import CompactHierarchy, Hierarchy
+from .hierarchy_cache import hierarchy_cache
+
+
+# The (fixed_headers, include_mapped_vmps) arguments to
+# CodelistVersion.csv_data_for_download() for each variant of the CSV download
+DOWNLOAD_VARIANTS = [(False, True), (False, False), (True, True), (True, False)]
 
 
 class Codelist(models.Model):
@@ -351,6 +361,33 @@ class CodelistVersion(models.Model):
             id = unhash(hash, "CodelistVersion")
             return self.get(id=id)
 
+        def in_bulk_by_hash(self, hashes):
+            """Return dict mapping each of the given hashes to the CodelistVersion with
+            that hash, in a single query.
+
+            Hashes that are not valid, or that do not belong to a CodelistVersion, are
+            omitted.  Each version's codelist is fetched in the same query.
+            """
+            ids = {}
+            for version_hash in hashes:
+                try:
+                    ids[version_hash] = unhash(version_hash, "CodelistVersion")
+                except ValueError:
+                    continue
+            versions = self.select_related("codelist").in_bulk(set(ids.values()))
+            return {
+                version_hash: versions[id]
+                for version_hash, id in ids.items()
+                if id in versions
+            }
+
+        def with_cached_hierarchy(self):
+            """Return a QuerySet that fetches each version's CachedHierarchy in the
+            same query, without its data, for CodelistVersion.hierarchy."""
+            return self.select_related("cached_hierarchy").defer(
+                "cached_hierarchy__data", "cached_hierarchy__binary_data"
+            )
+
     objects = Manager()
 
     def save(self, *args, **kwargs):
@@ -502,7 +539,21 @@ class CodelistVersion(models.Model):
         It is expected that this version will already have a corresponding
         cached_hierarchy object.
         """
-        return Hierarchy.from_cache(self.cached_hierarchy.data)
+        hierarchy_cls = CompactHierarchy if settings.COMPACT_HIERARCHIES else Hierarchy
+
+        # The revision identifies the content of the CachedHierarchy.  Views load the
+        # CachedHierarchy with the version, without its data (see
+        # Manager.with_cached_hierarchy()), so that the data is only loaded and parsed
+        # if the hierarchy is not in hierarchy_cache.
+        cached_hierarchy = self.cached_hierarchy
+        hierarchy = hierarchy_cache.get(
+            self.pk,
+            (hierarchy_cls, cached_hierarchy.updated_at),
+            lambda: hierarchy_cls.from_cache(cached_hierarchy.serialised_hierarchy),
+        )
+        # The cached hierarchy may be used by other requests at the same time, so each
+        # version gets a copy, whose memo caches and dirty flag are its own.
+        return hierarchy.copy()
 
     @property
     def codeset(self):
@@ -527,19 +578,20 @@ class CodelistVersion(models.Model):
 
     @property
     def table(self):
+        return list(self.iter_table())
+
+    def iter_table(self):
+        """Yield the rows of the table, starting with the header row, one at a time."""
         if self.csv_data:
-            return self._old_style_table()
+            return iter_csv_data_rows(self.csv_data)
         else:
-            return self._new_style_table()
-
-    def _old_style_table(self):
-        return csv_data_to_rows(self.csv_data)
+            return self._iter_new_style_table()
 
-    def _new_style_table(self):
+    def _iter_new_style_table(self):
         code_to_term = self.coding_system.code_to_term(self.codes)
-        rows = [["code", "term"]]
-        rows.extend([code, code_to_term.get(code, "[Unknown]")] for code in self.codes)
-        return rows
+        yield ["code", "term"]
+        for code in self.codes:
+            yield [code, code_to_term.get(code, "[Unknown]")]
 
     @property
     def downloadable(self):
@@ -620,41 +672,134 @@ class CodelistVersion(models.Model):
           to two columns, headed "code" and "term". Note that new-style codelists, will
           always download with just "code" and "term" headers.
         """
+        csv_data = self._cached_csv_data_for_download(
+            fixed_headers, include_mapped_vmps
+        )
+        if csv_data is not None:
+            return csv_data
+        return self._build_csv_data_for_download(fixed_headers, include_mapped_vmps)
+
+    def iter_csv_data_for_download(self, fixed_headers=False, include_mapped_vmps=True):
+        """Yield the data returned by csv_data_for_download() in pieces, so that it can
+        be streamed.  If it isn't cached, it is built one row at a time, rather than all
+        at once."""
+        csv_data = self._cached_csv_data_for_download(
+            fixed_headers, include_mapped_vmps
+        )
+        if csv_data is not None:
+            yield from iter_slices(csv_data)
+        else:
+            yield from self._iter_csv_data_for_download(
+                fixed_headers, include_mapped_vmps
+            )
+
+    def _cached_csv_data_for_download(self, fixed_headers, include_mapped_vmps):
+        """Return the cached data for the download, or None if it isn't cached.
+
+        The data for every download is computed by cache_csv_data() when a version
+        leaves draft, and for dm+d versions by update_cached_download_data() when a new
+        dm+d release is imported.  So it is only missing for versions that left draft
+        before that (see the cache_csv_data script), or for dm+d versions while a new
+        release is being imported.  Then the data is built for each request, and isn't
+        saved, so that downloads never write to the database.
+        """
         dmd_version_needs_refreshed = (
             self.coding_system_id == "dmd"
             and include_mapped_vmps
             and self.cached_csv_data.get("release") != most_recent_database_alias("dmd")
         )
-        cache_key = f"download_data_fixed_headers_{fixed_headers}_include_mapped_vmps_{include_mapped_vmps}"
+        cache_key = self._download_data_cache_key(fixed_headers, include_mapped_vmps)
         if not self.cached_csv_data.get(cache_key) or dmd_version_needs_refreshed:
-            if self.csv_data:
-                dmd_with_mapped_vmps = (
-                    self.coding_system_id == "dmd" and include_mapped_vmps
+            return None
+        return self.cached_csv_data[cache_key]
+
+    @staticmethod
+    def _download_data_cache_key(fixed_headers, include_mapped_vmps):
+        return f"download_data_fixed_headers_{fixed_headers}_include_mapped_vmps_{include_mapped_vmps}"
+
+    def _download_data_release(self):
+        """Return database alias of the release that download data is built from."""
+        if self.coding_system_id == "dmd":
+            return most_recent_database_alias("dmd")
+        return self.coding_system_release.database_alias
+
+    def _build_csv_data_for_download(self, fixed_headers, include_mapped_vmps):
+        return "".join(
+            self._iter_csv_data_for_download(fixed_headers, include_mapped_vmps)
+        )
+
+    def _iter_csv_data_for_download(self, fixed_headers, include_mapped_vmps):
+        if self.csv_data:
+            dmd_with_mapped_vmps = (
+                self.coding_system_id == "dmd" and include_mapped_vmps
+            )
+            if not fixed_headers and not dmd_with_mapped_vmps:
+                return iter_slices(self.csv_data)
+            return iter_csv_data(
+                self.iter_formatted_table(
+                    fixed_headers=fixed_headers,
+                    include_mapped_vmps=include_mapped_vmps,
                 )
-                if not fixed_headers and not dmd_with_mapped_vmps:
-                    csv_data = self.csv_data
-                else:
-                    csv_data = rows_to_csv_data(
-                        self.formatted_table(
-                            fixed_headers=fixed_headers,
-                            include_mapped_vmps=include_mapped_vmps,
-                        )
-                    )
-            else:
-                csv_data = rows_to_csv_data(self.table)
-            relevant_release = (
-                most_recent_database_alias("dmd")
-                if self.coding_system_id == "dmd"
-                else self.coding_system_release.database_alias
             )
-            self.cached_csv_data.update(
-                {
-                    cache_key: csv_data,
-                    "release": relevant_release,
-                }
+        return iter_csv_data(self.iter_table())
+
+    def csv_data_is_cached(self):
+        """Return whether the data for every variant of the CSV download, and the shas,
+        have been cached by cache_csv_data()."""
+        return "shas" in self.cached_csv_data and all(
+            self._download_data_cache_key(fixed_headers, include_mapped_vmps)
+            in self.cached_csv_data
+            for fixed_headers, include_mapped_vmps in DOWNLOAD_VARIANTS
+        )
+
+    def cache_csv_data(self):
+        """Compute and store the data for every variant of the CSV download, and the
+        shas that are valid for it, so that downloading and checking this version don't
+        need to write to the database.
+
+        This should be called by every action that moves a version out of draft, and
+        for dm+d versions, after each new dm+d release is imported.
+        """
+
+        if not self.downloadable:
+            return
+
+        self.cached_csv_data = self.build_cached_csv_data()
+        self.save()
+
+    def build_cached_csv_data(self):
+        """Return the data stored by cache_csv_data(), without saving it."""
+
+        cached_csv_data = {"release": self._download_data_release()}
+        for fixed_headers, include_mapped_vmps in DOWNLOAD_VARIANTS:
+            cache_key = self._download_data_cache_key(
+                fixed_headers, include_mapped_vmps
+            )
+            cached_csv_data[cache_key] = self._build_csv_data_for_download(
+                fixed_headers, include_mapped_vmps
             )
-            self.save()
-        return self.cached_csv_data[cache_key]
+
+        cached_csv_data["shas"] = self._build_csv_data_shas(
+            cached_csv_data[
+                self._download_data_cache_key(
+                    fixed_headers=False, include_mapped_vmps=True
+                )
+            ]
+        )
+        return cached_csv_data
+
+    def _build_csv_data_shas(self, current_csv_data_download=None):
+        """Return the shas returned by csv_data_shas(), computed from the data for the
+        default download, which is built if it isn't given."""
+
+        if current_csv_data_download is None:
+            current_csv_data_download = self._build_csv_data_for_download(
+                fixed_headers=False, include_mapped_vmps=True
+            )
+        shas = [self.csv_data_sha(csv_data=current_csv_data_download)]
+        if self.coding_system_id == "dmd":
+            shas = self._get_dmd_shas(shas, current_csv_data_download)
+        return shas
 
     def csv_data_sha(self, csv_data=None):
         """
@@ -735,7 +880,7 @@ class CodelistVersion(models.Model):
             shas.append(self.csv_data_sha(fixed_header_data_with_original_code))
         return shas
 
-    def csv_data_shas(self):
+    def csv_data_shas(self, latest_dmd_release=None):
         """
         Return a list of shas that should all be considered valid when
         checked against the downloaded data in a study repo.
@@ -745,30 +890,29 @@ class CodelistVersion(models.Model):
         when draft).
 
         For dm+d codelists, we only need to re-compute the shas if the dmd release has changed
-        since the last time they were computed.
+        since the last time they were computed.  Callers checking many versions can pass
+        the database alias of the latest dm+d release as latest_dmd_release, so that it
+        is only looked up once.
+
+        As with csv_data_for_download(), shas that need to be re-computed aren't saved,
+        so that checking a version never writes to the database.
         """
+        if self.coding_system_id == "dmd" and latest_dmd_release is None:
+            latest_dmd_release = most_recent_database_alias("dmd")
         if not self.cached_csv_data.get("shas") or (
             self.coding_system_id == "dmd"
-            and self.cached_csv_data.get("release") != most_recent_database_alias("dmd")
+            and self.cached_csv_data.get("release") != latest_dmd_release
         ):
-            # reset the cache so we refresh any stored dmd data
-            self.cached_csv_data = {}
-
-            current_csv_data_download = self.csv_data_for_download()
-            shas = [self.csv_data_sha(csv_data=current_csv_data_download)]
-            if self.coding_system_id == "dmd":
-                shas = self._get_dmd_shas(shas, current_csv_data_download)
-            # Re-fetching the CSV data sets the cached data and the release
-            # (to the latest (for dm+d) or to the relevant release for this
-            # codelist version), so we only need to update the shas now
-            self.cached_csv_data.update({"shas": shas})
-            self.save()
+            return self._build_csv_data_shas()
 
         return self.cached_csv_data["shas"]
 
     def formatted_table(self, fixed_headers=False, include_mapped_vmps=False):
+        return list(self.iter_formatted_table(fixed_headers, include_mapped_vmps))
+
+    def iter_formatted_table(self, fixed_headers=False, include_mapped_vmps=False):
         """
-        Format the table data for download
+        Format the table data for download, one row at a time
         Table data will always include a "code" and "term" column (if it exists in the
         original data) extracted from the original csv data. These may be labelled
         with different headers in the original CSV.
@@ -783,7 +927,8 @@ class CodelistVersion(models.Model):
         VMPs
         """
 
-        header_row = [header.lower() for header in self.table[0]]
+        rows = self.iter_table()
+        header_row = [header.lower() for header in next(rows)]
         # Find the first matching header from the possible code and term column headers for this
         # codelist's coding system.  These are listed in order of assumed most-to-least likely,
         # in case of multiple matching headers
@@ -806,13 +951,15 @@ class CodelistVersion(models.Model):
             header_row.index(original_term_header) if original_term_header else None
         )
 
-        table_rows = self.table[1:]
         if include_mapped_vmps and self.coding_system_id == "dmd":
-            # ignore include_mapped_vmps if coding system is anything other than dmd
+            # ignore include_mapped_vmps if coding system is anything other than dmd.
+            # Every row is needed to find the mapped VMPs.
+            table_rows = list(rows)
             additional_table_rows = self._get_additional_rows_for_mapped_vmps(
                 table_rows, code_header_index, term_header_index
             )
         else:
+            table_rows = rows
             additional_table_rows = []
 
         headers = ["code", "term"]
@@ -861,18 +1008,11 @@ class CodelistVersion(models.Model):
         # set the term to an empty string. Additional mapped VMPs will set it to the
         # description generated by the mapping (which will be in the last column of
         # data, if there no original column to map it into)
-        table_data = [
-            headers,
-            *[_csv_row(row, term_ix=term_header_index) for row in table_rows],
-        ]
-        table_data.extend(
-            [
-                _csv_row(row, term_ix=term_header_index or -1)
-                for row in additional_table_rows
-            ],
-        )
-
-        return table_data
+        yield headers
+        for row in table_rows:
+            yield _csv_row(row, term_ix=term_header_index)
+        for row in additional_table_rows:
+            yield _csv_row(row, term_ix=term_header_index or -1)
 
     def _get_additional_rows_for_mapped_vmps(self, table_rows, code_ix, term_ix):
         """
@@ -954,12 +1094,19 @@ class CodelistVersion(models.Model):
         return additional_rows
 
     def dmd_csv_data_for_download(self, dmd_database_alias=None):
+        return "".join(self.iter_dmd_csv_data_for_download(dmd_database_alias))
+
+    def iter_dmd_csv_data_for_download(self, dmd_database_alias=None):
+        """Yield the CSV data of the dm+d products that this BNF version's codes map to,
+        one line at a time, so that it can be streamed."""
         assert self.coding_system_id == "bnf"
         dmd_coding_system = CODING_SYSTEMS["dmd"].get_by_release_or_most_recent(
             dmd_database_alias
         )
         headers = ["dmd_type", "dmd_id", "dmd_name", "bnf_code"]
-        return dict_rows_to_csv_data(headers, bnf_to_dmd(self.codes, dmd_coding_system))
+        yield from iter_dict_rows_csv_data(
+            headers, bnf_to_dmd(self.codes, dmd_coding_system)
+        )
 
     def download_filename(self):
         if self.codelist_type == "user":
@@ -981,7 +1128,12 @@ class CodelistVersion(models.Model):
 
 
 class CachedHierarchy(models.Model):
-    """A model to store a JSON representation of a version's hierarchy.
+    """A model to store a serialised representation of a version's hierarchy.
+
+    New hierarchies are stored in binary_data, in the format written by
+    Hierarchy.data_for_cache().  Hierarchies cached before the binary format was
+    introduced are stored as JSON in data, until they are converted by the
+    convert_cached_hierarchies_to_binary script.
 
     There is no technical reason why data is not a column on CodelistVersion.  However,
     putting it in a separate table makes it easier to do "select * from
@@ -991,7 +1143,18 @@ class CachedHierarchy(models.Model):
     version = models.OneToOneField(
         "CodelistVersion", related_name="cached_hierarchy", on_delete=models.CASCADE
     )
-    data = models.TextField()
+    data = models.TextField(null=True)
+    binary_data = models.BinaryField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def serialised_hierarchy(self):
+        """Return whichever of binary_data or data is populated, suitable for passing
+        to Hierarchy.from_cache()."""
+
+        if self.binary_data is not None:
+            return bytes(self.binary_data)
+        return self.data
 
 
 class CodeObj(models.Model):
@@ -1098,3 +1261,55 @@ class Collaboration(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+
+class CodelistsListing(models.Model):
+    """The state of the listing of codelists that is returned by the codelists API.
+
+    The records themselves are stored in CodelistsListingRecord, so this records the
+    fingerprint of the data they were last all built from, so that they are rebuilt
+    when codelists, versions or their related objects change.  See
+    codelists/listing.py.
+    """
+
+    # identifies the state of the data that records were built from
+    fingerprint = models.CharField(max_length=64)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class CodelistsListingRecord(models.Model):
+    """The data about a codelist that is returned by the codelists API.
+
+    Building this is expensive, since it includes whether each version is
+    downloadable, so it is materialised, and replaced when the codelist, its versions
+    or their related objects change.  See codelists/listing.py.
+    """
+
+    codelist = models.OneToOneField(
+        "Codelist",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="listing_record",
+    )
+    record = models.JSONField()
+    # sha of record, so that the row is only written when the record changes
+    sha = models.CharField(max_length=64)
+
+    # with the number of rows, identifies the state of the listing, from which the
+    # ETags of API responses are derived
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+
+class CodelistSearchIndex(models.Model):
+    """The state of the full-text index used to search codelists.
+
+    The index itself is an FTS5 table, which Django cannot manage, so this records the
+    fingerprint of the data it was built from, so that it is rebuilt when handles,
+    codelists or their tags change.  See codelists/search_index.py.
+    """
+
+    # identifies the state of the data that the index was built from
+    fingerprint = models.CharField(max_length=64)
+
+    updated_at = models.DateTimeField(auto_now=True)
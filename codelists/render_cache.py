@@ -0,0 +1,24 @@
+"""A process-wide LRU cache of the data rendered on the page for a version.
+
+Building the tree, the search results, and the table for a version's page means
+looking up the term for every code in its hierarchy, which is slow for large
+codelists.  Only versions that are not drafts have pages, and their codes do not
+change, so the data only needs to be rebuilt when the version is changed.
+
+Entries are keyed by version id, and store a revision alongside the data.  The revision
+is the version's updated_at, which changes whenever the version is saved (for instance,
+when its status changes), and the id of its coding system release.  delete_version()
+also invalidates entries directly.
+
+Entries are not invalidated when a version's hierarchy is recached, which happens after
+its first few views to store the descendants and ancestors computed while rendering,
+since that doesn't change the hierarchy's nodes or edges.
+
+Each gunicorn worker has its own cache.  Its size is set by RENDER_CACHE_SIZE, and a
+size of zero disables it.
+"""
+
+from .hierarchy_cache import HierarchyCache
+
+
+render_cache = HierarchyCache(size_setting="RENDER_CACHE_SIZE", name="render_cache")
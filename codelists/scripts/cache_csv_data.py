@@ -0,0 +1,45 @@
+"""
+Cache the CSV download data and shas for every version that has left draft.
+
+The data for every variant of the CSV download, and the shas that codelists_check
+compares against, are now computed when a version leaves draft (see
+CodelistVersion.cache_csv_data()).  Versions that left draft before this change only
+may only have the data for downloads that were requested before then, and the data
+for the rest is computed during each request.  This script computes and stores it.  It
+is safe to run more than once.
+
+./manage.py runscript cache_csv_data
+"""
+
+import csv
+from traceback import print_exception
+
+from codelists.models import CodelistVersion, Status
+
+
+def run():
+    # Each version is saved as it is cached, so rather than iterating over the versions
+    # while saving them, which isn't safe with SQLite, we find their ids first.
+    version_ids = list(
+        CodelistVersion.objects.exclude(status=Status.DRAFT)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+    n = 0
+    for version_id in version_ids:
+        version = CodelistVersion.objects.select_related("codelist").get(pk=version_id)
+        if version.csv_data_is_cached() or not version.downloadable:
+            continue
+        try:
+            version.cache_csv_data()
+        # Old-style versions' CSV data is unchecked, and may be malformed, or have no
+        # recognisable code column (which raises RuntimeError, since the table is
+        # formatted by a generator).
+        except (csv.Error, LookupError, RuntimeError, ValueError) as e:
+            print(f"Error caching CSV data for {version.pk}")
+            print_exception(e)
+            continue
+        n += 1
+
+    print(f"Cached CSV data for {n} versions")
@@ -0,0 +1,65 @@
+"""
+Convert CachedHierarchy rows from the legacy JSON format to the binary format.
+
+Hierarchies are now cached in a binary format (see Hierarchy.data_for_cache()), but
+rows created before this change still hold JSON in CachedHierarchy.data.  These are
+still readable, but are slower to load and take more space, so this script rewrites
+them in the binary format.  It is safe to run more than once.
+
+./manage.py runscript convert_cached_hierarchies_to_binary
+"""
+
+from traceback import print_exception
+
+from django.utils import timezone
+
+from codelists.hierarchy import Hierarchy
+from codelists.models import CachedHierarchy
+
+
+BATCH_SIZE = 100
+
+
+def run():
+    to_convert = CachedHierarchy.objects.filter(binary_data__isnull=True).exclude(
+        data__isnull=True
+    )
+
+    # The rows are updated in batches, so rather than iterating over the rows while
+    # updating them, which isn't safe with SQLite, we find their ids first.
+    ids = list(to_convert.order_by("pk").values_list("pk", flat=True))
+
+    print(f"{len(ids)} CachedHierarchies to convert")
+
+    n = 0
+
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = []
+        for cached_hierarchy in to_convert.filter(
+            pk__in=ids[start : start + BATCH_SIZE]
+        ):
+            try:
+                hierarchy = Hierarchy.from_cache(cached_hierarchy.data)
+                cached_hierarchy.binary_data = hierarchy.data_for_cache()
+                cached_hierarchy.data = None
+            # the legacy JSON may be malformed
+            except (LookupError, TypeError, ValueError) as e:
+                print(f"Error converting hierarchy for {cached_hierarchy.version_id}")
+                print_exception(e)
+                continue
+
+            batch.append(cached_hierarchy)
+
+        n += _save(batch)
+
+    print(f"{n} CachedHierarchies successfully converted")
+
+
+def _save(batch):
+    # bulk_update() doesn't set auto_now fields, but updated_at is the revision of the
+    # hierarchy in hierarchy_cache, so we set it explicitly.
+    now = timezone.now()
+    for cached_hierarchy in batch:
+        cached_hierarchy.updated_at = now
+    CachedHierarchy.objects.bulk_update(batch, ["data", "binary_data", "updated_at"])
+    return len(batch)
@@ -0,0 +1,277 @@
+"""The full-text index used to search codelists by their handles' names, and their
+descriptions, methodologies and tags.
+
+Previously a search filtered handles with an icontains lookup on each column for each
+term, so that every search scanned every handle and codelist several times.  Instead,
+there is a row for each handle in an FTS5 table, using the trigram tokenizer so that it
+can find any substring (of at least three characters) in the same way as icontains.
+The index finds the candidate rows, which are then checked with LIKE, so that the
+results match exactly what icontains would match.
+
+The index is kept up to date from the write paths.  Actions that change a codelist's
+handles, description, methodology or tags call index_codelist() in their transaction,
+which replaces the rows for just that codelist's handles, and actions that delete a
+codelist call unindex_codelist() to remove them.  Changes made any other way
+(eg in the admin, or renaming a tag) are picked up by refresh_search_index(), which the
+refresh_codelists_search_index command runs periodically.  It computes a fingerprint of
+the tables the index is built from, and if it differs from the fingerprint the index
+was last built from, rebuilds the index.  Searches never write.
+
+Results are ranked in tiers:
+
+1. The whole query is in the name
+2. All terms are in the name
+3. Any term is in the name
+4. Any term is in the description
+5. Terms are only in the methodology or tags
+
+Within a tier, results are ordered by their BM25 score, and then by name.
+"""
+
+import hashlib
+import json
+
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.db.models.expressions import RawSQL
+from taggit.models import Tag, TaggedItem
+
+from opencodelists.db_utils import fts_phrase, like_contains_sql
+
+from .models import Codelist, CodelistSearchIndex, Handle
+
+
+# The FTS5 table, which has a row for each handle, with the handle's id as its rowid
+SEARCH_TABLE = "codelists_handlesearch"
+
+COLUMNS = ["name", "description", "methodology", "tags"]
+
+# The primary key of the single CodelistSearchIndex row
+SEARCH_INDEX_PK = 1
+
+
+def search(handles, terms, phrase):
+    """Return the handles that contain each of terms in any indexed column, ordered by
+    rank.
+
+    phrase is the whole query, which ranks highest when it is in a handle's name.
+    """
+
+    where, params = _where_sql(terms)
+    match = _match_query(terms)
+    if match:
+        where = f"{SEARCH_TABLE} MATCH %s AND {where}"
+        params = [match, *params]
+        score = f"bm25({SEARCH_TABLE})"
+    else:
+        # bm25() can only be used in a full-text query
+        score = "0"
+    tier_sql, tier_params = _tier_sql(terms, phrase)
+
+    # The results are ranked in a single query over the index, which SQLite evaluates
+    # once, and then looks up each handle in.
+    position = RawSQL(
+        f"""
+        SELECT position FROM (
+            SELECT
+                handle_id,
+                row_number() OVER (ORDER BY tier, score, name) AS position
+            FROM (
+                SELECT rowid AS handle_id, name, {tier_sql} AS tier, {score} AS score
+                FROM {SEARCH_TABLE}
+                WHERE {where}
+            )
+        )
+        WHERE handle_id = {Handle._meta.db_table}.id
+        """,
+        [*tier_params, *params],
+    )
+    matching_ids = RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {where}", params)
+
+    return (
+        handles.filter(id__in=matching_ids)
+        .annotate(search_position=position)
+        .order_by("search_position")
+    )
+
+
+def _like(column, term):
+    return like_contains_sql(column, term, connection.alias)
+
+
+def _where_sql(terms):
+    """Return (sql, params) for matching rows that contain each term in any column."""
+
+    clauses = []
+    params = []
+    for term in terms:
+        term_clauses = []
+        for column in COLUMNS:
+            sql, term_params = _like(column, term)
+            term_clauses.append(sql)
+            params.extend(term_params)
+        clauses.append(f"({' OR '.join(term_clauses)})")
+    return " AND ".join(clauses), params
+
+
+def _match_query(terms):
+    """Return the full-text query for the rows that contain each term that the index
+    can find, or None if there are none."""
+
+    phrases = [fts_phrase(term) for term in terms]
+    return " AND ".join(phrase for phrase in phrases if phrase is not None) or None
+
+
+def _tier_sql(terms, phrase):
+    """Return (sql, params) for the tier of a row, as described in the module
+    docstring."""
+
+    phrase_in_name, phrase_params = _like("name", phrase)
+    in_name = [_like("name", term) for term in terms]
+    in_description = [_like("description", term) for term in terms]
+
+    def all_of(clauses):
+        return " AND ".join(sql for sql, _ in clauses)
+
+    def any_of(clauses):
+        return " OR ".join(sql for sql, _ in clauses)
+
+    def params_of(clauses):
+        return [param for _, params in clauses for param in params]
+
+    sql = f"""
+        CASE
+            WHEN {phrase_in_name} THEN 1
+            WHEN {all_of(in_name)} THEN 2
+            WHEN {any_of(in_name)} THEN 3
+            WHEN {any_of(in_description)} THEN 4
+            ELSE 5
+        END
+    """
+    params = [
+        *phrase_params,
+        *params_of(in_name),
+        *params_of(in_name),
+        *params_of(in_description),
+    ]
+    return sql, params
+
+
+def refresh_search_index():
+    """Rebuild the index if handles, codelists or their tags have changed since it was
+    built, and return whether it was rebuilt."""
+
+    with transaction.atomic():
+        fingerprint = build_fingerprint()
+        if CodelistSearchIndex.objects.filter(
+            pk=SEARCH_INDEX_PK, fingerprint=fingerprint
+        ).exists():
+            return False
+
+        with connection.cursor() as cursor:
+            build_search_index(cursor)
+        CodelistSearchIndex.objects.update_or_create(
+            pk=SEARCH_INDEX_PK, defaults={"fingerprint": fingerprint}
+        )
+    return True
+
+
+def index_codelist(codelist_id):
+    """Replace the rows for the handles of the codelist with the given id.
+
+    This should be called by every action that changes a codelist's handles,
+    description, methodology or tags, in the action's transaction.
+    """
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        create_search_table(cursor)
+        _delete_rows(cursor, codelist_id)
+        cursor.execute(f"{_insert_sql()} WHERE c.id = %s", [codelist_id])
+
+
+def unindex_codelist(codelist_id):
+    """Remove the rows for the handles of the codelist with the given id.
+
+    This should be called by every action that deletes a codelist, in the action's
+    transaction, before the codelist (and so its handles) is deleted.
+    """
+
+    with connection.cursor() as cursor:
+        create_search_table(cursor)
+        _delete_rows(cursor, codelist_id)
+
+
+def _delete_rows(cursor, codelist_id):
+    handle_table = Handle._meta.db_table
+    cursor.execute(
+        f"""
+        DELETE FROM {SEARCH_TABLE}
+        WHERE rowid IN (SELECT id FROM {handle_table} WHERE codelist_id = %s)
+        """,
+        [codelist_id],
+    )
+
+
+def build_fingerprint():
+    """Return a value that changes whenever the data in the index changes.
+
+    Changes to a codelist's description and methodology are covered by its updated_at.
+    Tags are included in full, since they have no updated_at, and can be renamed.
+    """
+
+    aggregates = [
+        Handle.objects.aggregate(Count("id"), Max("updated_at")),
+        Codelist.objects.aggregate(Count("id"), Max("updated_at")),
+        TaggedItem.objects.aggregate(Count("id"), Max("id")),
+        sorted(Tag.objects.values_list("id", "name")),
+    ]
+    return hashlib.sha256(
+        json.dumps(aggregates, sort_keys=True, default=str).encode("utf8")
+    ).hexdigest()
+
+
+def create_search_table(cursor):
+    cursor.execute(
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE}
+        USING fts5({", ".join(COLUMNS)}, tokenize = 'trigram')
+        """
+    )
+
+
+def build_search_index(cursor):
+    """(Re)build the index from every handle, creating the table if necessary."""
+
+    create_search_table(cursor)
+    cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    cursor.execute(_insert_sql())
+
+
+def _insert_sql():
+    """Return the SQL that inserts a row for each handle, to which a WHERE clause on the
+    handle (h) or its codelist (c) may be appended."""
+
+    handle_table = Handle._meta.db_table
+    codelist_table = Codelist._meta.db_table
+    tagged_item_table = TaggedItem._meta.db_table
+    tag_table = Tag._meta.db_table
+
+    return f"""
+        INSERT INTO {SEARCH_TABLE} (rowid, name, description, methodology, tags)
+        SELECT
+            h.id,
+            h.name,
+            c.description,
+            c.methodology,
+            (
+                SELECT group_concat(t.name, ', ')
+                FROM {tagged_item_table} ti
+                JOIN {tag_table} t ON t.id = ti.tag_id
+                JOIN django_content_type ct ON ct.id = ti.content_type_id
+                WHERE ct.app_label = 'codelists'
+                AND ct.model = 'codelist'
+                AND ti.object_id = c.id
+            )
+        FROM {handle_table} h
+        JOIN {codelist_table} c ON c.id = h.codelist_id
+    """
@@ -500,6 +500,7 @@ def test_publish(version_under_review):
 
     version_under_review.refresh_from_db()
     assert version_under_review.is_published
+    assert version_under_review.csv_data_is_cached()
 
 
 def test_delete_version(old_style_codelist):
@@ -1,12 +1,16 @@
 import hashlib
 import json
 from datetime import datetime
+from unittest.mock import patch
 
 import pytest
 from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from codelists.actions import update_codelist
-from codelists.models import Codelist, Handle
+from codelists.listing import refresh_codelist
+from codelists.models import Codelist, CodelistsListing, CodelistsListingRecord, Handle
+from mappings.dmdvmpprevmap.import_data import build_mapping_closure
 from mappings.dmdvmpprevmap.models import Mapping as VmpPrevMapping
 from opencodelists.tests.assertions import assert_difference, assert_no_difference
 
@@ -387,6 +391,113 @@ def test_codelists_get_with_tag_and_include_users(client, universe):
     assert len(data["codelists"]) == 4
 
 
+def test_codelists_get_not_modified(client, organisation):
+    url = f"/api/v1/codelist/{organisation.slug}/"
+    rsp = client.get(url)
+    etag = rsp["ETag"]
+
+    rsp = client.get(url, headers={"If-None-Match": etag})
+    assert rsp.status_code == 304
+    assert rsp["ETag"] == etag
+
+    # responses with different parameters have different ETags
+    rsp = client.get(url + "?description", headers={"If-None-Match": etag})
+    assert rsp.status_code == 200
+    assert rsp["ETag"] != etag
+
+
+def test_codelists_get_after_codelist_changes(client, organisation, new_style_codelist):
+    url = f"/api/v1/codelist/{organisation.slug}/?description"
+    rsp = client.get(url)
+    etag = rsp["ETag"]
+
+    update_codelist(
+        codelist=new_style_codelist,
+        owner=new_style_codelist.owner,
+        name=new_style_codelist.name,
+        slug=new_style_codelist.slug,
+        description="A new description",
+        methodology=new_style_codelist.methodology,
+        references=[],
+        signoffs=[],
+    )
+
+    # the listing has been rebuilt, so the response has changed
+    rsp = client.get(url, headers={"If-None-Match": etag})
+    assert rsp.status_code == 200
+    assert rsp["ETag"] != etag
+    data = json.loads(rsp.content)
+    [record] = [
+        record
+        for record in data["codelists"]
+        if record["slug"] == new_style_codelist.slug
+    ]
+    assert record["description"] == "A new description"
+
+
+def test_codelists_get_does_not_rebuild_unchanged_listing(client, organisation):
+    url = f"/api/v1/codelist/{organisation.slug}/"
+    client.get(url)
+
+    # the listing's records are not loaded, let alone rebuilt, to check whether the
+    # client's copy is current
+    etag = client.get(url)["ETag"]
+    with patch("codelists.listing.build_records") as build_records:
+        rsp = client.get(url, headers={"If-None-Match": etag})
+    assert rsp.status_code == 304
+    build_records.assert_not_called()
+
+
+def test_codelists_get_does_not_write(client, organisation, new_style_codelist):
+    CodelistsListing.objects.all().delete()
+    url = f"/api/v1/codelist/{organisation.slug}/"
+
+    with CaptureQueriesContext(connection) as queries:
+        rsp = client.get(url)
+    assert rsp.status_code == 200
+    assert new_style_codelist.slug in [
+        record["slug"] for record in json.loads(rsp.content)["codelists"]
+    ]
+    assert not [
+        query
+        for query in queries.captured_queries
+        if not query["sql"].startswith("SELECT")
+    ]
+    assert not CodelistsListing.objects.exists()
+
+
+def test_codelists_listing_writes_only_changed_records(
+    organisation, new_style_codelist, old_style_codelist
+):
+    updated_ats = dict(CodelistsListingRecord.objects.values_list("pk", "updated_at"))
+    assert new_style_codelist.pk in updated_ats
+
+    update_codelist(
+        codelist=new_style_codelist,
+        owner=new_style_codelist.owner,
+        name=new_style_codelist.name,
+        slug=new_style_codelist.slug,
+        description="A new description",
+        methodology=new_style_codelist.methodology,
+        references=[],
+        signoffs=[],
+    )
+    # this codelist's record hasn't changed, so it isn't written
+    refresh_codelist(old_style_codelist.pk)
+
+    new_updated_ats = dict(
+        CodelistsListingRecord.objects.values_list("pk", "updated_at")
+    )
+    assert new_updated_ats.keys() == updated_ats.keys()
+    assert {
+        pk
+        for pk, updated_at in new_updated_ats.items()
+        if updated_at != updated_ats[pk]
+    } == {new_style_codelist.pk}
+    record = CodelistsListingRecord.objects.get(pk=new_style_codelist.pk).record
+    assert record["description"] == "A new description"
+
+
 def test_codelists_post(client, user):
     data = {
         "name": "New codelist",
@@ -596,6 +707,53 @@ def test_versions_post_permission_denied(
     assert rsp.status_code == 403
 
 
+def test_version_diff(client, version_with_no_searches, version_with_some_searches):
+    rsp = client.get(
+        f"/api/v1/codelist/{version_with_no_searches.codelist.full_slug()}/"
+        f"{version_with_no_searches.hash}/diff/{version_with_some_searches.hash}/"
+    )
+    assert rsp.status_code == 200
+    data = rsp.json()
+    assert data["lhs"] == version_with_no_searches.full_slug()
+    assert data["rhs"] == version_with_some_searches.full_slug()
+    assert data["lhs_only"] == {"codes": [], "summary": []}
+    assert data["rhs_only"] == {
+        "codes": ["202855006", "439656005"],
+        "summary": [
+            {
+                "code": "439656005",
+                "term": "Arthritis of elbow",
+                "descendants": [{"code": "202855006", "term": "Lateral epicondylitis"}],
+            }
+        ],
+    }
+    assert data["common"]["codes"] == sorted(version_with_no_searches.codes)
+
+
+def test_version_diff_no_code_column(
+    client, dmd_version_asthma_medication, dmd_version_asthma_medication_refill
+):
+    dmd_version_asthma_medication_refill.csv_data = (
+        dmd_version_asthma_medication_refill.csv_data.replace("dmd_id", "unk_id")
+    )
+    dmd_version_asthma_medication_refill.save()
+    rsp = client.get(
+        f"/api/v1/codelist/{dmd_version_asthma_medication.codelist.full_slug()}/"
+        f"{dmd_version_asthma_medication.hash}/diff/"
+        f"{dmd_version_asthma_medication_refill.hash}/"
+    )
+    assert rsp.status_code == 400
+    assert rsp.json() == {"error": "Could not identify code columns"}
+
+
+def test_version_diff_unknown_version(client, version_with_no_searches):
+    rsp = client.get(
+        f"/api/v1/codelist/{version_with_no_searches.codelist.full_slug()}/"
+        f"{version_with_no_searches.hash}/diff/unknown-version-hash/"
+    )
+    assert rsp.status_code == 404
+
+
 def post(client, url, data, user):
     if user is None:
         headers = {}
@@ -808,6 +966,7 @@ def test_codelists_check_changes(client, dmd_version_asthma_medication):
     dmd_version_asthma_medication.save()
     # Add a VMP mapping which will be added into the CSV download
     VmpPrevMapping.objects.create(id="10514511000001106", vpidprev="999")
+    build_mapping_closure()
     resp = client.post("/api/v1/check/", data)
 
     assert resp.json() == {
@@ -910,6 +1069,9 @@ def test_codelists_check_dmd_alternative_downloads_with_vmp_mappings(
 ):
     # Add a VMP mapping which will be added into the CSV download
     VmpPrevMapping.objects.create(id="10514511000001106", vpidprev="999")
+    build_mapping_closure()
+    # cached download data is refreshed after mappings are updated by a dm+d import
+    dmd_version_asthma_medication.cache_csv_data()
     codelist_id = (
         f"{dmd_version_asthma_medication.organisation.slug}/"
         f"{dmd_version_asthma_medication.codelist.slug}/"
@@ -934,6 +1096,70 @@ def test_codelists_check_dmd_alternative_downloads_with_vmp_mappings(
     assert resp.json()["status"] == expected_status
 
 
+def test_codelists_check_resolves_lines_in_bulk(
+    client,
+    django_assert_max_num_queries,
+    old_style_version,
+    new_style_version,
+    user_version,
+    dmd_version_asthma_medication,
+):
+    old_style_version.tag = "v1"
+    old_style_version.save()
+    versions_and_ids = [
+        (
+            old_style_version,
+            f"{old_style_version.organisation.slug}/{old_style_version.codelist.slug}/v1",
+        ),
+        (
+            new_style_version,
+            f"{new_style_version.organisation.slug}/{new_style_version.codelist.slug}/{new_style_version.hash}",
+        ),
+        (
+            user_version,
+            f"user/{user_version.user.username}/{user_version.codelist.slug}/{user_version.hash}",
+        ),
+        (
+            dmd_version_asthma_medication,
+            f"{dmd_version_asthma_medication.organisation.slug}/{dmd_version_asthma_medication.codelist.slug}/{dmd_version_asthma_medication.hash}",
+        ),
+    ]
+    manifest = {
+        "files": {
+            codelist_id.replace("/", "-") + ".csv": {
+                "id": codelist_id,
+                "url": f"https://opencodelist.org/codelists/{codelist_id}/",
+                "downloaded_at": "2023-10-04 13:55:17.569997Z",
+                "sha": version.csv_data_shas()[0],
+            }
+            for version, codelist_id in versions_and_ids
+        }
+    }
+    data = {
+        "codelists": "\n".join(codelist_id for _, codelist_id in versions_and_ids),
+        "manifest": json.dumps(manifest),
+    }
+
+    # The SHAs have been computed above, so the lines are resolved in bulk and the SHAs
+    # are read from each version's cached data, with no queries per line
+    with django_assert_max_num_queries(4):
+        resp = client.post("/api/v1/check/", data)
+    assert resp.json() == {"status": "ok"}
+
+
+def test_codelists_check_reports_first_bad_line(client, new_style_version):
+    codelist_id = f"{new_style_version.organisation.slug}/{new_style_version.codelist.slug}/{new_style_version.hash}"
+    data = {
+        "codelists": f"{codelist_id}\nfoo/codelist-foo/1234\nfoo/bar/codelist-foo/1234",
+        "manifest": json.dumps({"files": {}}),
+    }
+    resp = client.post("/api/v1/check/", data)
+    assert resp.json() == {
+        "status": "error",
+        "data": {"error": "foo/codelist-foo/1234 could not be found"},
+    }
+
+
 def test_codelists_check_sha(version_with_no_searches):
     # The CSV data download contains \r\n line endings
     assert version_with_no_searches.csv_data_for_download() == (
@@ -0,0 +1,18 @@
+from ..scripts.cache_csv_data import run
+
+
+def test_cache_csv_data_none_to_cache(old_style_version, capsys):
+    run()
+
+    assert "Cached CSV data for 0 versions" in capsys.readouterr().out
+
+
+def test_cache_csv_data_one_to_cache(old_style_version, capsys):
+    old_style_version.cached_csv_data = {}
+    old_style_version.save()
+
+    run()
+
+    assert "Cached CSV data for 1 versions" in capsys.readouterr().out
+    old_style_version.refresh_from_db()
+    assert old_style_version.csv_data_is_cached()
@@ -3,6 +3,7 @@ from hypothesis import given, settings
 from hypothesis import strategies as st
 
 from codelists.codeset import Codeset
+from codelists.hierarchy import CompactHierarchy
 
 from .codeset_test_data import examples
 from .helpers import build_hierarchy, hierarchies
@@ -123,3 +124,28 @@ def test_update():
 def test_roundtrip(hierarchy, codes):
     codeset = Codeset.from_codes(codes, hierarchy)
     assert codeset.codes() == codes
+
+
+@settings(deadline=None)
+@given(hierarchies(24), st.sets(st.integers(0, 23)), st.sets(st.integers(0, 23)))
+def test_from_definition(hierarchy, directly_included, directly_excluded):
+    directly_included = directly_included - directly_excluded
+    codeset = Codeset.from_definition(directly_included, directly_excluded, hierarchy)
+
+    expected = {
+        code: hierarchy.node_status(code, directly_included, directly_excluded)
+        for code in hierarchy.nodes
+    }
+    assert codeset.code_to_status == {
+        code: status for code, status in expected.items() if status != "?"
+    }
+
+
+@pytest.mark.parametrize("example", examples, ids=_get_description)
+def test_from_codes_with_compact_hierarchy(example):
+    hierarchy = CompactHierarchy.from_cache(build_hierarchy().data_for_cache())
+
+    codeset = Codeset.from_codes(example["codes"], hierarchy)
+    assert codeset.codes("+") == example["explicitly_included"]
+    assert codeset.codes("-") == example["explicitly_excluded"]
+    assert codeset.codes() == example["codes"]
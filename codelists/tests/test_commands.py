@@ -2,6 +2,7 @@ import csv
 from io import StringIO
 
 from django.core.management import call_command
+from taggit.models import Tag
 
 from codelists.models import CodeObj, Handle
 from opencodelists.tests.assertions import assert_difference
@@ -316,3 +317,30 @@ def test_create_and_update_draft(organisation_user, version_with_complete_search
     new_code = draft.code_objs.get(code=missing_implicit_concept.code)
     # The new code has been updated with the implicit inclusion status
     assert new_code.status == "(+)"
+
+
+def test_benchmark_codelists_check(universe):
+    out, _ = output_from_call_command(
+        "benchmark_codelists_check", num_codelists=5, repeats=1
+    )
+    assert out.startswith("5 codelists, 1 repeats: ")
+    assert "bulk" in out
+
+
+def test_refresh_codelists_listing(universe, user):
+    out, _ = output_from_call_command("refresh_codelists_listing")
+    assert out == "Codelists listing is up to date"
+
+    # users are changed without actions, so only the command picks up the change
+    user.name = "A new name"
+    user.save()
+
+    out, _ = output_from_call_command("refresh_codelists_listing")
+    assert out == "Rebuilt codelists listing"
+    out, _ = output_from_call_command("refresh_codelists_listing")
+    assert out == "Codelists listing is up to date"
+
+    Tag.objects.filter(name="new-style").update(name="renamed")
+
+    out, _ = output_from_call_command("refresh_codelists_listing")
+    assert out == "Rebuilt codelists listing"
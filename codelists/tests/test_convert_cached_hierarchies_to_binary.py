@@ -0,0 +1,37 @@
+import json
+
+from ..hierarchy import Hierarchy
+from ..scripts.convert_cached_hierarchies_to_binary import run
+
+
+def test_convert_cached_hierarchies_to_binary_none_to_convert(dmd_codelist, capsys):
+    run()
+
+    assert "0 CachedHierarchies to convert" in capsys.readouterr().out
+
+
+def test_convert_cached_hierarchies_to_binary_one_to_convert(old_style_version, capsys):
+    hierarchy = old_style_version.hierarchy
+    cached_hierarchy = old_style_version.cached_hierarchy
+    cached_hierarchy.data = json.dumps(
+        {
+            "root": hierarchy.root,
+            "nodes": list(hierarchy.nodes),
+            "child_map": {k: list(v) for k, v in hierarchy.child_map.items()},
+            "parent_map": {k: list(v) for k, v in hierarchy.parent_map.items()},
+            "_descendants_cache": {},
+            "_ancestors_cache": {},
+        }
+    )
+    cached_hierarchy.binary_data = None
+    cached_hierarchy.save()
+    updated_at = cached_hierarchy.updated_at
+
+    run()
+
+    assert "1 CachedHierarchies to convert" in capsys.readouterr().out
+    cached_hierarchy.refresh_from_db()
+    assert cached_hierarchy.data is None
+    # updated_at is the hierarchy's revision in hierarchy_cache
+    assert cached_hierarchy.updated_at > updated_at
+    assert Hierarchy.from_cache(cached_hierarchy.serialised_hierarchy) == hierarchy
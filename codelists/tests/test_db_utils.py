@@ -1,3 +1,4 @@
+from coding_systems.snomedct.coding_system import CodingSystem
 from opencodelists import db_utils
 
 
@@ -9,3 +10,57 @@ def test_query_with_many_params():
     params = [last_value] + values
     result = db_utils.query(sql, params)
     assert result == [("found",)]
+
+
+def test_in_values_sql_few_values():
+    sql, params = db_utils.in_values_sql(["a", "b"])
+    assert sql == "%s, %s"
+    assert params == ["a", "b"]
+
+
+def test_in_values_sql_many_values():
+    values = [str(i) for i in range(50000)]
+    sql, params = db_utils.in_values_sql(values)
+    assert len(params) == 1
+
+    result = db_utils.query(f"SELECT 'found' WHERE %s IN ({sql})", ["49999", *params])
+    assert result == [("found",)]
+
+
+def test_in_values_many_codes(snomedct_data):
+    coding_system = CodingSystem(database_alias="snomedct_test_20200101")
+    codes = [str(i) for i in range(50000)] + ["239964003", "128133004"]
+
+    assert coding_system.matching_codes(codes) == {"239964003", "128133004"}
+    assert set(coding_system.ancestor_relationships(codes)) == set(
+        coding_system.ancestor_relationships(["239964003", "128133004"])
+    )
+
+
+def test_iter_changed_rows(snomedct_data):
+    for database, values in [
+        ("default", ["a", "b", "d", "e"]),
+        ("snomedct_test_20200101", ["b", "c", "d", "f", "g"]),
+    ]:
+        db_utils.query("CREATE TEMP TABLE changes (value)", database=database)
+        for value in values:
+            db_utils.query(
+                "INSERT INTO changes VALUES (%s)", [value], database=database
+            )
+
+    changed_rows = db_utils.iter_changed_rows(
+        "SELECT value FROM changes ORDER BY value",
+        previous_database="default",
+        database="snomedct_test_20200101",
+    )
+
+    assert list(changed_rows) == [
+        (False, ("a",)),
+        (True, ("c",)),
+        (False, ("e",)),
+        (True, ("f",)),
+        (True, ("g",)),
+    ]
+
+    for database in ["default", "snomedct_test_20200101"]:
+        db_utils.query("DROP TABLE changes", database=database)
@@ -1,8 +1,17 @@
+import json
+
 import pytest
+from hypothesis import given, settings
+from hypothesis import strategies as st
 
-from codelists.hierarchy import Hierarchy
+from codelists.hierarchy import CompactHierarchy, Hierarchy
 
-from .helpers import MockCodingSystem, build_hierarchy, build_small_hierarchy
+from .helpers import (
+    MockCodingSystem,
+    build_hierarchy,
+    build_small_hierarchy,
+    hierarchies,
+)
 
 
 def test_nodes():
@@ -215,6 +224,37 @@ def test_node_status():
     }
 
 
+def test_node_statuses():
+    hierarchy = build_hierarchy()
+
+    assert hierarchy.node_statuses(
+        {"b", "d", "e", "g", "h", "i"}, {"a", "e"}, {"b"}
+    ) == {
+        "b": "-",
+        "d": "(-)",
+        "e": "+",
+        "g": "(-)",
+        "h": "(+)",
+        "i": "(+)",
+    }
+
+
+@settings(deadline=None)
+@given(
+    hierarchies(24),
+    st.sets(st.integers(0, 23)),
+    st.sets(st.integers(0, 23)),
+    st.integers(0, 23),
+)
+def test_node_statuses_matches_node_status(hierarchy, included, excluded, node):
+    included = included - excluded
+    nodes = {node} | hierarchy.descendants(node)
+
+    assert hierarchy.node_statuses(nodes, included, excluded) == {
+        node: hierarchy.node_status(node, included, excluded) for node in nodes
+    }
+
+
 def test_cache_roundtrip():
     hierarchy = build_hierarchy()
 
@@ -235,6 +275,72 @@ def test_cache_roundtrip():
         assert getattr(hierarchy, name) == getattr(hierarchy1, name)
 
 
+def test_copy():
+    hierarchy = Hierarchy.from_cache(build_hierarchy().data_for_cache())
+    hierarchy.descendants("d")
+    hierarchy.dirty = False
+
+    hierarchy1 = hierarchy.copy()
+    # the memo caches are shared until one of the hierarchies adds to them
+    assert hierarchy1._descendants_cache is hierarchy._descendants_cache
+    hierarchy1.descendants("b")
+
+    assert hierarchy1 == hierarchy
+    assert hierarchy1.dirty
+    assert hierarchy1._descendants_cache.keys() == {"b", "d", "e", "g", "h", "i"}
+    assert not hierarchy.dirty
+    assert hierarchy._descendants_cache.keys() == {"d", "g", "h"}
+
+    hierarchy.ancestors("g")
+    assert "g" not in hierarchy1._ancestors_cache
+
+
+def test_cache_roundtrip_unknown_node():
+    hierarchy = build_hierarchy()
+    hierarchy.ancestors("z")
+
+    hierarchy1 = Hierarchy.from_cache(hierarchy.data_for_cache())
+
+    assert hierarchy1.nodes == hierarchy.nodes
+    assert hierarchy1._ancestors_cache == {"z": set()}
+
+
+def test_from_legacy_json_cache():
+    hierarchy = build_small_hierarchy()
+    data = json.dumps(
+        {
+            "root": "a",
+            "nodes": ["a", "b", "c", "d", "e", "f"],
+            "child_map": {"a": ["b", "c"], "b": ["d", "e"], "c": ["e", "f"]},
+            "parent_map": {
+                "b": ["a"],
+                "c": ["a"],
+                "d": ["b"],
+                "e": ["b", "c"],
+                "f": ["c"],
+            },
+            "_descendants_cache": {"b": ["d", "e"]},
+            "_ancestors_cache": {},
+        }
+    )
+
+    hierarchy1 = Hierarchy.from_cache(data)
+
+    assert hierarchy1 == hierarchy
+    assert hierarchy1._descendants_cache == {"b": {"d", "e"}}
+    assert CompactHierarchy.from_cache(data) == hierarchy
+
+
+def test_from_cache_bad_data():
+    with pytest.raises(ValueError, match="Not a cached hierarchy"):
+        Hierarchy.from_cache(b"nonsense")
+
+    data = bytearray(build_hierarchy().data_for_cache())
+    data[4] = 99
+    with pytest.raises(ValueError, match="Unsupported cached hierarchy format"):
+        Hierarchy.from_cache(bytes(data))
+
+
 def test_from_codes_single_code():
     # Make a mock coding system with this structure:
     #        a
@@ -561,3 +667,72 @@ def test_coding_system_changes_new_code():
     hierarchy_c_release3 = Hierarchy.from_codes(release_3, ["c"])
     assert hierarchy_c_release2.parent_map != hierarchy_e_release3.parent_map
     assert hierarchy_c_release2.child_map != hierarchy_c_release3.child_map
+
+
+def _compact(hierarchy):
+    edges = [
+        (parent, child)
+        for parent, children in hierarchy.child_map.items()
+        for child in children
+    ]
+    return CompactHierarchy(hierarchy.root, edges)
+
+
+def test_compact_hierarchy_maps():
+    hierarchy = build_small_hierarchy()
+    compact = _compact(hierarchy)
+
+    assert compact.nodes == hierarchy.nodes
+    assert dict(compact.child_map) == hierarchy.child_map
+    assert dict(compact.parent_map) == hierarchy.parent_map
+    assert compact.child_map.get("d", []) == []
+    assert compact == hierarchy
+
+
+def test_compact_hierarchy_cache_roundtrip():
+    compact = _compact(build_hierarchy())
+    compact.descendants("a")
+
+    assert not compact.dirty
+    assert Hierarchy.from_cache(compact.data_for_cache()) == compact
+    assert CompactHierarchy.from_cache(compact.data_for_cache()) == compact
+
+
+def test_compact_hierarchy_copy():
+    compact = _compact(build_hierarchy())
+    compact.descendants("d")
+
+    compact1 = compact.copy()
+    compact1.descendants("b")
+
+    assert compact1 == compact
+    assert dict(compact1.child_map) == dict(compact.child_map)
+    assert compact1.descendants("b") == {"d", "e", "g", "h", "i"}
+    assert len(compact1._descendant_bits_cache) > len(compact._descendant_bits_cache)
+
+
+def test_compact_hierarchy_unknown_node():
+    compact = _compact(build_hierarchy())
+
+    assert compact.descendants("z") == set()
+    assert compact.ancestors("z") == set()
+    assert compact.filter_to_ultimate_ancestors({"z", "d", "g"}) == {"z", "d"}
+    assert compact.node_status("z", {"a"}, set()) == "?"
+
+
+@settings(deadline=None)
+@given(hierarchies(24), st.sets(st.integers(0, 23)), st.sets(st.integers(0, 23)))
+def test_compact_hierarchy_matches_hierarchy(hierarchy, included, excluded):
+    included = included - excluded
+    compact = _compact(hierarchy)
+
+    assert compact == hierarchy
+    for node in hierarchy.nodes:
+        assert compact.descendants(node) == hierarchy.descendants(node)
+        assert compact.ancestors(node) == hierarchy.ancestors(node)
+        assert compact.node_status(node, included, excluded) == hierarchy.node_status(
+            node, included, excluded
+        )
+    assert compact.filter_to_ultimate_ancestors(
+        included
+    ) == hierarchy.filter_to_ultimate_ancestors(included)
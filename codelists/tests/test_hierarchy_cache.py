@@ -0,0 +1,100 @@
+from codelists.actions import cache_hierarchy
+from codelists.hierarchy_cache import HierarchyCache, hierarchy_cache
+from codelists.models import CodelistVersion
+
+from .helpers import build_hierarchy, build_small_hierarchy
+
+
+def test_get_hit_and_miss():
+    cache = HierarchyCache()
+    hierarchy = build_hierarchy()
+
+    assert cache.get(1, "r1", lambda: hierarchy) is hierarchy
+    assert cache.get(1, "r1", build_small_hierarchy) is hierarchy
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_get_new_revision():
+    cache = HierarchyCache()
+    hierarchy = build_hierarchy()
+    cache.get(1, "r1", build_small_hierarchy)
+
+    assert cache.get(1, "r2", lambda: hierarchy) is hierarchy
+    assert cache.stats() == {"size": 1, "hits": 0, "misses": 2, "evictions": 0}
+
+
+def test_get_evicts_least_recently_used(settings):
+    settings.HIERARCHY_CACHE_SIZE = 2
+    cache = HierarchyCache()
+    cache.get(1, "r1", build_hierarchy)
+    cache.get(2, "r1", build_hierarchy)
+    cache.get(1, "r1", build_hierarchy)
+    cache.get(3, "r1", build_hierarchy)
+
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 3, "evictions": 1}
+    assert set(cache._entries) == {1, 3}
+
+
+def test_get_disabled(settings):
+    settings.HIERARCHY_CACHE_SIZE = 0
+    cache = HierarchyCache()
+    cache.get(1, "r1", build_hierarchy)
+
+    assert cache.stats() == {"size": 0, "hits": 0, "misses": 1, "evictions": 0}
+
+
+def test_get_with_size_setting(settings):
+    settings.RENDER_CACHE_SIZE = 1
+    cache = HierarchyCache(size_setting="RENDER_CACHE_SIZE", name="render_cache")
+    cache.get(1, "r1", build_hierarchy)
+    cache.get(2, "r1", build_hierarchy)
+
+    assert cache.stats() == {"size": 1, "hits": 0, "misses": 2, "evictions": 1}
+
+
+def test_invalidate():
+    cache = HierarchyCache()
+    cache.get(1, "r1", build_hierarchy)
+    cache.invalidate(1)
+    cache.get(1, "r1", build_hierarchy)
+
+    assert cache.stats()["misses"] == 2
+
+
+def test_version_hierarchy_is_cached(version):
+    hierarchy = CodelistVersion.objects.get(pk=version.pk).hierarchy
+    stats = hierarchy_cache.stats()
+
+    assert CodelistVersion.objects.get(pk=version.pk).hierarchy == hierarchy
+    assert hierarchy_cache.stats()["hits"] == stats["hits"] + 1
+
+
+def test_version_hierarchy_is_not_shared(version):
+    hierarchy = CodelistVersion.objects.get(pk=version.pk).hierarchy
+    hierarchy.dirty = True
+
+    # Each version gets its own copy of the cached hierarchy, so that memoising in one
+    # doesn't affect the others
+    reloaded = CodelistVersion.objects.get(pk=version.pk).hierarchy
+    assert reloaded is not hierarchy
+    assert not reloaded.dirty
+
+
+def test_version_hierarchy_with_cached_hierarchy(version, django_assert_num_queries):
+    hierarchy = CodelistVersion.objects.get(pk=version.pk).hierarchy
+    loaded = CodelistVersion.objects.with_cached_hierarchy().get(pk=version.pk)
+
+    # The revision is read from the CachedHierarchy loaded with the version, and the
+    # hierarchy is in the cache, so no more queries are needed
+    with django_assert_num_queries(0):
+        assert loaded.hierarchy == hierarchy
+
+
+def test_cache_hierarchy_invalidates(version):
+    hierarchy = CodelistVersion.objects.get(pk=version.pk).hierarchy
+
+    cache_hierarchy(version=version)
+
+    reloaded = CodelistVersion.objects.get(pk=version.pk).hierarchy
+    assert reloaded is not hierarchy
+    assert reloaded == hierarchy
@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 import pytest
 from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
@@ -391,8 +393,7 @@ def test_draft_is_not_downloadable(draft_with_no_searches):
 
 
 def test_cached_csv_data(old_style_version):
-    assert old_style_version.cached_csv_data == {}
-    old_style_version.csv_data_shas()
+    # download data and shas are cached when the version is created
     assert old_style_version.cached_csv_data["release"] == "snomedct_test_20200101"
     assert (
         "download_data_fixed_headers_False_include_mapped_vmps_True"
@@ -405,12 +406,17 @@ def test_cached_csv_data(old_style_version):
         == old_style_version.csv_data
     )
     assert len(old_style_version.cached_csv_data["shas"]) == 1
+    for fixed_headers in [False, True]:
+        for include_mapped_vmps in [True, False]:
+            assert (
+                f"download_data_fixed_headers_{fixed_headers}"
+                f"_include_mapped_vmps_{include_mapped_vmps}"
+            ) in old_style_version.cached_csv_data
 
 
 def test_cached_csv_data_dmd_codelist(dmd_version_asthma_medication):
     clv = dmd_version_asthma_medication
-    assert clv.cached_csv_data == {}
-    clv.csv_data_shas()
+    # download data and shas are cached when the version is created
 
     # take a copy of the cached data
     cached_csv_data = {**clv.cached_csv_data}
@@ -440,3 +446,28 @@ def test_cached_csv_data_dmd_codelist(dmd_version_asthma_medication):
     clv.cached_csv_data["release"] = "old"
     clv.save()
     assert clv.csv_data_for_download() == new_download_data
+    assert clv.csv_data_shas() != cached_csv_data["shas"]
+
+    # the re-computed data isn't saved, since downloads and checks never write; it is
+    # re-cached when a new dm+d release is imported
+    clv.refresh_from_db()
+    assert clv.cached_csv_data["release"] == "old"
+
+
+def test_csv_data_shas_not_cached_builds_only_default_download(
+    dmd_version_asthma_medication,
+):
+    clv = dmd_version_asthma_medication
+    expected_shas = clv.cached_csv_data["shas"]
+    clv.cached_csv_data["release"] = "old"
+
+    with patch.object(
+        CodelistVersion,
+        "_build_csv_data_for_download",
+        autospec=True,
+        side_effect=CodelistVersion._build_csv_data_for_download,
+    ) as build_csv_data_for_download:
+        assert clv.csv_data_shas() == expected_shas
+    build_csv_data_for_download.assert_called_once_with(
+        clv, fixed_headers=False, include_mapped_vmps=True
+    )
@@ -1,8 +1,11 @@
 """Tests for tree data building functionality."""
 
+import sys
+from itertools import pairwise
+
 import pytest
 
-from codelists.tree_data import build_tree_data
+from codelists.tree_data import build_tree_table
 
 from .helpers import build_hierarchy
 
@@ -42,272 +45,91 @@ def code_to_status(hierarchy):
     return {node: "+" if ord(node) % 2 == 0 else "-" for node in hierarchy.nodes}
 
 
-def test_empty_tree():
-    """Test building a tree with no nodes"""
-    tree_data = build_tree_data({}, {}, {}, [])
-    assert tree_data == []
+def test_tree_table_overlapping_trees(child_map, code_to_term, code_to_status):
+    """Test that codes shared between trees appear in the table once"""
+    tree_tables = [("Tree 1", ["d"]), ("Tree 2", ["e"])]
 
+    table = build_tree_table(child_map, code_to_term, code_to_status, tree_tables)
 
-def test_single_node(child_map, code_to_term, code_to_status):
-    """Test building a tree with a single node"""
-    tree_data = build_tree_data(
-        child_map,
-        code_to_term,
-        code_to_status,
-        tree_tables=[("Disorders", ["g"])],
-    )
-    assert tree_data == [
-        {
-            "title": "Disorders",
-            "children": [
-                {
-                    "id": "g",
-                    "name": code_to_term["g"],
-                    "status": code_to_status["g"],
-                    "children": [],
-                    "depth": 0,
-                }
-            ],
-        }
+    ids = [node["id"] for node in table["nodes"]]
+    assert sorted(ids) == ["d", "e", "g", "h", "i"]
+    index = {code: ix for ix, code in enumerate(ids)}
+    assert table["sections"] == [
+        {"title": "Tree 1", "roots": [index["d"]]},
+        {"title": "Tree 2", "roots": [index["e"]]},
     ]
+    for node in table["nodes"]:
+        code = node["id"]
+        assert node["name"] == code_to_term[code]
+        assert node["status"] == code_to_status[code]
+        assert [ids[ix] for ix in node["children"]] == sorted(child_map.get(code, []))
 
 
-def test_basic_tree(child_map, code_to_term, code_to_status):
-    """Test building a tree with one parent and 2 children"""
-    tree_data = build_tree_data(
-        child_map,
-        code_to_term,
-        code_to_status,
-        tree_tables=[("Disorders", ["f"])],
-    )
-    assert tree_data == [
-        {
-            "title": "Disorders",
-            "children": [
-                {
-                    "id": "f",
-                    "name": code_to_term["f"],
-                    "status": code_to_status["f"],
-                    "children": [
-                        {
-                            "id": "i",
-                            "name": code_to_term["i"],
-                            "status": code_to_status["i"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                        {
-                            "id": "j",
-                            "name": code_to_term["j"],
-                            "status": code_to_status["j"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                    ],
-                    "depth": 0,
-                }
-            ],
-        },
-    ]
+def test_tree_table_sort_by_code():
+    """Test that children are sorted by code when sort_by_term is False"""
+    child_map = {"a": {"b", "c"}}
+    code_to_term = {"a": "A", "b": "Z", "c": "Y"}
+    code_to_status = {"a": "+", "b": "+", "c": "+"}
 
-
-def test_basic_tree_with_code_sorting(child_map, code_to_term, code_to_status):
-    """
-    Test building a tree with one parent and 2 children but where the children
-    are in a different order if sorted by code instead of the default by term
-    """
-    # Make a copy for this test only where code i comes before j if sorted by
-    # code, but the order is reversed if ordered by term
-    code_to_term = code_to_term.copy()
-    code_to_term["i"] = "z"
-    code_to_term["j"] = "a"
-    tree_data = build_tree_data(
-        child_map,
-        code_to_term,
-        code_to_status,
-        tree_tables=[("Disorders", ["f"])],
+    table = build_tree_table(
+        child_map, code_to_term, code_to_status, [("Tree", ["a"])], sort_by_term=False
     )
-    # default is to sort by term, so j is before i
-    assert tree_data == [
-        {
-            "title": "Disorders",
-            "children": [
-                {
-                    "id": "f",
-                    "name": code_to_term["f"],
-                    "status": code_to_status["f"],
-                    "children": [
-                        {
-                            "id": "j",
-                            "name": code_to_term["j"],
-                            "status": code_to_status["j"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                        {
-                            "id": "i",
-                            "name": code_to_term["i"],
-                            "status": code_to_status["i"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                    ],
-                    "depth": 0,
-                }
-            ],
-        },
+    assert [table["nodes"][ix]["id"] for ix in table["nodes"][0]["children"]] == [
+        "b",
+        "c",
     ]
-    tree_data = build_tree_data(
-        child_map,
-        code_to_term,
-        code_to_status,
-        tree_tables=[("Disorders", ["f"])],
-        sort_by_term=False,
-    )
-    # now sorting by code, so i is before j
-    assert tree_data == [
-        {
-            "title": "Disorders",
-            "children": [
-                {
-                    "id": "f",
-                    "name": code_to_term["f"],
-                    "status": code_to_status["f"],
-                    "children": [
-                        {
-                            "id": "i",
-                            "name": code_to_term["i"],
-                            "status": code_to_status["i"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                        {
-                            "id": "j",
-                            "name": code_to_term["j"],
-                            "status": code_to_status["j"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                    ],
-                    "depth": 0,
-                }
-            ],
-        },
-    ]
-
-
-def test_multiple_trees(child_map, code_to_term, code_to_status):
-    """Test with 2 trees. One with children, one without"""
-    # Set up tree tables
-    tree_tables = [("Tree 1", ["f"]), ("Tree 2", ["g"])]
-
-    # Build the tree data
-    tree_data = build_tree_data(child_map, code_to_term, code_to_status, tree_tables)
 
-    assert tree_data == [
-        {
-            "title": "Tree 1",
-            "children": [
-                {
-                    "id": "f",
-                    "name": code_to_term["f"],
-                    "status": code_to_status["f"],
-                    "children": [
-                        {
-                            "id": "i",
-                            "name": code_to_term["i"],
-                            "status": code_to_status["i"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                        {
-                            "id": "j",
-                            "name": code_to_term["j"],
-                            "status": code_to_status["j"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                    ],
-                    "depth": 0,
-                }
-            ],
-        },
-        {
-            "title": "Tree 2",
-            "children": [
-                {
-                    "id": "g",
-                    "name": code_to_term["g"],
-                    "status": code_to_status["g"],
-                    "children": [],
-                    "depth": 0,
-                }
-            ],
-        },
+    table = build_tree_table(child_map, code_to_term, code_to_status, [("Tree", ["a"])])
+    assert [table["nodes"][ix]["id"] for ix in table["nodes"][0]["children"]] == [
+        "c",
+        "b",
     ]
 
 
-def test_overlapping_trees(child_map, code_to_term, code_to_status):
-    """Test with 2 trees, with some common children"""
-    # Set up tree tables
-    tree_tables = [("Tree 1", ["d"]), ("Tree 2", ["e"])]
-
-    # Build the tree data
-    tree_data = build_tree_data(child_map, code_to_term, code_to_status, tree_tables)
+def test_shared_subtrees():
+    """Test a polyhierarchy with many paths to the same codes.
 
-    assert tree_data == [
-        {
-            "title": "Tree 1",
-            "children": [
-                {
-                    "id": "d",
-                    "name": code_to_term["d"],
-                    "status": code_to_status["d"],
-                    "children": [
-                        {
-                            "id": "g",
-                            "name": code_to_term["g"],
-                            "status": code_to_status["g"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                        {
-                            "id": "h",
-                            "name": code_to_term["h"],
-                            "status": code_to_status["h"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                    ],
-                    "depth": 0,
-                }
-            ],
-        },
-        {
-            "title": "Tree 2",
-            "children": [
-                {
-                    "id": "e",
-                    "name": code_to_term["e"],
-                    "status": code_to_status["e"],
-                    "children": [
-                        {
-                            "id": "h",
-                            "name": code_to_term["h"],
-                            "status": code_to_status["h"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                        {
-                            "id": "i",
-                            "name": code_to_term["i"],
-                            "status": code_to_status["i"],
-                            "children": [],
-                            "depth": 1,
-                        },
-                    ],
-                    "depth": 0,
-                }
-            ],
-        },
-    ]
+    Each of the 30 levels has two codes, which are both children of both codes in the
+    level above, so there are 2**30 paths from the root to the bottom level.
+    """
+    levels = [[f"{level}a", f"{level}b"] for level in range(30)]
+    child_map = {
+        parent: set(children)
+        for parents, children in pairwise(levels)
+        for parent in parents
+    }
+    codes = [code for level in levels for code in level]
+    code_to_term = {code: code for code in codes}
+    code_to_status = dict.fromkeys(codes, "+")
+    tree_tables = [("Tree", levels[0])]
+
+    table = build_tree_table(child_map, code_to_term, code_to_status, tree_tables)
+    assert len(table["nodes"]) == 60
+
+    nodes = {node["id"]: node for node in table["nodes"]}
+    # each code is in the table once, with the codes in the level below as children
+    for level, level_below in pairwise(levels):
+        for code in level:
+            children = nodes[code]["children"]
+            assert [table["nodes"][ix]["id"] for ix in children] == level_below
+
+
+def test_deep_tree():
+    """Test a tree that is deeper than Python's recursion limit"""
+    depth = sys.getrecursionlimit() + 1
+    child_map = {str(i): {str(i + 1)} for i in range(depth)}
+    code_to_term = {str(i): str(i) for i in range(depth + 1)}
+    code_to_status = {str(i): "+" for i in range(depth + 1)}
+
+    table = build_tree_table(child_map, code_to_term, code_to_status, [("Tree", ["0"])])
+
+    assert len(table["nodes"]) == depth + 1
+    ix = table["sections"][0]["roots"][0]
+    while table["nodes"][ix]["children"]:
+        (ix,) = table["nodes"][ix]["children"]
+    assert table["nodes"][ix] == {
+        "id": str(depth),
+        "name": str(depth),
+        "status": "+",
+        "children": [],
+    }
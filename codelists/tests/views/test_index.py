@@ -1,6 +1,12 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from taggit.models import Tag
 
+from builder.actions import discard_draft
+from codelists.actions import add_codelist_tag, update_codelist
 from codelists.models import Handle, Status
+from codelists.search_index import SEARCH_TABLE, refresh_search_index
 from codelists.views.index import _parse_search_query
 
 
@@ -137,3 +143,115 @@ def test_search_ranking(client, organisation, create_codelist):
     assert codelists_from_search[1].slug == codelist3.slug
     assert codelists_from_search[2].slug == codelist2.slug
     assert codelists_from_search[3].slug == codelist1.slug
+
+
+def test_search_ranks_methodology_and_tags_last(client, organisation, create_codelist):
+    codelist1 = create_codelist(name="Codelist 1")
+    update_codelist(
+        codelist=codelist1,
+        owner=organisation,
+        name=codelist1.name,
+        slug=codelist1.slug,
+        description=codelist1.description,
+        methodology="Includes asthma codes",
+        references=[],
+        signoffs=[],
+    )
+    codelist2 = create_codelist(name="Codelist 2")
+    add_codelist_tag(codelist=codelist2, tag="asthma")
+    codelist3 = create_codelist(name="Codelist 3", description="Asthma")
+    create_codelist(name="Codelist 4")
+
+    rsp = client.get("/?q=asthma")
+    codelists_from_search = rsp.context["codelists_page"].object_list
+
+    # Within a tier, results are ordered by relevance
+    assert codelists_from_search[0].slug == codelist3.slug
+    assert {codelist.slug for codelist in codelists_from_search[1:]} == {
+        codelist1.slug,
+        codelist2.slug,
+    }
+
+
+def test_search_with_short_terms(client, organisation, create_codelist):
+    # Terms of fewer than three characters can't be found with the full-text index
+    codelist1 = create_codelist(name="Type 2 diabetes")
+    create_codelist(name="Type 1 diabetes")
+
+    rsp = client.get("/?q=2")
+    codelists_from_search = rsp.context["codelists_page"].object_list
+
+    assert [codelist.slug for codelist in codelists_from_search] == [codelist1.slug]
+
+
+def test_search_after_codelist_changes(client, organisation, create_codelist):
+    codelist = create_codelist(name="Codelist 1")
+
+    rsp = client.get("/?q=asthma")
+    assert list(rsp.context["codelists_page"].object_list) == []
+
+    update_codelist(
+        codelist=codelist,
+        owner=organisation,
+        name=codelist.name,
+        slug=codelist.slug,
+        description="Asthma",
+        methodology=codelist.methodology,
+        references=[],
+        signoffs=[],
+    )
+
+    rsp = client.get("/?q=asthma")
+    assert list(rsp.context["codelists_page"].object_list) == [codelist]
+
+
+def test_search_index_after_codelist_deleted(organisation, create_codelist):
+    create_codelist(name="Codelist 1")
+    codelist = create_codelist(name="Codelist 2", status=Status.DRAFT)
+    handle_id = codelist.current_handle.id
+
+    discard_draft(draft=codelist.versions.get())
+
+    # the deleted codelist's rows are removed, and the other codelist's are kept
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT rowid FROM {SEARCH_TABLE}")
+        row_ids = {row_id for (row_id,) in cursor.fetchall()}
+    assert handle_id not in row_ids
+    assert row_ids == set(Handle.objects.values_list("id", flat=True))
+
+
+def test_search_after_changes_without_actions(client, organisation, create_codelist):
+    codelist = create_codelist(name="Codelist 1")
+    add_codelist_tag(codelist=codelist, tag="asthma")
+    refresh_search_index()
+
+    # changes made other than by actions are picked up by the next refresh
+    codelist.description = "Diabetes"
+    codelist.save()
+    Tag.objects.filter(name="asthma").update(name="copd")
+
+    rsp = client.get("/?q=copd")
+    assert list(rsp.context["codelists_page"].object_list) == []
+
+    assert refresh_search_index()
+    assert not refresh_search_index()
+
+    rsp = client.get("/?q=copd")
+    assert list(rsp.context["codelists_page"].object_list) == [codelist]
+    rsp = client.get("/?q=diabetes")
+    assert list(rsp.context["codelists_page"].object_list) == [codelist]
+
+
+def test_search_does_not_write(client, organisation, create_codelist):
+    codelist = create_codelist(name="Codelist 1", description="Asthma")
+    # the index's fingerprint is now out of date, but searching doesn't rebuild it
+    codelist.save()
+
+    with CaptureQueriesContext(connection) as queries:
+        rsp = client.get("/?q=asthma")
+    assert list(rsp.context["codelists_page"].object_list) == [codelist]
+    assert not [
+        query
+        for query in queries.captured_queries
+        if not query["sql"].lstrip().startswith(("SELECT", "SAVEPOINT", "RELEASE"))
+    ]
@@ -1,8 +1,12 @@
 import re
+from unittest.mock import patch
 
 from bs4 import BeautifulSoup
 from django.urls import reverse
 
+from codelists.actions import delete_version, publish_version
+from codelists.render_cache import render_cache
+
 from .helpers import force_login
 
 
@@ -291,3 +295,45 @@ def test_under_review_version_visible_in_sidebar_for_non_editor(
     section_text = versions_section.get_text(" ", strip=True)
     assert version_under_review.tag_or_hash in section_text
     assert latest_published_version.tag_or_hash in section_text
+
+
+def test_page_data_is_cached(client, version_with_some_searches):
+    url = version_with_some_searches.get_absolute_url()
+    rsp = client.get(url)
+
+    with patch("codelists.views.version._build_page_data") as build_page_data:
+        cached_rsp = client.get(url)
+
+    build_page_data.assert_not_called()
+    assert cached_rsp.context["tree_data"] == rsp.context["tree_data"]
+    assert cached_rsp.context["search_results"] == rsp.context["search_results"]
+    assert cached_rsp.context["rows"] == rsp.context["rows"]
+    assert render_cache.stats()["hits"] == 1
+
+
+def test_page_data_rebuilt_after_status_change(client, version_under_review):
+    url = version_under_review.get_absolute_url()
+    client.get(url)
+
+    publish_version(version=version_under_review)
+    client.get(url)
+
+    assert render_cache.stats()["misses"] == 2
+
+
+def test_page_data_invalidated_on_delete(client, version_under_review):
+    client.get(version_under_review.get_absolute_url())
+    assert render_cache.stats()["size"] == 1
+
+    delete_version(version=version_under_review)
+
+    assert render_cache.stats()["size"] == 0
+
+
+def test_tree_data_lists_each_code_once(client, version_with_some_searches):
+    rsp = client.get(version_with_some_searches.get_absolute_url())
+
+    tree_data = rsp.context["tree_data"]
+    ids = [node["id"] for node in tree_data["nodes"]]
+    assert tree_data["sections"]
+    assert len(ids) == len(set(ids))
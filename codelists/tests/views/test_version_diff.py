@@ -1,7 +1,11 @@
+from unittest.mock import PropertyMock, patch
+
 import pytest
 from django.urls import reverse
 
-from codelists.views.version_diff import summarise
+from codelists.diff import MergedHierarchy, _diff_versions, diff_cache, summarise
+from codelists.hierarchy import Hierarchy
+from codelists.models import CodelistVersion
 
 
 def test_get(client, version_with_no_searches, version_with_some_searches):
@@ -227,3 +231,93 @@ def test_version_diff_by_tag_in_codelist(
     assert rsp.status_code == 200
     assert rsp.context["lhs"].id == version_with_no_searches.id
     assert rsp.context["rhs"].id == version_with_some_searches.id
+
+
+def test_get_is_cached(client, version_with_no_searches, version_with_some_searches):
+    url = version_with_no_searches.get_diff_url(version_with_some_searches)
+    rsp = client.get(url)
+    assert rsp.status_code == 200
+    assert diff_cache.stats()["misses"] == 1
+
+    rsp = client.get(url)
+    assert rsp.status_code == 200
+    assert diff_cache.stats()["hits"] == 1
+
+
+def test_get_uses_cached_hierarchies(
+    client, version_with_no_searches, version_with_some_searches
+):
+    with patch.object(Hierarchy, "from_codes") as from_codes:
+        rsp = client.get(
+            version_with_no_searches.get_diff_url(version_with_some_searches)
+        )
+    assert rsp.status_code == 200
+    from_codes.assert_not_called()
+    assert rsp.context["rhs_only_summary"] == [
+        {
+            "code": "439656005",
+            "descendants": [{"code": "202855006", "term": "Lateral epicondylitis"}],
+            "term": "Arthritis of elbow",
+        }
+    ]
+
+
+def test_merged_hierarchy():
+    # In the second release, c has moved from under b to under a
+    lhs_hierarchy = Hierarchy("r", [("r", "a"), ("r", "b"), ("b", "c")])
+    rhs_hierarchy = Hierarchy("r", [("r", "a"), ("r", "b"), ("a", "c"), ("c", "d")])
+    hierarchy = MergedHierarchy(lhs_hierarchy, rhs_hierarchy)
+
+    assert hierarchy.nodes == {"r", "a", "b", "c", "d"}
+    assert hierarchy.ancestors("c") == {"r", "a", "b"}
+    assert hierarchy.descendants("b") == {"c"}
+    assert hierarchy.descendants("a") == {"c", "d"}
+    assert hierarchy.filter_to_ultimate_ancestors({"b", "c", "d"}) == {"b"}
+
+
+def test_cross_release_diff_merges_hierarchies(
+    version_with_no_searches, version_with_some_searches, create_coding_system_release
+):
+    lhs = version_with_no_searches
+    rhs = version_with_some_searches
+    lhs_hierarchy = lhs.hierarchy
+
+    # In the right-hand version's release, 202855006 (Lateral epicondylitis) is no
+    # longer a descendant of 439656005 (Arthritis of elbow)
+    rhs_edges = [
+        (parent, child)
+        for parent, children in rhs.hierarchy.child_map.items()
+        for child in children
+        if child != "202855006"
+    ]
+    rhs_hierarchy = Hierarchy(
+        rhs.hierarchy.root, [*rhs_edges, ("138875005", "202855006")]
+    )
+    assert "202855006" not in rhs_hierarchy.descendants("439656005")
+
+    rhs.coding_system_release = create_coding_system_release("snomedct")
+    hierarchies = {lhs.pk: lhs_hierarchy, rhs.pk: rhs_hierarchy}
+    with (
+        patch.object(
+            CodelistVersion,
+            "coding_system",
+            new_callable=PropertyMock,
+            return_value=lhs.coding_system,
+        ),
+        patch(
+            "codelists.diff._get_cached_hierarchy",
+            side_effect=lambda clv: hierarchies[clv.pk],
+        ),
+        patch.object(Hierarchy, "from_codes") as from_codes,
+    ):
+        diff = _diff_versions(lhs, rhs)
+    from_codes.assert_not_called()
+
+    # the codes' relationships in either release are used
+    assert diff["rhs_only_summary"] == [
+        {
+            "code": "439656005",
+            "descendants": [{"code": "202855006", "term": "Lateral epicondylitis"}],
+            "term": "Arthritis of elbow",
+        }
+    ]
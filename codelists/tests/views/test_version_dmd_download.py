@@ -1,4 +1,16 @@
+import gzip
+
+
 def test_get(client, bnf_data, bnf_version_asthma):
     rsp = client.get(bnf_version_asthma.get_dmd_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
+    assert data == bnf_version_asthma.dmd_csv_data_for_download()
+
+
+def test_get_gzip(client, bnf_data, bnf_version_asthma):
+    rsp = client.get(
+        bnf_version_asthma.get_dmd_download_url(), headers={"Accept-Encoding": "gzip"}
+    )
+    assert rsp["Content-Encoding"] == "gzip"
+    data = gzip.decompress(rsp.getvalue()).decode("utf8")
     assert data == bnf_version_asthma.dmd_csv_data_for_download()
@@ -1,19 +1,48 @@
+import gzip
+from unittest.mock import patch
+
 import pytest
 
+from codelists.models import CodelistVersion
+from mappings.dmdvmpprevmap.import_data import build_mapping_closure
 from mappings.dmdvmpprevmap.models import Mapping
 from opencodelists.csv_utils import csv_data_to_rows
 
 
 def test_get(client, version):
     rsp = client.get(version.get_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     assert data == version.csv_data_for_download()
 
 
+@pytest.mark.parametrize("query", ["", "?fixed-headers", "?omit-mapped-vmps"])
+def test_get_does_not_write(client, dmd_version_asthma_medication, query):
+    # The data for every download is cached when the version is created
+    with patch.object(CodelistVersion, "save") as save:
+        rsp = client.get(dmd_version_asthma_medication.get_download_url() + query)
+
+    assert rsp.status_code == 200
+    save.assert_not_called()
+
+
+@pytest.mark.parametrize("query", ["", "?fixed-headers"])
+def test_get_uncached(client, version, query):
+    expected = version.csv_data_for_download(fixed_headers=bool(query))
+    version.cached_csv_data = {}
+    version.save()
+
+    # the download is streamed one row at a time, without building all of it
+    with patch.object(CodelistVersion, "_build_csv_data_for_download") as build:
+        rsp = client.get(version.get_download_url() + query)
+
+    build.assert_not_called()
+    assert rsp.getvalue().decode("utf8") == expected
+
+
 def test_get_with_original_headers(client, old_style_version):
     # by default, the original csv data is downloaded
     rsp = client.get(old_style_version.get_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     assert data == old_style_version.csv_data_for_download()
     assert csv_data_to_rows(data)[0] == ["code", "name"]
 
@@ -21,7 +50,7 @@ def test_get_with_original_headers(client, old_style_version):
 def test_get_with_fixed_headers(client, old_style_version):
     assert old_style_version.table[0] == ["code", "name"]
     rsp = client.get(old_style_version.get_download_url() + "?fixed-headers")
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     assert data == old_style_version.csv_data_for_download(fixed_headers=True)
     assert csv_data_to_rows(data)[0] == ["code", "term"]
 
@@ -31,8 +60,10 @@ def test_get_with_fixed_headers_no_matching_term(client, old_style_version):
         "code,name", "id,unk_description"
     )
     old_style_version.save()
+    # csv_data has changed, so refresh the data cached when the version was created
+    old_style_version.cache_csv_data()
     rsp = client.get(old_style_version.get_download_url() + "?fixed-headers")
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     assert data == old_style_version.csv_data_for_download(fixed_headers=True)
     rows = csv_data_to_rows(data)
     assert rows[0] == ["code", "term"]
@@ -54,9 +85,12 @@ def test_get_with_mapped_vmps(client, dmd_version_asthma_medication):
     Mapping.objects.create(id="10514511000001106", vpidprev="999")
     # create a new mapping for one of the dmd codes
     Mapping.objects.create(id="888", vpidprev="10514511000001106")
+    build_mapping_closure()
 
+    # cached download data is refreshed after mappings are updated by a dm+d import
+    dmd_version_asthma_medication.cache_csv_data()
     rsp = client.get(dmd_version_asthma_medication.get_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     # Includes mapped VMPs  and uses fixed headers by default
     # Includes an additional column with the original code header
     assert csv_data_to_rows(data) == [
@@ -102,9 +136,12 @@ def test_get_with_mapped_vmps_and_original_code_column(
 
     # create a previous mapping for one of the dmd codes
     Mapping.objects.create(id="10514511000001106", vpidprev="999")
+    build_mapping_closure()
 
+    # cached download data is refreshed after mappings are updated by a dm+d import
+    dmd_version_asthma_medication.cache_csv_data()
     rsp = client.get(dmd_version_asthma_medication.get_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     # Includes mapped VMPs by default, and uses fixed headers
     # No additional column when the original code column was already "code"
     assert csv_data_to_rows(data) == [
@@ -197,13 +234,16 @@ def test_get_with_mapped_vmps_no_term_column(
     Mapping.objects.create(id="10514511000001106", vpidprev="999")
     # create a new mapping for one of the dmd codes
     Mapping.objects.create(id="888", vpidprev="10514511000001106")
+    build_mapping_closure()
 
     # update CSV data
     dmd_version_asthma_medication.csv_data = csv_data
     dmd_version_asthma_medication.save()
 
+    # cached download data is refreshed after mappings are updated by a dm+d import
+    dmd_version_asthma_medication.cache_csv_data()
     rsp = client.get(dmd_version_asthma_medication.get_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     # Includes mapped VMPs  and uses fixed headers by default
     # Includes an additional column with the original code header
     assert csv_data_to_rows(data) == expected
@@ -214,11 +254,14 @@ def test_get_with_mapped_vmps_and_fixed_headers(client, dmd_version_asthma_medic
     Mapping.objects.create(id="10514511000001106", vpidprev="999")
     # create a new mapping for one of the dmd codes
     Mapping.objects.create(id="888", vpidprev="10514511000001106")
+    build_mapping_closure()
 
+    # cached download data is refreshed after mappings are updated by a dm+d import
+    dmd_version_asthma_medication.cache_csv_data()
     rsp = client.get(
         dmd_version_asthma_medication.get_download_url() + "?fixed-headers"
     )
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     # Includes mapped VMPs by default, and uses fixed headers
     # No additional column with the original code header when fixed headers are explictly requested
     assert csv_data_to_rows(data) == [
@@ -244,9 +287,12 @@ def test_get_with_duplicated_mapped_vmps(client, dmd_version_asthma_medication):
     # create new mappings from 2 different codes to the code 10514511000001106
     Mapping.objects.create(id="888", vpidprev="10514511000001106")
     Mapping.objects.create(id="777", vpidprev="10514511000001106")
+    build_mapping_closure()
 
+    # cached download data is refreshed after mappings are updated by a dm+d import
+    dmd_version_asthma_medication.cache_csv_data()
     rsp = client.get(dmd_version_asthma_medication.get_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     # Includes mapped VMPs by default, and uses fixed headers
     assert csv_data_to_rows(data) == [
         ["code", "term", "dmd_id", "dmd_type", "bnf_code"],
@@ -280,8 +326,9 @@ def test_get_with_mapped_vmps_nothing_to_map(client, dmd_version_asthma_medicati
     # Test that the download still works even if there are no relevant mapped VMPs
     # create a previous mapping for some other unrelated dmd code
     Mapping.objects.create(id="111", vpidprev="999")
+    build_mapping_closure()
     rsp = client.get(dmd_version_asthma_medication.get_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
 
     assert csv_data_to_rows(data) == [
         ["code", "term", "dmd_id", "dmd_type", "bnf_code"],
@@ -305,10 +352,11 @@ def test_get_with_mapped_vmps_nothing_to_map(client, dmd_version_asthma_medicati
 def test_get_without_mapped_vmps(client, dmd_version_asthma_medication):
     # create a mapping for one of the dmd codes
     Mapping.objects.create(id="10514511000001106", vpidprev="999")
+    build_mapping_closure()
     rsp = client.get(
         dmd_version_asthma_medication.get_download_url() + "?omit-mapped-vmps"
     )
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     # omitting mapped VMPs, just download the CSV data as is
     rows = csv_data_to_rows(data)
     assert rows[0] == ["dmd_type", "dmd_id", "dmd_name", "bnf_code"]
@@ -336,9 +384,12 @@ def test_get_with_mapped_vmps_more_than_one_step_distant(
     Mapping.objects.create(id="AAA", vpidprev="10514511000001106")
     Mapping.objects.create(id="BBB", vpidprev="AAA")
     Mapping.objects.create(id="CCC", vpidprev="BBB")
+    build_mapping_closure()
 
+    # cached download data is refreshed after mappings are updated by a dm+d import
+    dmd_version_asthma_medication.cache_csv_data()
     rsp = client.get(dmd_version_asthma_medication.get_download_url())
-    data = rsp.content.decode("utf8")
+    data = rsp.getvalue().decode("utf8")
     assert csv_data_to_rows(data) == [
         ["code", "term", "dmd_id", "dmd_type", "bnf_code"],
         [
@@ -362,3 +413,23 @@ def test_get_with_mapped_vmps_more_than_one_step_distant(
         ["BBB", "VMP subsequent to 10514511000001106", "BBB", "VMP", "0301012A0AAABAB"],
         ["CCC", "VMP subsequent to 10514511000001106", "CCC", "VMP", "0301012A0AAABAB"],
     ]
+
+
+def test_get_gzip(client, dmd_version_asthma_medication):
+    version = dmd_version_asthma_medication
+    rsp = client.get(version.get_download_url(), headers={"Accept-Encoding": "gzip"})
+
+    assert rsp["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in rsp["Vary"]
+    data = gzip.decompress(rsp.getvalue()).decode("utf8")
+    assert data == version.csv_data_for_download()
+    assert version.csv_data_sha(data) == version.csv_data_shas()[0]
+
+
+def test_get_without_accepted_encoding(client, version):
+    rsp = client.get(
+        version.get_download_url(), headers={"Accept-Encoding": "gzip;q=0, br"}
+    )
+
+    assert not rsp.has_header("Content-Encoding")
+    assert rsp.getvalue().decode("utf8") == version.csv_data_for_download()
@@ -1,53 +1,61 @@
 """Module for building tree data structures from coding system hierarchies."""
 
 
-def build_tree_data(
+def build_tree_table(
     child_map, code_to_term, code_to_status, tree_tables, sort_by_term=True
 ):
     """
-    Builds a hierarchical tree structure from coding system data.
+    Builds a compact table of the trees for each section of coding system data.
+
+    Each code appears in the table once, however many parents it has, and its children
+    are sorted once.  This avoids repeating shared subtrees, which are common in
+    polyhierarchies such as SNOMED CT's, and so the size of the table is linear in the
+    size of the hierarchy.
 
     Args:
         child_map: Dictionary mapping codes to their children
         code_to_term: Dictionary mapping codes to their terms
         code_to_status: Dictionary mapping codes to their status (+ or -)
         tree_tables: List of (title, codes) tuples for each tree section
+        sort_by_term: Whether to sort children by term, rather than by code
 
     Returns:
-        List of dictionaries, each containing a title and its associated tree of codes.
-        Each node in the tree contains:
-        - id: the code
-        - name: the term associated with the code
-        - status: whether the code is included (+) or excluded (-)
-        - children: sorted list of child nodes
-        - depth: the node's depth in the tree
+        A dictionary with:
+        - nodes: list of nodes, each containing:
+          - id: the code
+          - name: the term associated with the code
+          - status: whether the code is included (+) or excluded (-)
+          - children: sorted list of the indices of child nodes in nodes
+        - sections: list of dictionaries, each containing a title and the indices of
+          the nodes at the roots of its tree
     """
 
-    def process_node(code, depth=0):
-        """
-        Recursively processes a code and its children to build a tree node.
-
-        Args:
-            code: The code to process
-            depth: The current depth in the tree (defaults to 0 for root nodes)
-
-        Returns:
-            A dictionary representing the node and its children
-        """
-
-        children = [process_node(child, depth + 1) for child in child_map.get(code, [])]
-
-        return {
-            "id": code,
-            "name": code_to_term[code],
-            "status": code_to_status[code],
-            "children": sorted(
-                children, key=lambda x: x["name" if sort_by_term else "id"]
-            ),
-            "depth": depth,
-        }
-
-    return [
-        {"title": title, "children": [process_node(code) for code in children]}
-        for title, children in tree_tables
-    ]
+    index = {}
+    nodes = []
+    todo = []
+
+    def node_index(code):
+        if code not in index:
+            index[code] = len(nodes)
+            nodes.append(
+                {
+                    "id": code,
+                    "name": code_to_term[code],
+                    "status": code_to_status[code],
+                    "children": [],
+                }
+            )
+            todo.append(code)
+        return index[code]
+
+    sort_key = code_to_term.__getitem__ if sort_by_term else None
+    sections = []
+    for title, codes in tree_tables:
+        roots = [node_index(code) for code in codes]
+        while todo:
+            code = todo.pop()
+            children = sorted(child_map.get(code, []), key=sort_key)
+            nodes[index[code]]["children"] = [node_index(child) for child in children]
+        sections.append({"title": title, "roots": roots})
+
+    return {"nodes": nodes, "sections": sections}
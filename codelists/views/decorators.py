@@ -116,7 +116,7 @@ def _load_version_or_404(codelist, tag_or_hash):
     else:
         q |= Q(id=id)
 
-    return get_object_or_404(codelist.versions.filter(q))
+    return get_object_or_404(codelist.versions.with_cached_hierarchy().filter(q))
 
 
 def require_permission(view_fn):
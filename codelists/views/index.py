@@ -1,10 +1,10 @@
 import re
 
 from django.core.paginator import Paginator
-from django.db.models import Case, IntegerField, Q, Value, When
 from django.shortcuts import render
 
 from ..models import Handle, Status
+from ..search_index import search
 
 
 def _parse_search_query(query):
@@ -46,41 +46,10 @@ def search_handles(handles, q):
             # If no valid search terms, skip search and just order by name
             handles = handles.order_by("name")
         else:
-            # We search for codelists whose name/description contain all the words
-            # in the query string. Quoted phrases are treated as single terms. We then
-            # rank the results as follows:
-            # 1. Exact phrase match in name (rank 1)
-            # 2. All words in name (rank 2)
-            # 3. Any word in name (rank 3)
-            # 4. Any word in description (rank 4)
-
-            whole_phrase_in_name = Q(name__icontains=q.strip().strip('"'))
-            all_terms_in_name = Q()
-            any_term_in_name = Q()
-            any_term_in_desc = Q()
-            combined_search_query = Q()
-            for term in all_search_terms:
-                term_in_name = Q(name__icontains=term)
-                term_in_desc = Q(codelist__description__icontains=term)
-                all_terms_in_name &= term_in_name
-                any_term_in_name |= term_in_name
-                any_term_in_desc |= term_in_desc
-                combined_search_query &= term_in_name | term_in_desc
-
-            handles = (
-                handles.annotate(
-                    rank=Case(
-                        When(whole_phrase_in_name, then=Value(1)),
-                        When(all_terms_in_name, then=Value(2)),
-                        When(any_term_in_name, then=Value(3)),
-                        When(any_term_in_desc, then=Value(4)),
-                        default=Value(5),
-                        output_field=IntegerField(),
-                    )
-                )
-                .filter(combined_search_query)
-                .order_by("rank", "name")
-            )
+            # We search for codelists whose name, description, methodology or tags
+            # contain all the words in the query string, with quoted phrases treated
+            # as single terms, and rank the results.  See codelists/search_index.py.
+            handles = search(handles, all_search_terms, q.strip().strip('"'))
     else:
         handles = handles.order_by("name")
 
@@ -6,7 +6,8 @@ from coding_systems.versioning.models import CodingSystemRelease
 
 from ..models import Status
 from ..presenters import present_search_results
-from ..tree_data import build_tree_data
+from ..render_cache import render_cache
+from ..tree_data import build_tree_table
 from .decorators import load_version
 
 
@@ -15,48 +16,21 @@ MEDICATION_WARNING_BANNER_CODING_SYSTEMS = ["dmd", "bnf"]
 
 @load_version
 def version(request, clv):
-    child_map = None
-    code_to_status = None
-    code_to_term = None
-    tree_tables = None
-    tree_data = None
-    if clv.coding_system.is_builder_compatible():
-        coding_system = clv.coding_system
-
-        hierarchy = clv.codeset.hierarchy
-        child_map = {c: list(pp) for c, pp in hierarchy.child_map.items()}
-        code_to_term = coding_system.code_to_term(hierarchy.nodes)
-        included = set(clv.codes) & hierarchy.nodes
-        excluded = hierarchy.nodes - included
-        code_to_status = {
-            **{code: "+" for code in included},
-            **{code: "-" for code in excluded},
-        }
-        ancestor_codes = hierarchy.filter_to_ultimate_ancestors(included)
-        unknown_codes = set(clv.codes) - set(coding_system.lookup_names(clv.codes))
-        if unknown_codes:
-            messages.warning(
-                request,
-                format_html(
-                    "WARNING: Codelist contains codes not found in {}",
-                    coding_system.name,
-                ),
-            )
-        tree_tables = sorted(
-            (type.title(), sorted(codes, key=code_to_term.__getitem__))
-            for type, codes in coding_system.codes_by_type(
-                ancestor_codes, hierarchy
-            ).items()
-        )
-        tree_data = build_tree_data(
-            child_map,
-            code_to_term,
-            code_to_status,
-            tree_tables,
-            coding_system.sort_by_term,
+    page_data = render_cache.get(
+        clv.pk,
+        (clv.updated_at, clv.coding_system_release_id),
+        lambda: _build_page_data(clv),
+    )
+    if page_data["has_unknown_codes"]:
+        messages.warning(
+            request,
+            format_html(
+                "WARNING: Codelist contains codes not found in {}",
+                clv.coding_system.name,
+            ),
         )
 
-    headers, *rows = clv.table
+    headers, *rows = page_data["table"]
     user_can_edit = clv.codelist.can_be_edited_by(request.user)
     visible_versions = clv.codelist.visible_versions(
         user=request.user, include_version_id=clv.id
@@ -93,12 +67,56 @@ def version(request, clv):
         "versions": visible_versions,
         "headers": headers,
         "rows": rows,
-        "search_results": present_search_results(clv, code_to_term),
+        "search_results": page_data["search_results"],
         "user_can_edit": user_can_edit,
         "can_create_new_version": can_create_new_version,
-        "tree_data": tree_data,
+        "tree_data": page_data["tree_data"],
         "latest_published_version_url": latest_published_version_url,
         "count_codes_included": len(rows),
         "coding_system_release_outdated": coding_system_release_outdated,
     }
     return render(request, "codelists/version.html", ctx)
+
+
+def _build_page_data(clv):
+    """Return the data for the version's page that depends only on the version and its
+    coding system release, which is cached by render_cache."""
+
+    code_to_term = None
+    has_unknown_codes = False
+    tree_data = None
+    if clv.coding_system.is_builder_compatible():
+        coding_system = clv.coding_system
+
+        hierarchy = clv.codeset.hierarchy
+        child_map = {c: list(pp) for c, pp in hierarchy.child_map.items()}
+        code_to_term = coding_system.code_to_term(hierarchy.nodes)
+        included = set(clv.codes) & hierarchy.nodes
+        excluded = hierarchy.nodes - included
+        code_to_status = {
+            **{code: "+" for code in included},
+            **{code: "-" for code in excluded},
+        }
+        ancestor_codes = hierarchy.filter_to_ultimate_ancestors(included)
+        unknown_codes = set(clv.codes) - set(coding_system.lookup_names(clv.codes))
+        has_unknown_codes = bool(unknown_codes)
+        tree_tables = sorted(
+            (type.title(), sorted(codes, key=code_to_term.__getitem__))
+            for type, codes in coding_system.codes_by_type(
+                ancestor_codes, hierarchy
+            ).items()
+        )
+        tree_data = build_tree_table(
+            child_map,
+            code_to_term,
+            code_to_status,
+            tree_tables,
+            coding_system.sort_by_term,
+        )
+
+    return {
+        "table": clv.table,
+        "search_results": present_search_results(clv, code_to_term),
+        "tree_data": tree_data,
+        "has_unknown_codes": has_unknown_codes,
+    }
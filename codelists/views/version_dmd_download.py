@@ -1,12 +1,12 @@
-from django.http import HttpResponse
+from opencodelists.http_utils import streaming_csv_response
 
 from .decorators import load_version
 
 
 @load_version
 def version_dmd_download(request, clv):
-    response = HttpResponse(content_type="text/csv")
-    content_disposition = f'attachment; filename="{clv.download_filename()}-dmd.csv"'
-    response["Content-Disposition"] = content_disposition
-    response.write(clv.dmd_csv_data_for_download())
-    return response
+    return streaming_csv_response(
+        request,
+        clv.iter_dmd_csv_data_for_download(),
+        f"{clv.download_filename()}-dmd.csv",
+    )
@@ -1,4 +1,6 @@
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import HttpResponseBadRequest
+
+from opencodelists.http_utils import streaming_csv_response
 
 from .decorators import load_version
 
@@ -9,12 +11,11 @@ def version_download(request, clv):
     omit_mapped_vmps = "omit-mapped-vmps" in request.GET
     if not clv.downloadable:
         return HttpResponseBadRequest("Codelist is not downloadable")
-    response = HttpResponse(content_type="text/csv")
-    content_disposition = f'attachment; filename="{clv.download_filename()}.csv"'
-    response["Content-Disposition"] = content_disposition
-    response.write(
-        clv.csv_data_for_download(
-            fixed_headers=fixed_headers, include_mapped_vmps=not omit_mapped_vmps
-        )
+    # The data for the download is streamed: in slices if it is cached, which avoids
+    # holding a second encoded (and compressed) copy of it in memory, and otherwise one
+    # row at a time, as the rows of the table are generated.  The terms of the codes
+    # (and, for dm+d, the mapped VMPs) are still looked up all at once.
+    strings = clv.iter_csv_data_for_download(
+        fixed_headers=fixed_headers, include_mapped_vmps=not omit_mapped_vmps
     )
-    return response
+    return streaming_csv_response(request, strings, f"{clv.download_filename()}.csv")
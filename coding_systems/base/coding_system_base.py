@@ -1,8 +1,83 @@
+import hashlib
 from abc import ABC
+from dataclasses import dataclass
+from functools import wraps
 
+from django.conf import settings
+from django.core.cache import caches
 from django.utils.functional import cached_property
 
-from coding_systems.versioning.models import CodingSystemRelease
+from coding_systems.versioning.models import CodingSystemRelease, ReleaseState
+from opencodelists.db_utils import iter_changed_rows
+
+
+def cached_lookup(method):
+    """Decorate a BuilderCompatibleCodingSystem method that takes a collection of codes
+    and returns a dict keyed by the codes that were found, so that results are
+    memoised per (database alias, batch of codes) in the "coding_systems" cache.
+
+    See BuilderCompatibleCodingSystem.cached_lookup.
+    """
+
+    @wraps(method)
+    def wrapped(self, codes):
+        return self.cached_lookup(
+            method.__name__, codes, lambda codes: method(self, codes)
+        )
+
+    return wrapped
+
+
+@dataclass(frozen=True)
+class ConceptChanges:
+    """The codes of concepts that differ between two releases of a coding system.
+
+    See BuilderCompatibleCodingSystem.concept_changes.
+    """
+
+    added: frozenset
+    removed: frozenset
+    # concepts with a parent or child that was added or removed
+    reparented: frozenset
+    # concepts with a term, or another searchable attribute, that was added or removed
+    changed_terms: frozenset
+
+    @classmethod
+    def from_queries(
+        cls, previous_database, database, concepts_sql, relationships_sql, terms_sql
+    ):
+        """Build ConceptChanges by comparing the results of queries against the databases
+        of two releases.
+
+        concepts_sql returns (code,) for each concept, relationships_sql returns
+        (parent_code, child_code) for each relationship, and terms_sql returns
+        (code, term) for each searchable term.  Each must meet the requirements of
+        iter_changed_rows().
+        """
+
+        changes = {"added": set(), "removed": set(), "reparented": set()}
+        for added, (code,) in iter_changed_rows(
+            concepts_sql, previous_database, database
+        ):
+            changes["added" if added else "removed"].add(code)
+        for _, (parent_code, child_code) in iter_changed_rows(
+            relationships_sql, previous_database, database
+        ):
+            changes["reparented"].update([parent_code, child_code])
+        changed_terms = {
+            code
+            for _, (code, _) in iter_changed_rows(
+                terms_sql, previous_database, database
+            )
+        }
+        return cls(
+            **{field: frozenset(codes) for field, codes in changes.items()},
+            changed_terms=frozenset(changed_terms),
+        )
+
+    @cached_property
+    def codes(self):
+        return self.added | self.removed | self.reparented | self.changed_terms
 
 
 class BaseCodingSystem(ABC):
@@ -139,6 +214,43 @@ class BuilderCompatibleCodingSystem(BaseCodingSystem):
     # the order E10, E11, E12 etc, rather than alphabetical
     sort_by_term = True
 
+    @cached_property
+    def is_cacheable(self):
+        """Whether lookups against this release can be cached.
+
+        A release's database is never changed once the release is ready to use, so
+        lookups can be cached indefinitely.  This is not the case while it is being
+        imported.
+        """
+        return CodingSystemRelease.objects.filter(
+            database_alias=self.database_alias, state=ReleaseState.READY
+        ).exists()
+
+    def cached_lookup(self, lookup_name, codes, lookup):
+        """Return lookup(codes), using the cached result if the same batch of codes has
+        been looked up before.
+
+        A lookup is a single indexed query for the whole batch, so the result for the
+        batch is cached as one entry, keyed by a digest of its codes, rather than an
+        entry per code, which would cost more to read and write than the query it
+        replaces.  The same batches are looked up repeatedly, for instance the codes of
+        a version each time one of its pages is viewed.  See the
+        benchmark_cached_lookups command.
+        """
+        if settings.CODING_SYSTEMS_CACHE_SIZE <= 0 or not self.is_cacheable:
+            return lookup(codes)
+
+        codes = sorted(set(codes), key=str)
+        digest = hashlib.sha256("\n".join(map(str, codes)).encode("utf8")).hexdigest()
+        key = f"{self.database_alias}:{lookup_name}:{digest}"
+
+        cache = caches["coding_systems"]
+        result = cache.get(key)
+        if result is None:
+            result = lookup(codes)
+            cache.set(key, result)
+        return result
+
     def ancestor_relationships(self, codes):  # pragma: no cover
         """
         This method, in combination with `descendant_relationships`, defines
@@ -175,6 +287,17 @@ class BuilderCompatibleCodingSystem(BaseCodingSystem):
         """
         raise NotImplementedError
 
+    def concept_changes(self, previous):
+        """
+        Return ConceptChanges between previous, an earlier release of this coding
+        system, and this release, or None if this coding system doesn't support finding
+        them.
+
+        This is used to find the codelist versions that might not be compatible with
+        a new release, so that other versions don't need to be checked in full.  See
+        coding_systems/base/import_data_utils.py.
+        """
+
     def search_by_term(self, term):  # pragma: no cover
         """
         Return the codes within a coding system that match a "term"-based search,
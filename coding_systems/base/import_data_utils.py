@@ -1,10 +1,13 @@
+import multiprocessing
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from itertools import islice
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management import call_command
-from django.db import transaction
+from django.db import OperationalError, connections, transaction
 from django.db.models import Q
 from django.utils import timezone
 from tqdm import tqdm
@@ -209,6 +212,12 @@ def update_codelist_version_compatibility(coding_system_id, new_database_alias):
     2) if the version has searches, rerun the searches with the new release and check that the
     results are the same
 
+    Where the coding system supports it, we first find the concepts that have changed
+    between the previous release and the new one (see
+    BuilderCompatibleCodingSystem.concept_changes).  A version whose hierarchy includes
+    none of these concepts, and whose searches don't match any of them in either
+    release, would pass both checks, and so is marked compatible without being checked
+    in full.
     """
     new_coding_system = CODING_SYSTEMS[coding_system_id](
         database_alias=new_database_alias
@@ -221,8 +230,19 @@ def update_codelist_version_compatibility(coding_system_id, new_database_alias):
         f"Found {len(versions_to_check)} versions compatible with previous release '{previous_release.database_alias}'."
     )
 
+    previous_coding_system = CODING_SYSTEMS[coding_system_id](
+        database_alias=previous_release.database_alias
+    )
+    changes = get_concept_changes(previous_coding_system, new_coding_system)
+    if changes is not None:
+        print(f"Found {len(changes.codes)} concepts changed since previous release.")
+
     compatible_count = check_and_update_compatibile_versions(
-        new_coding_system, versions_to_check
+        new_coding_system,
+        versions_to_check,
+        previous_coding_system=previous_coding_system,
+        changes=changes,
+        workers=settings.COMPATIBILITY_CHECK_WORKERS,
     )
     print(
         f"{len(versions_to_check)} checked; {compatible_count} identified as compatible"
@@ -248,6 +268,51 @@ def get_versions_compatible_with_previous(coding_system):
     return versions, previous_release
 
 
+def get_concept_changes(previous_coding_system, coding_system):
+    """Return the ConceptChanges between two releases, or None if they can't be found,
+    in which case every version must be checked in full."""
+    try:
+        return coding_system.concept_changes(previous_coding_system)
+    except OperationalError as e:
+        # eg the previous release's database is not available
+        print(f"Could not compare with previous release: {e}")
+        return None
+
+
+def version_is_unaffected_by_changes(
+    previous_coding_system, coding_system, version, changes
+):
+    """
+    Determine whether a version is unaffected by changes between two releases, and so
+    is compatible with the later release if it was compatible with the earlier one.
+
+    A version's hierarchy contains all the concepts whose ancestors or descendants
+    would be included in a hierarchy built from its codes, and all of its search
+    results.  If none of these concepts have changed, the hierarchy would be
+    identical in the new release.  And if, in addition, no concept whose term has
+    changed is matched by any of the version's searches in either release, the search
+    results would be identical too.
+
+    If a release can't be searched, eg because the previous release's database was
+    imported before it had a full-text index, the version is treated as affected, so
+    that it is checked in full.
+    """
+    if not changes.codes.isdisjoint(version.hierarchy.nodes):
+        return False
+    for search in version.searches.all():
+        for release_coding_system in [previous_coding_system, coding_system]:
+            try:
+                if search.term:
+                    matching_codes = release_coding_system.search_by_term(search.term)
+                else:
+                    matching_codes = release_coding_system.search_by_code(search.code)
+            except OperationalError:
+                return False
+            if not changes.codes.isdisjoint(matching_codes):
+                return False
+    return True
+
+
 def version_is_compatible_with_coding_system_release(coding_system, version):
     """
     Determine whether a single version is considered compatible with a specific coding system
@@ -262,17 +327,105 @@ def version_is_compatible_with_coding_system_release(coding_system, version):
     ) and _check_version_by_hierarchy(coding_system, version)
 
 
-def check_and_update_compatibile_versions(coding_system, versions):
+def check_and_update_compatibile_versions(
+    coding_system, versions, previous_coding_system=None, changes=None, workers=1
+):
     """
     Check compatibility of a set of codelist versions against a specific coding system release
     Update the compatible_releases for any version found to be compatible
+
+    If changes (the ConceptChanges since previous_coding_system, with which every
+    version is compatible) are given, versions unaffected by them are not checked in
+    full.
+
+    If workers is greater than one, versions are checked by a pool of worker
+    processes.  The compatible_releases of all compatible versions are updated together
+    once every version has been checked.
+    """
+    if workers > 1 and len(versions) > 1:
+        # Connections can't be shared with forked processes, so each worker opens its
+        # own, and this process reopens its connection when writing results.
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        )
+        check = partial(
+            check_version_compatibility_by_id,
+            coding_system.id,
+            coding_system.database_alias,
+            previous_coding_system and previous_coding_system.database_alias,
+            changes,
+        )
+        chunksize = max(1, len(versions) // (workers * 4))
+        results = executor.map(
+            check, [version.pk for version in versions], chunksize=chunksize
+        )
+    else:
+        executor = None
+        check = partial(
+            check_version_compatibility,
+            coding_system,
+            previous_coding_system,
+            changes,
+        )
+        results = ((version.pk, check(version)) for version in versions)
+
+    try:
+        compatible_version_ids = [
+            version_id
+            for version_id, compatible in tqdm(results, total=len(versions))
+            if compatible
+        ]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    CompatibleRelease = CodelistVersion.compatible_releases.through
+    CompatibleRelease.objects.bulk_create(
+        [
+            CompatibleRelease(
+                codelistversion_id=version_id,
+                codingsystemrelease_id=coding_system.release.id,
+            )
+            for version_id in compatible_version_ids
+        ],
+        ignore_conflicts=True,
+    )
+    return len(compatible_version_ids)
+
+
+def check_version_compatibility(
+    coding_system, previous_coding_system, changes, version
+):
+    """Return whether version is compatible with coding_system's release.  See
+    check_and_update_compatibile_versions()."""
+    if not version.has_hierarchy:
+        return False
+    if changes is not None and version_is_unaffected_by_changes(
+        previous_coding_system, coding_system, version, changes
+    ):
+        return True
+    return version_is_compatible_with_coding_system_release(coding_system, version)
+
+
+def check_version_compatibility_by_id(
+    coding_system_id, database_alias, previous_database_alias, changes, version_id
+):
+    """Return the id of the CodelistVersion, and whether it is compatible with a coding
+    system release.
+
+    This is called in worker processes by check_and_update_compatibile_versions(), so
+    it takes and returns values that can be pickled.
     """
-    compatible_count = 0
-    for version in tqdm(versions):
-        if version_is_compatible_with_coding_system_release(coding_system, version):
-            version.compatible_releases.add(coding_system.release)
-            compatible_count += 1
-    return compatible_count
+    coding_system_cls = CODING_SYSTEMS[coding_system_id]
+    coding_system = coding_system_cls(database_alias=database_alias)
+    previous_coding_system = previous_database_alias and coding_system_cls(
+        database_alias=previous_database_alias
+    )
+    version = CodelistVersion.objects.get(pk=version_id)
+    return version_id, check_version_compatibility(
+        coding_system, previous_coding_system, changes, version
+    )
 
 
 def _check_version_by_hierarchy(coding_system, version):
@@ -110,3 +110,48 @@ def test_release_name(
     assert (
         CODING_SYSTEMS["snomedct"](database_alias).release_name == expected_release_name
     )
+
+
+def test_lookups_are_cached(snomedct_data, django_assert_num_queries):
+    coding_system = CODING_SYSTEMS["snomedct"](database_alias="snomedct_test_20200101")
+    expected = coding_system.lookup_names(["239964003", "99999"])
+
+    with django_assert_num_queries(0, using="snomedct_test_20200101"):
+        assert coding_system.lookup_names(["239964003", "99999"]) == expected
+
+    # a new instance for the same release uses the same cache, whatever the order of
+    # the codes
+    coding_system = CODING_SYSTEMS["snomedct"](database_alias="snomedct_test_20200101")
+    with django_assert_num_queries(0, using="snomedct_test_20200101"):
+        assert coding_system.lookup_names(["99999", "239964003"]) == expected
+
+    # a different batch of codes is looked up with a single query
+    with django_assert_num_queries(1, using="snomedct_test_20200101"):
+        assert coding_system.lookup_names(["239964003", "99999", "705115006"]) == {
+            **expected,
+            "705115006": "Technology Preview module (core metadata concept)",
+        }
+
+
+def test_lookups_are_not_cached_while_importing(
+    snomedct_data, django_assert_num_queries
+):
+    CodingSystemRelease.objects.filter(database_alias="snomedct_test_20200101").update(
+        state=ReleaseState.IMPORTING
+    )
+    coding_system = CODING_SYSTEMS["snomedct"](database_alias="snomedct_test_20200101")
+    coding_system.lookup_names(["239964003"])
+
+    with django_assert_num_queries(1, using="snomedct_test_20200101"):
+        coding_system.lookup_names(["239964003"])
+
+
+def test_lookups_are_not_cached_when_disabled(
+    snomedct_data, django_assert_num_queries, settings
+):
+    settings.CODING_SYSTEMS_CACHE_SIZE = 0
+    coding_system = CODING_SYSTEMS["snomedct"](database_alias="snomedct_test_20200101")
+    coding_system.lookup_names(["239964003"])
+
+    with django_assert_num_queries(1, using="snomedct_test_20200101"):
+        coding_system.lookup_names(["239964003"])
@@ -1,18 +1,28 @@
 import json
 from datetime import datetime
+from functools import partial
+from unittest.mock import patch
 
 import pytest
 from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
 
 from builder.actions import create_search
 from builder.actions import save as save_draft_for_review
 from codelists.coding_systems import CODING_SYSTEMS
 from codelists.hierarchy import Hierarchy
 from codelists.models import Status
-from coding_systems.base.import_data_utils import update_codelist_version_compatibility
+from coding_systems.base.coding_system_base import ConceptChanges
+from coding_systems.base.import_data_utils import (
+    check_and_update_compatibile_versions,
+    check_version_compatibility,
+    update_codelist_version_compatibility,
+    version_is_compatible_with_coding_system_release,
+)
 from coding_systems.base.tests.dynamic_db_classes import DynamicDatabaseTestCase
 from coding_systems.bnf.models import Concept
 from coding_systems.conftest import mock_migrate_coding_system
+from coding_systems.snomedct.models import DESCRIPTION_SEARCH_TABLE
 from coding_systems.versioning.models import CodingSystemRelease, ReleaseState
 
 
@@ -79,6 +89,24 @@ class BaseCodingSystemDynamicDatabaseTestCase(DynamicDatabaseTestCase):
     def _get_bnf_release_excl_last_concept(self, _bnf_release_excl_last_concept):
         self.bnf_release = _bnf_release_excl_last_concept
 
+    @pytest.fixture
+    def _bnf_release_with_new_chapter(self, _bnf_csr):
+        self.add_to_testcase_allowed_db_aliases(self.db_aliases)
+
+        # setup the database as a duplicate of the fixture one, with an additional
+        # chapter that is unrelated to the existing concepts
+        csr = _bnf_csr()
+        _setup_db(csr)
+        Concept.objects.using(csr.database_alias).create(
+            code="04", type="Chapter", name="Central Nervous System"
+        )
+        yield csr
+        _cleanup_db(csr)
+
+    @pytest.fixture
+    def _get_bnf_release_with_new_chapter(self, _bnf_release_with_new_chapter):
+        self.bnf_release = _bnf_release_with_new_chapter
+
     @pytest.fixture
     def _bnf_releases(self, _bnf_csr):
         # This addition of a allowed database alias needs to be done
@@ -337,33 +365,273 @@ class TestUpdateCodelistVersionCompatibilityIsOrderInsensitive(
     def test_update_codelist_version_compatibility_is_order_insensitive(
         self,
     ):
-        # modify the cached hierarchy data such that order of list elements is reversed
-        modified_existing_cached_hierarchy = json.loads(
-            self.bnf_review_version_with_search.cached_hierarchy.data
-        )
-        modified_existing_cached_hierarchy["nodes"] = list(
-            reversed(modified_existing_cached_hierarchy["nodes"])
-        )
-        modified_existing_cached_hierarchy["child_map"] = {
-            k: list(reversed(v))
-            for k, v in modified_existing_cached_hierarchy["child_map"].items()
-        }
-        modified_existing_cached_hierarchy["parent_map"] = {
-            k: list(reversed(v))
-            for k, v in modified_existing_cached_hierarchy["parent_map"].items()
+        # replace the cached hierarchy with data in the legacy JSON format, with the
+        # order of list elements reversed
+        hierarchy = self.bnf_review_version_with_search.hierarchy
+        modified_existing_cached_hierarchy = {
+            "root": hierarchy.root,
+            "nodes": sorted(hierarchy.nodes, key=str, reverse=True),
+            "child_map": {
+                k: sorted(v, key=str, reverse=True)
+                for k, v in hierarchy.child_map.items()
+            },
+            "parent_map": {
+                k: sorted(v, key=str, reverse=True)
+                for k, v in hierarchy.parent_map.items()
+            },
+            "_descendants_cache": {},
+            "_ancestors_cache": {},
         }
         modified_existing_cached_hierarchy_data = json.dumps(
             modified_existing_cached_hierarchy
         )
-        assert (
-            modified_existing_cached_hierarchy_data
-            != self.bnf_review_version_with_search.cached_hierarchy.data
-        )
 
         self.bnf_review_version_with_search.cached_hierarchy.data = (
             modified_existing_cached_hierarchy_data
         )
+        self.bnf_review_version_with_search.cached_hierarchy.binary_data = None
         self.bnf_review_version_with_search.cached_hierarchy.save()
 
         update_codelist_version_compatibility("bnf", self.bnf_release.database_alias)
         assert self.bnf_review_version_with_search.compatible_releases.exists()
+
+
+class TestConceptChanges(BaseCodingSystemDynamicDatabaseTestCase):
+    db_aliases = (
+        # _bnf_release_excl_last_concept
+        "bnf_import-data_20221001",
+    )
+
+    @pytest.mark.usefixtures("_get_bnf_release_excl_last_concept")
+    def test_concept_changes(self):
+        previous_coding_system = CODING_SYSTEMS["bnf"](
+            database_alias="bnf_test_20200101"
+        )
+        coding_system = CODING_SYSTEMS["bnf"](
+            database_alias=self.bnf_release.database_alias
+        )
+
+        changes = coding_system.concept_changes(previous_coding_system)
+
+        assert changes.added == set()
+        assert changes.removed == {"0301012A0AAACAC"}
+        assert changes.reparented == {"0301012A0AA", "0301012A0AAACAC"}
+        assert changes.changed_terms == {"0301012A0AAACAC"}
+
+
+class TestUpdateCodelistVersionCompatibilityUnchangedRelease(
+    BaseCodingSystemDynamicDatabaseTestCase
+):
+    db_aliases = ("bnf_import-data_20221101",)
+
+    @pytest.mark.usefixtures("_get_bnf_release", "_get_bnf_review_version_with_search")
+    def test_update_codelist_version_compatibility_unchanged_release(self):
+        with patch(
+            "coding_systems.base.import_data_utils.version_is_compatible_with_coding_system_release"
+        ) as check:
+            update_codelist_version_compatibility(
+                "bnf", self.bnf_release.database_alias
+            )
+
+        # no concepts have changed, so the version is compatible without being checked
+        # in full
+        check.assert_not_called()
+        assert self.bnf_review_version_with_search.compatible_releases.exists()
+
+
+class TestUpdateCodelistVersionCompatibilityUnrelatedChange(
+    BaseCodingSystemDynamicDatabaseTestCase
+):
+    db_aliases = ("bnf_import-data_20221101",)
+
+    @pytest.mark.usefixtures(
+        "_get_bnf_release_with_new_chapter", "_get_bnf_review_version_with_search"
+    )
+    def test_update_codelist_version_compatibility_unrelated_change(self):
+        with patch(
+            "coding_systems.base.import_data_utils.version_is_compatible_with_coding_system_release"
+        ) as check:
+            update_codelist_version_compatibility(
+                "bnf", self.bnf_release.database_alias
+            )
+
+        # the new chapter is not in the version's hierarchy, and is not matched by its
+        # search, so the version is compatible without being checked in full
+        check.assert_not_called()
+        assert self.bnf_review_version_with_search.compatible_releases.exists()
+
+
+class TestUpdateCodelistVersionCompatibilityWithoutConceptChanges(
+    BaseCodingSystemDynamicDatabaseTestCase
+):
+    db_aliases = ("bnf_import-data_20221101",)
+
+    @pytest.mark.usefixtures("_get_bnf_release", "_get_bnf_review_version_with_search")
+    def test_update_codelist_version_compatibility_without_concept_changes(self):
+        with (
+            patch(
+                "coding_systems.bnf.coding_system.CodingSystem.concept_changes",
+                return_value=None,
+            ),
+            patch(
+                "coding_systems.base.import_data_utils.version_is_compatible_with_coding_system_release",
+                wraps=version_is_compatible_with_coding_system_release,
+            ) as check,
+        ):
+            update_codelist_version_compatibility(
+                "bnf", self.bnf_release.database_alias
+            )
+
+        # concept changes are not available, so the version is checked in full
+        checked_versions = [call.args[1] for call in check.call_args_list]
+        assert self.bnf_review_version_with_search in checked_versions
+        assert self.bnf_review_version_with_search.compatible_releases.exists()
+
+
+class TestCheckVersionCompatibilityWithoutSearchIndex(DynamicDatabaseTestCase):
+    db_aliases = ("snomedct_import-data_20191201",)
+
+    @pytest.fixture
+    def _previous_snomedct_release(self):
+        self.add_to_testcase_allowed_db_aliases(self.db_aliases)
+
+        # set up the previous release's database with the schema of the fixture one,
+        # but without the full-text index that older releases were imported without
+        csr = CodingSystemRelease.objects.create(
+            coding_system="snomedct",
+            release_name="import-data",
+            valid_from=datetime(2019, 12, 1),
+            state=ReleaseState.READY,
+        )
+        connections.databases[csr.database_alias] = {
+            **connections.databases[DEFAULT_DB_ALIAS],
+            "NAME": connections.databases[DEFAULT_DB_ALIAS]["NAME"].replace(
+                "default", csr.database_alias
+            ),
+        }
+        mock_migrate_coding_system(database=csr.database_alias)
+        with connections[csr.database_alias].cursor() as cursor:
+            cursor.execute(f"DROP TABLE {DESCRIPTION_SEARCH_TABLE}")
+        self.previous_snomedct_release = csr
+        yield
+        with connections[csr.database_alias].cursor() as cursor:
+            tables = cursor.execute(
+                "SELECT name FROM sqlite_schema WHERE type = 'table' "
+                "AND name LIKE 'snomedct_%'"
+            ).fetchall()
+            for (table,) in tables:
+                cursor.execute(f"DROP TABLE {table}")
+
+    @pytest.fixture
+    def _get_version_with_some_searches(self, version_with_some_searches):
+        self.version_with_some_searches = version_with_some_searches
+
+    @pytest.mark.usefixtures(
+        "_previous_snomedct_release", "_get_version_with_some_searches"
+    )
+    def test_check_version_compatibility_without_search_index(self):
+        previous_coding_system = CODING_SYSTEMS["snomedct"](
+            database_alias=self.previous_snomedct_release.database_alias
+        )
+        coding_system = CODING_SYSTEMS["snomedct"](
+            database_alias=self.version_with_some_searches.coding_system.database_alias
+        )
+        no_changes = ConceptChanges(frozenset(), frozenset(), frozenset(), frozenset())
+
+        with patch(
+            "coding_systems.base.import_data_utils.version_is_compatible_with_coding_system_release",
+            wraps=version_is_compatible_with_coding_system_release,
+        ) as check:
+            assert check_version_compatibility(
+                coding_system,
+                previous_coding_system,
+                no_changes,
+                self.version_with_some_searches,
+            )
+
+        # the version's search can't be run against the previous release, so it is
+        # checked in full
+        check.assert_called_once()
+
+
+class SynchronousExecutor:
+    """Stands in for ProcessPoolExecutor, since forked processes can't see data in the
+    test database's transaction.  Each instance is recorded in executors."""
+
+    def __init__(self, executors, max_workers, mp_context):
+        self.max_workers = max_workers
+        executors.append(self)
+
+    def map(self, fn, iterable, chunksize):
+        return map(fn, iterable)
+
+    def shutdown(self):
+        pass
+
+
+class TestUpdateCodelistVersionCompatibilityInParallel(
+    BaseCodingSystemDynamicDatabaseTestCase
+):
+    db_aliases = ("bnf_import-data_20221101",)
+
+    @override_settings(COMPATIBILITY_CHECK_WORKERS=4)
+    @pytest.mark.usefixtures(
+        "_get_bnf_release",
+        "_get_bnf_version_asthma",
+        "_get_bnf_review_version_with_search",
+    )
+    def test_update_codelist_version_compatibility_in_parallel(self):
+        executors = []
+        with patch(
+            "coding_systems.base.import_data_utils.ProcessPoolExecutor",
+            partial(SynchronousExecutor, executors),
+        ):
+            update_codelist_version_compatibility(
+                "bnf", self.bnf_release.database_alias
+            )
+
+        assert [executor.max_workers for executor in executors] == [4]
+        assert self.bnf_version_asthma.compatible_releases.get() == self.bnf_release
+        assert (
+            self.bnf_review_version_with_search.compatible_releases.get()
+            == self.bnf_release
+        )
+
+
+class TestCheckAndUpdateCompatibleVersionsInWorkerProcesses(
+    BaseCodingSystemDynamicDatabaseTestCase
+):
+    db_aliases = ("bnf_import-data_20221101",)
+
+    @pytest.mark.usefixtures(
+        "_get_bnf_release",
+        "_get_bnf_version_asthma",
+        "_get_bnf_review_version_with_search",
+    )
+    def test_check_and_update_compatible_versions_in_worker_processes(self):
+        versions = [self.bnf_version_asthma, self.bnf_review_version_with_search]
+        coding_system = CODING_SYSTEMS["bnf"](
+            database_alias=self.bnf_release.database_alias
+        )
+
+        with patch(
+            "coding_systems.base.import_data_utils.check_version_compatibility_by_id",
+            check_version_id_is_odd,
+        ):
+            compatible_count = check_and_update_compatibile_versions(
+                coding_system, versions, workers=2
+            )
+
+        # the results are returned from a real pool of worker processes, and written
+        # by this process
+        assert compatible_count == len([v for v in versions if v.pk % 2])
+        for version in versions:
+            assert version.compatible_releases.exists() == bool(version.pk % 2)
+
+
+def check_version_id_is_odd(
+    coding_system_id, database_alias, previous_database_alias, changes, version_id
+):
+    """Stands in for check_version_compatibility_by_id() in worker processes, which
+    can't see data in the test database's transaction."""
+    return version_id, bool(version_id % 2)
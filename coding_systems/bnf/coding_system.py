@@ -1,8 +1,12 @@
 from collections import defaultdict
 
-from opencodelists.db_utils import query
+from opencodelists.db_utils import in_values, in_values_sql, query
 
-from ..base.coding_system_base import BuilderCompatibleCodingSystem
+from ..base.coding_system_base import (
+    BuilderCompatibleCodingSystem,
+    ConceptChanges,
+    cached_lookup,
+)
 from .models import Concept
 
 
@@ -41,14 +45,13 @@ class CodingSystem(BuilderCompatibleCodingSystem):
     def matching_codes(self, codes):
         return set(
             Concept.objects.using(self.database_alias)
-            .filter(code__in=codes)
+            .filter(code__in=in_values(codes))
             .values_list("code", flat=True)
         )
 
     def ancestor_relationships(self, codes):
-        codes = list(codes)
         concept_table = Concept._meta.db_table
-        placeholders = ", ".join(["%s"] * len(codes))
+        placeholders, params = in_values_sql(codes)
         sql = f"""
         WITH RECURSIVE tree(parent_code, child_code) AS (
         SELECT parent_id AS parent_code, code AS child_code
@@ -66,12 +69,11 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         SELECT parent_code, child_code FROM tree
         """
 
-        return query(sql, codes, database=self.database_alias)
+        return query(sql, params, database=self.database_alias)
 
     def descendant_relationships(self, codes):
-        codes = list(codes)
         concept_table = Concept._meta.db_table
-        placeholders = ", ".join(["%s"] * len(codes))
+        placeholders, params = in_values_sql(codes)
         sql = f"""
         WITH RECURSIVE tree(parent_code, child_code) AS (
         SELECT parent_id AS parent_code, code AS child_code
@@ -89,12 +91,27 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         SELECT parent_code, child_code FROM tree
         """
 
-        return query(sql, codes, database=self.database_alias)
+        return query(sql, params, database=self.database_alias)
 
+    def concept_changes(self, previous):
+        concept_table = Concept._meta.db_table
+        return ConceptChanges.from_queries(
+            previous.database_alias,
+            self.database_alias,
+            concepts_sql=f"SELECT code FROM {concept_table} ORDER BY code",
+            relationships_sql=f"""
+            SELECT parent_id, code FROM {concept_table}
+            WHERE parent_id IS NOT NULL
+            ORDER BY parent_id, code
+            """,
+            terms_sql=f"SELECT code, name FROM {concept_table} ORDER BY code, name",
+        )
+
+    @cached_lookup
     def lookup_names(self, codes):
         return dict(
             Concept.objects.using(self.database_alias)
-            .filter(code__in=codes)
+            .filter(code__in=in_values(codes))
             .values_list("code", "name")
         )
 
@@ -43,8 +43,10 @@ def mock_migrate_coding_system(*args, **kwargs):
 
     test_db_connection = test_db_connections[0]
     with connections[test_db_connection].cursor() as cursor:
+        # shadow tables are created along with their virtual (eg FTS5) tables
         res = cursor.execute(
-            f"select sql from sqlite_schema where name like '{coding_system}_%';"
+            f"select sql from sqlite_schema where name like '{coding_system}_%' "
+            "and name not in (select name from pragma_table_list where type = 'shadow');"
         )
         table_defs = res.fetchall()
         build_sql = [f"{defn[0]};" for defn in table_defs]
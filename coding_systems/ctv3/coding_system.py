@@ -1,11 +1,19 @@
 import collections
 
-from django.db.models import Q
-
-from opencodelists.db_utils import query
-
-from ..base.coding_system_base import BuilderCompatibleCodingSystem
-from .models import RawConceptTermMapping, TPPConcept, TPPRelationship
+from opencodelists.db_utils import (
+    fts_contains_sql,
+    in_values,
+    in_values_sql,
+    query,
+)
+
+from ..base.coding_system_base import BuilderCompatibleCodingSystem, cached_lookup
+from .models import (
+    TERM_SEARCH_TABLE,
+    RawConceptTermMapping,
+    TPPConcept,
+    TPPRelationship,
+)
 
 
 class CodingSystem(BuilderCompatibleCodingSystem):
@@ -30,31 +38,23 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         ],
     }
 
+    @cached_lookup
     def lookup_names(self, codes):
         return dict(
             TPPConcept.objects.using(self.database_alias)
-            .filter(read_code__in=codes)
+            .filter(read_code__in=in_values(codes))
             .values_list("read_code", "description")
         )
 
     def search_by_term(self, term):
-        tpp_read_codes = set(
-            TPPConcept.objects.using(self.database_alias)
-            .filter(description__contains=term)
-            .values_list("read_code", flat=True)
-            .distinct()
-        )
-        raw_read_codes = set(
-            RawConceptTermMapping.objects.using(self.database_alias)
-            .filter(
-                Q(term__name_1__contains=term)
-                | Q(term__name_2__contains=term)
-                | Q(term__name_3__contains=term)
-            )
-            .values_list("concept_id", flat=True)
-            .distinct()
-        )
-        return tpp_read_codes | raw_read_codes
+        # TPP concept descriptions and raw term names are both indexed in the search
+        # table by import_data.build_term_search_index()
+        where, params = fts_contains_sql("term", term, self.database_alias)
+        sql = f"SELECT DISTINCT read_code FROM {TERM_SEARCH_TABLE} WHERE {where}"
+        return {
+            read_code
+            for (read_code,) in query(sql, params, database=self.database_alias)
+        }
 
     def search_by_code(self, code):
         tpp_read_codes = set(
@@ -74,20 +74,19 @@ class CodingSystem(BuilderCompatibleCodingSystem):
     def matching_codes(self, codes):
         tpp_read_codes = set(
             TPPConcept.objects.using(self.database_alias)
-            .filter(read_code__in=codes)
+            .filter(read_code__in=in_values(codes))
             .values_list("read_code", flat=True)
         )
         raw_read_codes = set(
             RawConceptTermMapping.objects.using(self.database_alias)
-            .filter(concept_id__in=codes)
+            .filter(concept_id__in=in_values(codes))
             .values_list("concept_id", flat=True)
         )
         return tpp_read_codes | raw_read_codes
 
     def ancestor_relationships(self, codes):
-        codes = list(codes)
         relationship_table = TPPRelationship._meta.db_table
-        placeholders = ", ".join(["%s"] * len(codes))
+        placeholders, params = in_values_sql(codes)
         sql = f"""
         WITH RECURSIVE tree(ancestor_id, descendant_id) AS (
         SELECT ancestor_id, descendant_id
@@ -106,12 +105,11 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         SELECT ancestor_id, descendant_id FROM tree
         """
 
-        return query(sql, codes, database=self.database_alias)
+        return query(sql, params, database=self.database_alias)
 
     def descendant_relationships(self, codes):
-        codes = list(codes)
         relationship_table = TPPRelationship._meta.db_table
-        placeholders = ", ".join(["%s"] * len(codes))
+        placeholders, params = in_values_sql(codes)
         sql = f"""
         WITH RECURSIVE tree(ancestor_id, descendant_id) AS (
         SELECT ancestor_id, descendant_id
@@ -130,7 +128,7 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         SELECT ancestor_id, descendant_id FROM tree
         """
 
-        return query(sql, codes, database=self.database_alias)
+        return query(sql, params, database=self.database_alias)
 
     def code_to_term(self, codes):
         lookup = self.lookup_names(codes)
@@ -5,12 +5,14 @@ from tempfile import TemporaryDirectory
 from zipfile import ZipFile
 
 import structlog
+from django.db import connections
 
 from coding_systems.base.import_data_utils import (
     CodingSystemImporter,
     batched_bulk_create,
 )
 from coding_systems.ctv3.models import (
+    TERM_SEARCH_TABLE,
     RawConcept,
     RawConceptHierarchy,
     RawConceptTermMapping,
@@ -34,6 +36,8 @@ def import_data(
     ) as database_alias:
         import_raw_ctv3(release_dir.parent, database_alias)
         import_tpp_ctv3_data(release_dir, database_alias)
+        with connections[database_alias].cursor() as cursor:
+            build_term_search_index(cursor)
 
 
 def import_raw_ctv3(release_dir, database_alias):
@@ -100,3 +104,44 @@ def import_tpp_ctv3_data(release_dir, database_alias):
         for record in load_records("ctv3_hierarchy")
     )
     batched_bulk_create(TPPRelationship, database_alias, iter_hierarchy_records)
+
+
+def build_term_search_index(cursor):
+    """(Re)build the full-text index of TPP concept descriptions and raw term names.
+
+    There is a row for each TPP concept, and a row for each of the (up to three) names
+    of each raw term, against each concept that the term is mapped to.
+
+    This must be run after both the raw CTV3 data and the TPP CTV3 data have been
+    imported.
+    """
+
+    tpp_concept_table = TPPConcept._meta.db_table
+    mapping_table = RawConceptTermMapping._meta.db_table
+    raw_term_table = RawTerm._meta.db_table
+
+    logger.info("Building term search index")
+    cursor.execute(f"DROP TABLE IF EXISTS {TERM_SEARCH_TABLE}")
+    cursor.execute(
+        f"""
+        CREATE VIRTUAL TABLE {TERM_SEARCH_TABLE}
+        USING fts5(term, read_code UNINDEXED, tokenize = 'trigram')
+        """
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO {TERM_SEARCH_TABLE} (term, read_code)
+        SELECT description, read_code FROM {tpp_concept_table}
+        """
+    )
+    for column in ["name_1", "name_2", "name_3"]:
+        cursor.execute(
+            f"""
+            INSERT INTO {TERM_SEARCH_TABLE} (term, read_code)
+            SELECT t.{column}, m.concept_id
+            FROM {mapping_table} m
+            INNER JOIN {raw_term_table} t ON m.term_id = t.term_id
+            WHERE t.{column} IS NOT NULL
+            """
+        )
+    logger.info("Built term search index")
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:40
+
+from django.db import migrations
+
+
+def create_term_search_index(apps, schema_editor):
+    # Release databases that were imported before the search index existed need it
+    # building from their concepts and terms.  For a new release, the tables are empty
+    # at this point and the index is rebuilt at the end of the import.
+    #
+    # This is the same as import_data.build_term_search_index() at the time of this
+    # migration.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS ctv3_termsearch")
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE ctv3_termsearch
+            USING fts5(term, read_code UNINDEXED, tokenize = 'trigram')
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO ctv3_termsearch (term, read_code)
+            SELECT description, read_code FROM ctv3_tppconcept
+            """
+        )
+        for column in ["name_1", "name_2", "name_3"]:
+            cursor.execute(
+                f"""
+                INSERT INTO ctv3_termsearch (term, read_code)
+                SELECT t.{column}, m.concept_id
+                FROM ctv3_rawconcepttermmapping m
+                INNER JOIN ctv3_rawterm t ON m.term_id = t.term_id
+                WHERE t.{column} IS NOT NULL
+                """
+            )
+
+
+def drop_term_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS ctv3_termsearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctv3', '0002_alter_rawconcept_children'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_term_search_index,
+            reverse_code=drop_term_search_index,
+        ),
+    ]
@@ -90,3 +90,12 @@ class TPPRelationship(models.Model):
         "TPPConcept", on_delete=models.CASCADE, related_name="ancestor_relationships"
     )
     distance = models.IntegerField()
+
+
+# The name of the full-text search table that indexes the descriptions of TPP concepts
+# and the names of raw terms, for CodingSystem.search_by_term().  Each row maps one
+# searchable term to the code of the concept that it describes.  It uses the trigram
+# tokenizer, so that it can be used to find terms containing any substring (of at
+# least three characters).  It is not a Django model, since Django cannot manage
+# virtual tables, and is built at import time by import_data.build_term_search_index().
+TERM_SEARCH_TABLE = "ctv3_termsearch"
@@ -1,6 +1,9 @@
 import pytest
+from django.db import connections
+from django.db.models import Q
 
 from coding_systems.ctv3.coding_system import CodingSystem
+from coding_systems.ctv3.import_data import build_term_search_index
 from coding_systems.ctv3.models import (
     RawConcept,
     RawConceptTermMapping,
@@ -40,6 +43,14 @@ def raw_concepts():
         )
 
 
+@pytest.fixture
+def term_search_index(tpp_concepts, raw_concepts):
+    # the search index is built at import time, so must be rebuilt from the concepts
+    # and terms created above
+    with connections["ctv3_test_20200101"].cursor() as cursor:
+        build_term_search_index(cursor)
+
+
 def test_lookup_names(coding_system, tpp_concepts):
     assert coding_system.lookup_names(["11111", "22222", "99999"]) == {
         "11111": "Concept 11111",
@@ -55,7 +66,7 @@ def test_code_to_term(coding_system, tpp_concepts):
     }
 
 
-def test_search_by_term(coding_system, tpp_concepts, raw_concepts):
+def test_search_by_term(coding_system, term_search_index):
     # searching by "concept" matches all concepts, both raw and tpp
     assert coding_system.search_by_term("concept") == {
         ".....",
@@ -70,6 +81,23 @@ def test_search_by_term(coding_system, tpp_concepts, raw_concepts):
     assert coding_system.search_by_term("unk") == set()
 
 
+@pytest.mark.parametrize("term", ["Concept", "RAW", "_3", "444", "x", "%"])
+def test_search_by_term_matches_fields(coding_system, term_search_index, term):
+    # The full-text index gives the same results as searching each field directly
+    db = coding_system.database_alias
+    tpp_read_codes = TPPConcept.objects.using(db).filter(description__contains=term)
+    raw_read_codes = RawConceptTermMapping.objects.using(db).filter(
+        Q(term__name_1__contains=term)
+        | Q(term__name_2__contains=term)
+        | Q(term__name_3__contains=term)
+    )
+    expected = set(tpp_read_codes.values_list("read_code", flat=True)) | set(
+        raw_read_codes.values_list("concept_id", flat=True)
+    )
+
+    assert coding_system.search_by_term(term) == expected
+
+
 def test_search_by_code(coding_system, tpp_concepts, raw_concepts):
     # search by a TPP concept code
     assert coding_system.search_by_code("22222") == {"22222"}
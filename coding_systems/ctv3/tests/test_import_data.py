@@ -85,6 +85,12 @@ class TestImportData(DynamicDatabaseTestCase):
             "Clinical findings": ["XE0ZP", "X101x"]
         }
 
+        # The term search index has been built from the imported data
+        assert latest_coding_system.search_by_term("clinical findings") == {
+            "Xa00B",  # Clinical findings type
+            "XaBVJ",  # Clinical findings
+        }
+
 
 class TestImportErrorExistingRelease(DynamicDatabaseTestCaseWithTmpPath):
     db_aliases = [
@@ -1,10 +1,16 @@
 import collections
 
-from django.db.models import F, Q
+from django.db.models import F
 from django.db.models.functions import Coalesce
 
-from ..base.coding_system_base import BuilderCompatibleCodingSystem
-from .models import AMP, AMPP, VMP, VMPP, VTM, Ing
+from opencodelists.db_utils import fts_contains_sql, in_values, query
+
+from ..base.coding_system_base import (
+    BuilderCompatibleCodingSystem,
+    ConceptChanges,
+    cached_lookup,
+)
+from .models import AMP, AMPP, SEARCH_TABLE, VMP, VMPP, VPI, VTM, Ing
 
 
 class CodingSystem(BuilderCompatibleCodingSystem):
@@ -19,12 +25,12 @@ class CodingSystem(BuilderCompatibleCodingSystem):
     description = "Primary and Secondary Care prescribing"
 
     def ancestor_relationships(self, codes):
-        amps = AMP.objects.using(self.database_alias).filter(id__in=codes)
+        amps = AMP.objects.using(self.database_alias).filter(id__in=in_values(codes))
 
         # get VMPs that are either in `codes` or are ancestors
         # of the AMPs in `codes`
         codes = set(codes) | {amp.vmp_id for amp in amps}
-        vmps = VMP.objects.using(self.database_alias).filter(id__in=codes)
+        vmps = VMP.objects.using(self.database_alias).filter(id__in=in_values(codes))
 
         # exclude null VTM-VMP relationships (i.e. VMPs with no VTM)
         return {(amp.vmp_id, amp.id) for amp in amps} | {
@@ -32,17 +38,22 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         }
 
     def descendant_relationships(self, codes):
-        vmps_from_vtms = VMP.objects.using(self.database_alias).filter(vtm__in=codes)
+        vmps_from_vtms = VMP.objects.using(self.database_alias).filter(
+            vtm__in=in_values(codes)
+        )
 
         # get AMPs that have ancestor VMPs that are either in `codes`
         # or are descendants of VTMs that are in `codes`
         codes = set(codes) | {vmp.id for vmp in vmps_from_vtms}
-        amps_from_vmps = AMP.objects.using(self.database_alias).filter(vmp_id__in=codes)
+        amps_from_vmps = AMP.objects.using(self.database_alias).filter(
+            vmp_id__in=in_values(codes)
+        )
 
         return {(vmp.vtm_id, vmp.id) for vmp in vmps_from_vtms} | {
             (amp.vmp_id, amp.id) for amp in amps_from_vmps
         }
 
+    @cached_lookup
     def lookup_names(self, codes):
         # A code is a unique identifier in dm+d which corresponds to a SNOMED-CT code
         # It could be the identifier for any of AMP, VMP, VTM, VMPP, AMPP
@@ -58,7 +69,7 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         lookup = {}
         for model_cls in [AMP, VMP, AMPP, VMPP, VTM]:
             model_objs = model_cls.objects.using(self.database_alias).filter(
-                id__in=codes
+                id__in=in_values(codes)
             )
             name_field = Coalesce("descr", "nm") if model_cls == AMP else F("nm")
             model_objs = model_objs.annotate(name=name_field)
@@ -70,10 +81,11 @@ class CodingSystem(BuilderCompatibleCodingSystem):
                 break
         return lookup
 
+    @cached_lookup
     def lookup_synonyms(self, codes):
         descriptions = (
             AMP.objects.using(self.database_alias)
-            .filter(id__in=codes)
+            .filter(id__in=in_values(codes))
             .values("id", "nm")
         )
 
@@ -90,7 +102,7 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         for model_cls in [AMP, VMP, AMPP, VMPP, VTM]:
             matched = (
                 model_cls.objects.using(self.database_alias)
-                .filter(id__in=codes)
+                .filter(id__in=in_values(codes))
                 .values_list("id")
             )
             codes_and_types += [
@@ -123,22 +135,22 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         known_codes = (
             list(
                 Ing.objects.using(self.database_alias)
-                .filter(id__in=codes)
+                .filter(id__in=in_values(codes))
                 .values_list("id", flat=True)
             )
             + list(
                 VTM.objects.using(self.database_alias)
-                .filter(id__in=codes)
+                .filter(id__in=in_values(codes))
                 .values_list("id", flat=True)
             )
             + list(
                 VMP.objects.using(self.database_alias)
-                .filter(id__in=codes)
+                .filter(id__in=in_values(codes))
                 .values_list("id", flat=True)
             )
             + list(
                 AMP.objects.using(self.database_alias)
-                .filter(id__in=codes)
+                .filter(id__in=in_values(codes))
                 .values_list("id", flat=True)
             )
         )
@@ -160,51 +172,10 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         # We don't return AMPPs or VMPPs mainly because they don't exist in primary care data, but also because
         # the AMPPs would all appear twice in the hierarchy, as VMP > VMPP > AMPP and VMP > AMP > AMPP
 
-        # We get all the AMPs that match nm, abbrevnm, descr and nm_prev
-        amps = set(
-            AMP.objects.using(self.database_alias)
-            .filter(
-                Q(nm__icontains=term)
-                | Q(abbrevnm__icontains=term)
-                | Q(descr__icontains=term)
-                | Q(nm_prev__icontains=term)
-            )
-            .values_list("id", flat=True)
-        )
-
-        # We get all the VMPs that match nm, abbrevnm, and nmprev
-        vmps = set(
-            VMP.objects.using(self.database_alias)
-            .filter(
-                Q(nm__icontains=term)
-                | Q(abbrevnm__icontains=term)
-                | Q(nmprev__icontains=term)
-            )
-            .values_list("id", flat=True)
-        )
-
-        # We also get all VMPs from a matched ingredient
-        vmps_from_ing = set(
-            VMP.objects.using(self.database_alias)
-            .filter(vpi__ing__nm__icontains=term)
-            .values_list("id", flat=True)
-            .distinct()
-        )
-
-        # We get all the VTMs that match nm, abbrevnm OR that are parents of any
-        # VMPs found by ingredient. This is because there is only a mapping of
-        # ingredient to VTM via VMP
-        vtms = set(
-            VTM.objects.using(self.database_alias)
-            .filter(
-                Q(nm__icontains=term)
-                | Q(abbrevnm__icontains=term)
-                | Q(vmp__id__in=vmps_from_ing)
-            )
-            .values_list("id", flat=True)
-        )
-
-        return amps | vmps | vmps_from_ing | vtms
+        # All of these are indexed in the search table by import_data.build_search_index()
+        where, params = fts_contains_sql("term", term, self.database_alias)
+        sql = f"SELECT DISTINCT id FROM {SEARCH_TABLE} WHERE {where}"
+        return {id for (id,) in query(sql, params, database=self.database_alias)}
 
     def search_by_code(self, code):
         # If the code is an AMP, VMP or VTM we return just that
@@ -230,3 +201,31 @@ class CodingSystem(BuilderCompatibleCodingSystem):
             return vmps | vtms
         except Ing.DoesNotExist:
             return set()
+
+    def concept_changes(self, previous):
+        vtm_table = VTM._meta.db_table
+        vmp_table = VMP._meta.db_table
+        amp_table = AMP._meta.db_table
+        vpi_table = VPI._meta.db_table
+        return ConceptChanges.from_queries(
+            previous.database_alias,
+            self.database_alias,
+            concepts_sql=f"""
+            SELECT vtmid FROM {vtm_table}
+            UNION SELECT vpid FROM {vmp_table}
+            UNION SELECT apid FROM {amp_table}
+            ORDER BY 1
+            """,
+            relationships_sql=f"""
+            SELECT vtmid, vpid FROM {vmp_table} WHERE vtmid IS NOT NULL
+            UNION SELECT vpid, apid FROM {amp_table}
+            ORDER BY 1, 2
+            """,
+            # Ingredients are searchable attributes of VMPs, both by name (which is
+            # included in the search table) and by code
+            terms_sql=f"""
+            SELECT id, term FROM {SEARCH_TABLE}
+            UNION SELECT vpid, isid FROM {vpi_table}
+            ORDER BY 1, 2
+            """,
+        )
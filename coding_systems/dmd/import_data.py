@@ -1,16 +1,22 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import batched, groupby
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from zipfile import ZipFile
 
 import structlog
-from django.db import connections
+from django.conf import settings
+from django.db import connections, transaction
 from django.db.models import fields as django_fields
+from django.utils import timezone
 from lxml import etree
 from tqdm import tqdm
 
 from codelists.models import CodelistVersion
 from coding_systems.base.import_data_utils import CodingSystemImporter
 from coding_systems.dmd import models
+from mappings.dmdvmpprevmap.import_data import build_mapping_closure
 from mappings.dmdvmpprevmap.models import Mapping
 
 from .data_downloader import Downloader
@@ -18,6 +24,13 @@ from .data_downloader import Downloader
 
 logger = structlog.get_logger()
 
+# The number of rows inserted by each executemany() call when importing a model
+BATCH_SIZE = 10_000
+
+# The number of CodelistVersions whose cached download data is written in each
+# transaction by update_cached_download_data()
+CACHED_DOWNLOAD_DATA_BATCH_SIZE = 100
+
 
 def import_data(
     release_dir,
@@ -148,83 +161,115 @@ def import_coding_system(release_dir, database_alias):
     }
 
     # lookup
-    for elements in load_elements(filepaths["lookup"]):
-        model_name = make_model_name(elements.tag)
-        model = getattr(models, model_name)
-        import_model(model, elements, database_alias)
+    # Each lookup list contains INFO elements, so the model is given by the list's tag
+    records = load_records(filepaths["lookup"], nested=True)
+    import_records(records, database_alias, key=lambda list_tag, record: list_tag)
 
     # ingredient
-    elements = load_elements(filepaths["ingredient"])
-    import_model(models.Ing, elements, database_alias)
+    records = load_records(filepaths["ingredient"], nested=False)
+    import_model(models.Ing, (record for _, record in records), database_alias)
 
     # vtm
-    elements = load_elements(filepaths["vtm"])
-    import_model(models.VTM, elements, database_alias)
+    records = load_records(filepaths["vtm"], nested=False)
+    import_model(models.VTM, (record for _, record in records), database_alias)
 
     # vmp
-    for elements in load_elements(filepaths["vmp"]):
-        model_name = make_model_name(elements[0].tag)
-        model = getattr(models, model_name)
-        import_model(model, elements, database_alias)
+    records = load_records(filepaths["vmp"], nested=True)
+    import_records(records, database_alias)
 
     # vmpp
-    for elements in load_elements(filepaths["vmpp"]):
-        if elements[0].tag == "CCONTENT":
-            # We don't yet handle the CCONTENT tag, which indicates that a
-            # VMPP is part of a combination pack, where two VMPPs are
-            # always prescribed together.
-            continue
-
-        model_name = make_model_name(elements[0].tag)
-        model = getattr(models, model_name)
-        import_model(model, elements, database_alias)
+    # We don't yet handle the CCONTENT tag, which indicates that a VMPP is part of a
+    # combination pack, where two VMPPs are always prescribed together.
+    records = load_records(filepaths["vmpp"], nested=True)
+    import_records(without_ccontent(records), database_alias)
 
     # amp
-    for elements in load_elements(filepaths["amp"]):
-        if len(elements) == 0:
-            # For test data, some lists of elements are empty (eg
-            # AP_INFORMATION), and so we can't look at the first element of
-            # the list to get the name of the corresponding model.
-            continue
-
-        model_name = make_model_name(elements[0].tag)
-        model = getattr(models, model_name)
-        import_model(model, elements, database_alias)
+    # Some lists may be empty (eg AP_INFORMATION in test data), but these yield no
+    # records, so are skipped.
+    records = load_records(filepaths["amp"], nested=True)
+    import_records(records, database_alias)
 
     # ampp
-    for elements in load_elements(filepaths["ampp"]):
-        if len(elements) == 0:
-            # For test data, some lists of elements are empty (eg
-            # APPLIANCE_PACK_INFO), and so we can't look at the first
-            # element of the list to get the name of the corresponding
-            # model.
-            continue
+    # As for VMPPs, we don't yet handle the CCONTENT tag, which indicates that an AMPP
+    # is part of a combination pack.
+    records = load_records(filepaths["ampp"], nested=True)
+    import_records(without_ccontent(records), database_alias)
 
-        if elements[0].tag == "CCONTENT":
-            # We don't yet handle the CCONTENT tag, which indicates that a
-            # AMPP is part of a combination pack, where two AMPPs are
-            # always prescribed together.
-            continue
+    # gtin
+    # We only import the first list (AMPPS), whose elements need a little massaging
+    # before they can be imported.
+    records = load_records(filepaths["gtin"], nested=True)
+    _, first_list = next(groupby(records, key=lambda pair: pair[0]))
+    elements = (to_gtin_element(record) for _, record in first_list)
+    import_model(models.GTIN, elements, database_alias)
 
-        model_name = make_model_name(elements[0].tag)
-        model = getattr(models, model_name)
-        import_model(model, elements, database_alias)
+    with connections[database_alias].cursor() as cursor:
+        build_search_index(cursor)
 
-    # gtin
-    elements = next(load_elements(filepaths["gtin"]))
-    for element in elements:
-        assert element[0].tag == "AMPPID", (
-            f"Expected AMPPID as first element, got {element[0].tag}"
-        )
-        assert element[1].tag == "GTINDATA", (
-            f"Expected GTINDATA as second element, got {element[1].tag}"
-        )
 
-        element[0].tag = "APPID"
-        for gtinelt in element[1]:
-            element.append(gtinelt)
-        element.remove(element[1])
-    import_model(models.GTIN, elements, database_alias)
+def build_search_index(cursor):
+    """(Re)build the full-text index of the terms that CodingSystem.search_by_term()
+    searches.
+
+    There is a row for each name, abbreviated name, description and previous name of
+    each AMP, VMP and VTM.  There is also a row for the name of each ingredient of a
+    VMP, for both the VMP and its VTM, since ingredients are only linked to VTMs via
+    VMPs.
+
+    This must be run after all AMPs, VMPs, VTMs, VPIs and ingredients have been
+    imported.
+    """
+
+    amp_table = models.AMP._meta.db_table
+    vmp_table = models.VMP._meta.db_table
+    vtm_table = models.VTM._meta.db_table
+    vpi_table = models.VPI._meta.db_table
+    ing_table = models.Ing._meta.db_table
+
+    # Each source is a query for rows of the search table, some of which have a null
+    # term
+    sources = [
+        f"SELECT {column} AS term, apid AS id, 'AMP' AS type FROM {amp_table}"
+        for column in ["nm", "abbrevnm", "descr", "nm_prev"]
+    ]
+    sources += [
+        f"SELECT {column} AS term, vpid AS id, 'VMP' AS type FROM {vmp_table}"
+        for column in ["nm", "abbrevnm", "nmprev"]
+    ]
+    sources += [
+        f"SELECT {column} AS term, vtmid AS id, 'VTM' AS type FROM {vtm_table}"
+        for column in ["nm", "abbrevnm"]
+    ]
+    sources += [
+        f"""
+        SELECT ing.nm AS term, vpi.vpid AS id, 'VMP' AS type
+        FROM {vpi_table} vpi INNER JOIN {ing_table} ing ON vpi.isid = ing.isid
+        """,
+        f"""
+        SELECT ing.nm AS term, vmp.vtmid AS id, 'VTM' AS type
+        FROM {vpi_table} vpi
+        INNER JOIN {ing_table} ing ON vpi.isid = ing.isid
+        INNER JOIN {vmp_table} vmp ON vpi.vpid = vmp.vpid
+        WHERE vmp.vtmid IS NOT NULL
+        """,
+    ]
+
+    logger.info("Building search index")
+    cursor.execute(f"DROP TABLE IF EXISTS {models.SEARCH_TABLE}")
+    cursor.execute(
+        f"""
+        CREATE VIRTUAL TABLE {models.SEARCH_TABLE}
+        USING fts5(term, id UNINDEXED, type UNINDEXED, tokenize = 'trigram')
+        """
+    )
+    for source in sources:
+        cursor.execute(
+            f"""
+            INSERT INTO {models.SEARCH_TABLE} (term, id, type)
+            SELECT term, id, type FROM ({source}) WHERE term IS NOT NULL
+            """
+        )
+    logger.info("Built search index")
 
 
 def get_filepath(release_dir, filename_fragment):
@@ -235,23 +280,97 @@ def get_filepath(release_dir, filename_fragment):
     return paths[0]
 
 
-def load_elements(filepath):
-    """Return list of non-comment top-level elements in given file."""
+def load_records(filepath, nested):
+    """Yield (list_tag, element) for each record in given file, without reading the
+    whole file into memory.
+
+    If nested is True, the file's root element contains lists of records, and list_tag
+    is the tag of the list that contains each record.  Otherwise, the root element
+    contains records directly, and list_tag is None.
+
+    Each element is cleared, and removed from the tree, once the caller has finished
+    with it, so elements must not be retained between iterations.
+    """
 
     logger.info("Reading file", file=filepath)
-    doc = etree.parse(filepath)
-    root = doc.getroot()
-    iterelements = root.iterchildren()
-    first_element = next(iterelements)
 
-    assert isinstance(first_element, etree._Comment), (
-        f"Expected etree._Comment first row, got {type(first_element)}"
+    # The root element has depth 1
+    record_depth = 3 if nested else 2
+    depth = 0
+    list_tag = None
+
+    for event, element in etree.iterparse(
+        str(filepath), events=("start", "end"), remove_comments=True
+    ):
+        if event == "start":
+            depth += 1
+            if nested and depth == 2:
+                list_tag = element.tag
+            continue
+
+        if depth == record_depth:
+            yield list_tag, element
+
+        if 1 < depth <= record_depth:
+            # Free the memory used by this record (or list of records), and remove it
+            # from its parent, so that the tree doesn't grow as the file is read.
+            element.clear()
+            element.getparent().remove(element)
+        depth -= 1
+
+
+def without_ccontent(records):
+    """Filter out CCONTENT records from given (list_tag, element) pairs."""
+
+    return (
+        (list_tag, record) for list_tag, record in records if record.tag != "CCONTENT"
+    )
+
+
+def to_gtin_element(element):
+    """Restructure an AMPP element from the GTIN file for import as a GTIN.
+
+    Each element has an AMPPID element and a GTINDATA element, whose children are the
+    remaining fields of the GTIN.
+    """
+
+    assert element[0].tag == "AMPPID", (
+        f"Expected AMPPID as first element, got {element[0].tag}"
+    )
+    assert element[1].tag == "GTINDATA", (
+        f"Expected GTINDATA as second element, got {element[1].tag}"
     )
-    yield from iterelements
+
+    element[0].tag = "APPID"
+    for gtinelt in element[1]:
+        element.append(gtinelt)
+    element.remove(element[1])
+    return element
+
+
+def import_records(records, database, key=None):
+    """Import (list_tag, element) pairs, as yielded by load_records().
+
+    Records are imported into the model given by key(list_tag, element), which
+    defaults to the element's tag.  Consecutive records with the same key are imported
+    together.
+    """
+
+    if key is None:
+
+        def key(list_tag, record):
+            return record.tag
+
+    for model_key, group in groupby(records, key=lambda pair: key(*pair)):
+        model = getattr(models, make_model_name(model_key))
+        import_model(model, (record for _, record in group), database)
 
 
 def import_model(model, elements, database):
-    """Import model instances from list of XML elements."""
+    """Import model instances from iterable of XML elements.
+
+    Elements are inserted in batches, so elements may be generated as they're read.
+    """
 
     # ensure the starting db is empty
     assert not model.objects.using(database).exists(), f"Expected empty db for {model}"
@@ -295,7 +414,8 @@ def import_model(model, elements, database):
             yield [row.get(name) for name in column_names]
 
     with connections[database].cursor() as cursor:
-        cursor.executemany(sql, iter_values(elements))
+        for batch in batched(iter_values(elements), BATCH_SIZE):
+            cursor.executemany(sql, batch)
 
 
 def make_model_name(tag_name):
@@ -317,18 +437,76 @@ def update_vmp_prev_mapping(database_alias):
         desc="Update VMP previous mapping",
     ):
         Mapping.objects.get_or_create(id=vmp.id, vpidprev=vmp.vpidprev)
+    build_mapping_closure()
 
 
-def update_cached_download_data():
+def update_cached_download_data(workers=None):
     """
-    Refresh the cached_csv_data by calling csv_data_shas for each non-draft dmd
-    CodelistVersion. This will also cache the default download data.
+    Refresh the cached_csv_data for each non-draft dmd CodelistVersion, so that every
+    download variant and sha includes VMPs mapped in the new release.
+
+    The data is computed by a pool of worker processes if workers (which defaults to
+    settings.DMD_DOWNLOAD_DATA_WORKERS) is greater than one, and is written back in
+    batches, each in a single transaction.
     """
-    logger.info("Updating cached download data")
-    for codelist_version in tqdm(
-        CodelistVersion.objects.filter(codelist__coding_system_id="dmd").exclude(
-            status="draft"
+    workers = workers or settings.DMD_DOWNLOAD_DATA_WORKERS
+    version_ids = list(
+        CodelistVersion.objects.filter(codelist__coding_system_id="dmd")
+        .exclude(status="draft")
+        .values_list("id", flat=True)
+    )
+    logger.info(
+        "Updating cached download data", versions=len(version_ids), workers=workers
+    )
+
+    if workers > 1:
+        # Connections can't be shared with forked processes, so each worker opens its
+        # own, and this process reopens its connection when writing results.
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        )
+        chunksize = max(1, len(version_ids) // (workers * 4))
+        results = executor.map(
+            build_cached_download_data, version_ids, chunksize=chunksize
+        )
+    else:
+        executor = None
+        results = map(build_cached_download_data, version_ids)
+
+    try:
+        results = tqdm(results, total=len(version_ids))
+        for batch in batched(results, CACHED_DOWNLOAD_DATA_BATCH_SIZE):
+            write_cached_download_data(batch)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def build_cached_download_data(version_id):
+    """Return the id of the CodelistVersion and the data to be cached for it, or None
+    if it is not downloadable.
+
+    This is called in worker processes by update_cached_download_data(), so it takes
+    and returns values that can be pickled.
+    """
+    codelist_version = CodelistVersion.objects.select_related("codelist").get(
+        pk=version_id
+    )
+    if not codelist_version.downloadable:
+        return version_id, None
+    return version_id, codelist_version.build_cached_csv_data()
+
+
+def write_cached_download_data(results):
+    """Save a batch of results from build_cached_download_data() in a transaction."""
+    updated_at = timezone.now()
+    codelist_versions = [
+        CodelistVersion(id=version_id, cached_csv_data=data, updated_at=updated_at)
+        for version_id, data in results
+        if data is not None
+    ]
+    with transaction.atomic():
+        CodelistVersion.objects.bulk_update(
+            codelist_versions, ["cached_csv_data", "updated_at"]
         )
-    ):
-        if codelist_version.downloadable:
-            codelist_version.csv_data_shas()
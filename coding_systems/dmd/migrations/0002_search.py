@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Release databases that were imported before the search index existed need it
+    # building from their products and ingredients.  For a new release, the tables are
+    # empty at this point and the index is rebuilt at the end of the import.
+    #
+    # This is the same as import_data.build_search_index() at the time of this
+    # migration: there is a row for each name of each AMP, VMP and VTM, and for the
+    # name of each ingredient of a VMP, for both the VMP and its VTM.
+    sources = [
+        f"SELECT {column} AS term, apid AS id, 'AMP' AS type FROM dmd_amp"
+        for column in ["nm", "abbrevnm", "descr", "nm_prev"]
+    ]
+    sources += [
+        f"SELECT {column} AS term, vpid AS id, 'VMP' AS type FROM dmd_vmp"
+        for column in ["nm", "abbrevnm", "nmprev"]
+    ]
+    sources += [
+        f"SELECT {column} AS term, vtmid AS id, 'VTM' AS type FROM dmd_vtm"
+        for column in ["nm", "abbrevnm"]
+    ]
+    sources += [
+        """
+        SELECT ing.nm AS term, vpi.vpid AS id, 'VMP' AS type
+        FROM dmd_vpi vpi INNER JOIN dmd_ing ing ON vpi.isid = ing.isid
+        """,
+        """
+        SELECT ing.nm AS term, vmp.vtmid AS id, 'VTM' AS type
+        FROM dmd_vpi vpi
+        INNER JOIN dmd_ing ing ON vpi.isid = ing.isid
+        INNER JOIN dmd_vmp vmp ON vpi.vpid = vmp.vpid
+        WHERE vmp.vtmid IS NOT NULL
+        """,
+    ]
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS dmd_search")
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE dmd_search
+            USING fts5(term, id UNINDEXED, type UNINDEXED, tokenize = 'trigram')
+            """
+        )
+        for source in sources:
+            cursor.execute(
+                f"""
+                INSERT INTO dmd_search (term, id, type)
+                SELECT term, id, type FROM ({source}) WHERE term IS NOT NULL
+                """
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS dmd_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dmd', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_search_index,
+            reverse_code=drop_search_index,
+        ),
+    ]
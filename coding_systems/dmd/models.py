@@ -711,3 +711,13 @@ class GTIN(models.Model):
     gtin = models.CharField(max_length=18, help_text="GTIN")
     startdt = models.DateField(help_text="GTIN date")
     enddt = models.DateField(null=True, help_text="The date the GTIN became invalid")
+
+
+# The name of the full-text search table that indexes the names of AMPs, VMPs and VTMs,
+# and of the ingredients of VMPs, for CodingSystem.search_by_term().  Each row maps
+# one searchable term to the AMP, VMP or VTM that it identifies, so that a search is a
+# single lookup rather than a query per field.  It uses the trigram tokenizer, so that
+# it can be used to find terms containing any substring (of at least three
+# characters).  It is not a Django model, since Django cannot manage virtual tables,
+# and is built at import time by import_data.build_search_index().
+SEARCH_TABLE = "dmd_search"
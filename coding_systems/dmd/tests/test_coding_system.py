@@ -1,6 +1,8 @@
 import pytest
+from django.db.models import Q
 
 from coding_systems.dmd.coding_system import CodingSystem
+from coding_systems.dmd.models import AMP, VMP, VTM
 
 
 @pytest.fixture
@@ -201,6 +203,35 @@ def test_search_by_term_specific_fields(
     assert coding_system.search_by_term(term) == expected_response
 
 
+@pytest.mark.parametrize(
+    "term",
+    ["salbutamol", "SALBUTAMOL", "codeine", "Easyhaler", "TEST_STRING", "ol", "x", "%"],
+)
+def test_search_by_term_matches_fields(dmd_data, coding_system, term):
+    # The full-text index gives the same results as searching each field directly
+    db = coding_system.database_alias
+    amps = AMP.objects.using(db).filter(
+        Q(nm__icontains=term)
+        | Q(abbrevnm__icontains=term)
+        | Q(descr__icontains=term)
+        | Q(nm_prev__icontains=term)
+    )
+    vmps = VMP.objects.using(db).filter(
+        Q(nm__icontains=term) | Q(abbrevnm__icontains=term) | Q(nmprev__icontains=term)
+    )
+    vmps_from_ing = VMP.objects.using(db).filter(vpi__ing__nm__icontains=term)
+    vtms = VTM.objects.using(db).filter(
+        Q(nm__icontains=term) | Q(abbrevnm__icontains=term) | Q(vmp__in=vmps_from_ing)
+    )
+    expected = {
+        id
+        for queryset in [amps, vmps, vmps_from_ing, vtms]
+        for id in queryset.values_list("id", flat=True)
+    }
+
+    assert coding_system.search_by_term(term) == expected
+
+
 @pytest.mark.parametrize(
     "code, expected_response",
     [
@@ -223,3 +254,8 @@ def test_lookup_synonyms(dmd_data, coding_system):
         "3293111000001105": ["Aerolin 100micrograms/dose Autohaler"],
         "22503111000001109": ["AirSalb 100micrograms/dose inhaler CFC free"],
     }
+
+
+def test_concept_changes_with_same_release(dmd_data, coding_system):
+    changes = coding_system.concept_changes(coding_system)
+    assert not changes.codes
@@ -9,10 +9,16 @@ from coding_systems.base.tests.dynamic_db_classes import (
     DynamicDatabaseTestCase,
     DynamicDatabaseTestCaseWithTmpPath,
 )
+from coding_systems.dmd.coding_system import CodingSystem
 from coding_systems.dmd.data_downloader import Downloader
-from coding_systems.dmd.import_data import import_data
+from coding_systems.dmd.import_data import (
+    import_data,
+    load_records,
+    update_cached_download_data,
+)
 from coding_systems.dmd.models import AMP, AMPP, VMP, VMPP, VPI
 from coding_systems.versioning.models import CodingSystemRelease
+from mappings.dmdvmpprevmap.mappers import vmp_ids_to_previous
 from mappings.dmdvmpprevmap.models import Mapping as VmpPrevMapping
 
 from .conftest import MOCK_DMD_IMPORT_DATA_PATH
@@ -33,7 +39,12 @@ class TestImportData(DynamicDatabaseTestCase):
     )
     def test_import_data(self):
         cs_release_count = CodingSystemRelease.objects.count()
-        assert self.dmd_version_asthma_medication.cached_csv_data == {}
+        # download data was cached from the fixture's release when the version was
+        # created
+        assert (
+            self.dmd_version_asthma_medication.cached_csv_data["release"]
+            == "dmd_test_20200101"
+        )
 
         # import mock XML data
         # This consists of the AMP 222311000001102 (Ventolin 100micrograms/dose Evohaler)
@@ -81,12 +92,18 @@ class TestImportData(DynamicDatabaseTestCase):
             == VMP.objects.using("dmd_2022-100_20221001").first()
         )
 
+        # The search index has been built from the imported products
+        coding_system = CodingSystem(database_alias="dmd_2022-100_20221001")
+        assert coding_system.search_by_term("evohaler") == {"222311000001102"}
+
         # One new Mapping obj has been created, to record the previous ID for VMP
         # 39113611000001102
         assert VmpPrevMapping.objects.count() == 1
         mapping = VmpPrevMapping.objects.first()
         assert mapping.id == "39113611000001102"
         assert mapping.vpidprev == "320139002"
+        # and the closure of mappings has been rebuilt to include it
+        assert vmp_ids_to_previous() == [("39113611000001102", "320139002")]
 
         # download data on existing CodelistVersions has been cached
         self.dmd_version_asthma_medication.refresh_from_db()
@@ -210,3 +227,93 @@ def test_get_latest_release_metadata(mock_data_download):
         "filename": "nhsbsa_dmd_1.0.0_20221001000001.zip",
         "release_name": "2022 1.0.0",
     }
+
+
+NESTED_XML = """<?xml version="1.0" encoding="utf-8" ?>
+<ACTUAL_MEDICINAL_PRODUCTS>
+    <!-- Generated by NHSBSA PPD -->
+    <AP_INFORMATION></AP_INFORMATION>
+    <AMPS>
+        <AMP><APID>1</APID><NM>One</NM></AMP>
+        <AMP><APID>2</APID><NM>Two</NM></AMP>
+    </AMPS>
+    <LICENSED_ROUTE>
+        <LIC_ROUTE><APID>1</APID><ROUTECD>3</ROUTECD></LIC_ROUTE>
+    </LICENSED_ROUTE>
+</ACTUAL_MEDICINAL_PRODUCTS>
+"""
+
+FLAT_XML = """<?xml version="1.0" encoding="utf-8" ?>
+<VIRTUAL_THERAPEUTIC_MOIETIES>
+    <!-- Generated by NHSBSA PPD -->
+    <VTM><VTMID>1</VTMID><NM>One</NM></VTM>
+    <VTM><VTMID>2</VTMID><NM>Two</NM></VTM>
+</VIRTUAL_THERAPEUTIC_MOIETIES>
+"""
+
+
+def test_load_records_nested(tmp_path):
+    path = tmp_path / "f_amp2_test.xml"
+    path.write_text(NESTED_XML)
+
+    records = []
+    for list_tag, record in load_records(path, nested=True):
+        records.append((list_tag, record.tag, [(f.tag, f.text) for f in record]))
+        # records that have already been consumed have been removed from the tree
+        assert record.getprevious() is None
+
+    assert records == [
+        ("AMPS", "AMP", [("APID", "1"), ("NM", "One")]),
+        ("AMPS", "AMP", [("APID", "2"), ("NM", "Two")]),
+        ("LICENSED_ROUTE", "LIC_ROUTE", [("APID", "1"), ("ROUTECD", "3")]),
+    ]
+
+
+def test_load_records_flat(tmp_path):
+    path = tmp_path / "f_vtm2_test.xml"
+    path.write_text(FLAT_XML)
+
+    records = [
+        (list_tag, record.tag, record[0].text)
+        for list_tag, record in load_records(path, nested=False)
+    ]
+
+    assert records == [(None, "VTM", "1"), (None, "VTM", "2")]
+
+
+class SynchronousExecutor:
+    """Stands in for ProcessPoolExecutor, since forked processes can't see data in the
+    test database's transaction."""
+
+    def __init__(self, max_workers, mp_context):
+        self.max_workers = max_workers
+
+    def map(self, fn, iterable, chunksize):
+        return map(fn, iterable)
+
+    def shutdown(self):
+        pass
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_update_cached_download_data(
+    dmd_data, dmd_version_asthma_medication, version_with_no_searches, workers
+):
+    expected = dmd_version_asthma_medication.cached_csv_data
+    dmd_version_asthma_medication.cached_csv_data = {}
+    dmd_version_asthma_medication.save()
+    snomedct_cached_csv_data = version_with_no_searches.cached_csv_data
+
+    with (
+        patch(
+            "coding_systems.dmd.import_data.ProcessPoolExecutor", SynchronousExecutor
+        ),
+        patch("coding_systems.dmd.import_data.CACHED_DOWNLOAD_DATA_BATCH_SIZE", 1),
+    ):
+        update_cached_download_data(workers=workers)
+
+    dmd_version_asthma_medication.refresh_from_db()
+    assert dmd_version_asthma_medication.cached_csv_data == expected
+    # versions of other coding systems are not updated
+    version_with_no_searches.refresh_from_db()
+    assert version_with_no_searches.cached_csv_data == snomedct_cached_csv_data
@@ -1,9 +1,9 @@
 from collections import defaultdict
 from functools import lru_cache
 
-from opencodelists.db_utils import query
+from opencodelists.db_utils import in_values, in_values_sql, query
 
-from ..base.coding_system_base import BuilderCompatibleCodingSystem
+from ..base.coding_system_base import BuilderCompatibleCodingSystem, cached_lookup
 from .models import Concept, ConceptEdition, ConceptKind, Edition
 
 
@@ -48,9 +48,8 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         )
 
     def ancestor_relationships(self, codes):
-        codes = list(codes)
         concept_table = Concept._meta.db_table
-        placeholders = ", ".join(["%s"] * len(codes))
+        placeholders, params = in_values_sql(codes)
         sql = f"""
         WITH RECURSIVE tree(parent_code, child_code) AS (
         SELECT parent_id AS parent_code, code AS child_code
@@ -68,12 +67,11 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         SELECT parent_code, child_code FROM tree
         """
 
-        return query(sql, codes, database=self.database_alias)
+        return query(sql, params, database=self.database_alias)
 
     def descendant_relationships(self, codes):
-        codes = list(codes)
         concept_table = Concept._meta.db_table
-        placeholders = ", ".join(["%s"] * len(codes))
+        placeholders, params = in_values_sql(codes)
         sql = f"""
         WITH RECURSIVE tree(parent_code, child_code) AS (
         SELECT parent_id AS parent_code, code AS child_code
@@ -91,13 +89,14 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         SELECT parent_code, child_code FROM tree
         """
 
-        return query(sql, codes, database=self.database_alias)
+        return query(sql, params, database=self.database_alias)
 
+    @cached_lookup
     def lookup_names(self, codes):
         lookup = {}
         concepts = (
             ConceptEdition.objects.using(self.database_alias)
-            .filter(concept_id__in=codes)
+            .filter(concept_id__in=in_values(codes))
             .order_by("concept_id", "-edition__year", "-edition__version")
             .values_list("concept_id", "term", "term_modifier")
         )
@@ -190,6 +189,6 @@ class CodingSystem(BuilderCompatibleCodingSystem):
     def matching_codes(self, codes):
         return set(
             Concept.objects.using(self.database_alias)
-            .filter(code__in=codes)
+            .filter(code__in=in_values(codes))
             .values_list("code", flat=True)
         )
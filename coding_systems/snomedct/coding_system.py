@@ -1,10 +1,28 @@
 import collections
 import re
 
-from opencodelists.db_utils import query
-
-from ..base.coding_system_base import BuilderCompatibleCodingSystem
-from .models import FULLY_SPECIFIED_NAME, IS_A, SYNONYM, Concept, Description
+from opencodelists.db_utils import (
+    fts_contains_sql,
+    in_values,
+    in_values_sql,
+    query,
+)
+
+from ..base.coding_system_base import (
+    BuilderCompatibleCodingSystem,
+    ConceptChanges,
+    cached_lookup,
+)
+from .models import (
+    DESCRIPTION_SEARCH_TABLE,
+    FULLY_SPECIFIED_NAME,
+    IS_A,
+    SYNONYM,
+    Concept,
+    Description,
+    IsAClosure,
+    Relationship,
+)
 
 
 term_and_type_pat = re.compile(r"(^.*) \(([\w/ ]+)\)$")
@@ -21,17 +39,19 @@ class CodingSystem(BuilderCompatibleCodingSystem):
         "term": ["term", "long_name", "name", "ethnicity", "dmd_name"],
     }
 
+    @cached_lookup
     def lookup_names(self, codes):
         return {
             description.concept_id: description.term
             for description in Description.objects.using(self.database_alias).filter(
-                concept__in=codes, type=FULLY_SPECIFIED_NAME, active=True
+                concept__in=in_values(codes), type=FULLY_SPECIFIED_NAME, active=True
             )
         }
 
+    @cached_lookup
     def lookup_synonyms(self, codes):
         descriptions = Description.objects.using(self.database_alias).filter(
-            concept__in=codes, type=SYNONYM, active=True
+            concept__in=in_values(codes), type=SYNONYM, active=True
         )
 
         result = collections.defaultdict(list)
@@ -39,13 +59,26 @@ class CodingSystem(BuilderCompatibleCodingSystem):
             result[d.concept_id].append(d.term)
         return dict(result)
 
-    def search_by_term(self, term):
-        return set(
+    @cached_lookup
+    def lookup_active(self, codes):
+        return dict(
             Concept.objects.using(self.database_alias)
-            .filter(descriptions__term__contains=term, descriptions__active=True)
-            .values_list("id", flat=True)
+            .filter(id__in=in_values(codes))
+            .values_list("id", "active")
         )
 
+    def search_by_term(self, term):
+        """Return codes of concepts with an active description containing term."""
+
+        where, params = fts_contains_sql("term", term, self.database_alias)
+        sql = (
+            f"SELECT DISTINCT concept_id FROM {DESCRIPTION_SEARCH_TABLE} WHERE {where}"
+        )
+        return {
+            concept_id
+            for (concept_id,) in query(sql, params, database=self.database_alias)
+        }
+
     def search_by_code(self, code):
         if Concept.objects.using(self.database_alias).filter(id=code).exists():
             return {code}
@@ -55,69 +88,63 @@ class CodingSystem(BuilderCompatibleCodingSystem):
     def matching_codes(self, codes):
         return set(
             Concept.objects.using(self.database_alias)
-            .filter(id__in=codes)
+            .filter(id__in=in_values(codes))
             .values_list("id", flat=True)
         )
 
     def ancestor_relationships(self, codes):
-        codes = list(codes)
-        placeholders = ", ".join(["%s"] * len(codes))
+        closure_table = IsAClosure._meta.db_table
+        relationship_table = Relationship._meta.db_table
+        placeholders, params = in_values_sql(codes)
         sql = f"""
-        WITH RECURSIVE tree(parent_id, child_id) AS (
-          SELECT
-            destination_id AS parent_id,
-            source_id AS child_id
-          FROM snomedct_relationship
-          WHERE child_id IN ({placeholders})
-            AND type_id = '{IS_A}'
-            AND active
-
-          UNION
-
-          SELECT
-            r.destination_id AS parent_id,
-            r.source_id AS child_id
-          FROM snomedct_relationship r
-          INNER JOIN tree t
-            ON r.source_id = t.parent_id
-          WHERE r.type_id = '{IS_A}'
-            AND active
-        )
-
-        SELECT parent_id, child_id FROM tree
+        SELECT DISTINCT r.destination_id AS parent_id, r.source_id AS child_id
+        FROM {closure_table} c
+        INNER JOIN {relationship_table} r
+          ON r.source_id = c.ancestor_id
+        WHERE c.descendant_id IN ({placeholders})
+          AND r.type_id = '{IS_A}'
+          AND r.active
         """
 
-        return query(sql, codes, database=self.database_alias)
+        return query(sql, params, database=self.database_alias)
 
     def descendant_relationships(self, codes):
-        codes = list(codes)
-        placeholders = ", ".join(["%s"] * len(codes))
+        closure_table = IsAClosure._meta.db_table
+        relationship_table = Relationship._meta.db_table
+        placeholders, params = in_values_sql(codes)
         sql = f"""
-        WITH RECURSIVE tree(parent_id, child_id) AS (
-          SELECT
-            destination_id AS parent_id,
-            source_id AS child_id
-          FROM snomedct_relationship
-          WHERE parent_id IN ({placeholders})
-            AND type_id = '{IS_A}'
-            AND active
-
-          UNION
-
-          SELECT
-            r.destination_id AS parent_id,
-            r.source_id AS child_id
-          FROM snomedct_relationship r
-          INNER JOIN tree t
-            ON r.destination_id = t.child_id
-          WHERE r.type_id = '{IS_A}'
-            AND active
-        )
-
-        SELECT parent_id, child_id FROM tree
+        SELECT DISTINCT r.destination_id AS parent_id, r.source_id AS child_id
+        FROM {closure_table} c
+        INNER JOIN {relationship_table} r
+          ON r.destination_id = c.descendant_id
+        WHERE c.ancestor_id IN ({placeholders})
+          AND r.type_id = '{IS_A}'
+          AND r.active
         """
 
-        return query(sql, codes, database=self.database_alias)
+        return query(sql, params, database=self.database_alias)
+
+    def concept_changes(self, previous):
+        concept_table = Concept._meta.db_table
+        relationship_table = Relationship._meta.db_table
+        description_table = Description._meta.db_table
+        return ConceptChanges.from_queries(
+            previous.database_alias,
+            self.database_alias,
+            concepts_sql=f"SELECT id FROM {concept_table} ORDER BY id",
+            relationships_sql=f"""
+            SELECT DISTINCT destination_id, source_id
+            FROM {relationship_table}
+            WHERE type_id = '{IS_A}' AND active
+            ORDER BY destination_id, source_id
+            """,
+            terms_sql=f"""
+            SELECT DISTINCT concept_id, term
+            FROM {description_table}
+            WHERE active
+            ORDER BY concept_id, term
+            """,
+        )
 
     def _iter_code_to_term_and_type(self, codes: set):
         for code, term in self.lookup_names(codes).items():
@@ -145,12 +172,7 @@ class CodingSystem(BuilderCompatibleCodingSystem):
             for code, (_, type) in self.code_to_term_and_type(codes).items()
         }
 
-        code_to_active = {
-            concept.id: concept.active
-            for concept in Concept.objects.using(self.database_alias).filter(
-                id__in=codes
-            )
-        }
+        code_to_active = self.lookup_active(codes)
 
         lookup = collections.defaultdict(list)
 
@@ -11,11 +11,22 @@ from django.db import connections
 from coding_systems.base.import_data_utils import CodingSystemImporter
 
 from .data_downloader import Downloader
-from .models import Concept, Description, Relationship
+from .models import (
+    DESCRIPTION_SEARCH_TABLE,
+    IS_A,
+    Concept,
+    Description,
+    IsAClosure,
+    Relationship,
+)
 
 
 logger = structlog.get_logger()
 
+# An index on the IS-A closure's distance column, which only exists while the closure is
+# being built
+CLOSURE_DISTANCE_INDEX = "snomedct_isaclosure_distance_build"
+
 
 def import_data(
     release_dir,
@@ -63,6 +74,8 @@ def import_release(
                 release_subdirs = list(release_dir.glob(release_subdir_pattern))
                 assert len(release_subdirs) == 1
                 import_models(release_subdirs[0], connection)
+            build_is_a_closure(connection.cursor())
+            build_description_search_index(connection.cursor())
             connection.commit()
             connection.close
 
@@ -97,6 +110,84 @@ def import_models(release_subdir, connection):
     )
 
 
+def build_is_a_closure(cursor):
+    """Materialise the transitive closure of active IS-A relationships.
+
+    The closure is built breadth-first, one level of the hierarchy at a time, so that
+    each (ancestor, descendant) pair is first inserted with its shortest distance and
+    later (longer) paths to the same ancestor are ignored.  Each level is found from the
+    pairs at the previous distance, using an index on distance that only exists while
+    the closure is built, so that no level scans the whole table.
+
+    This must be run after all relationships have been imported, since relationships
+    from later releases can deactivate relationships from earlier ones.
+    """
+
+    closure_table = IsAClosure._meta.db_table
+    concept_table = Concept._meta.db_table
+    relationship_table = Relationship._meta.db_table
+
+    logger.info("Building IS-A closure")
+    cursor.execute(f"DELETE FROM {closure_table}")
+    cursor.execute(f"DROP INDEX IF EXISTS {CLOSURE_DISTANCE_INDEX}")
+    cursor.execute(
+        f"""
+        INSERT INTO {closure_table} (ancestor_id, descendant_id, distance)
+        SELECT id, id, 0 FROM {concept_table}
+        """
+    )
+    cursor.execute(
+        f"CREATE INDEX {CLOSURE_DISTANCE_INDEX} ON {closure_table} (distance)"
+    )
+
+    distance = 0
+    while True:
+        cursor.execute(
+            f"""
+            INSERT OR IGNORE INTO {closure_table} (ancestor_id, descendant_id, distance)
+            SELECT r.destination_id, c.descendant_id, {distance + 1}
+            FROM {closure_table} c INDEXED BY {CLOSURE_DISTANCE_INDEX}
+            INNER JOIN {relationship_table} r
+              ON r.source_id = c.ancestor_id
+            WHERE c.distance = {distance}
+              AND r.type_id = '{IS_A}'
+              AND r.active
+            """
+        )
+        if cursor.rowcount <= 0:
+            break
+        distance += 1
+
+    cursor.execute(f"DROP INDEX {CLOSURE_DISTANCE_INDEX}")
+    logger.info("Built IS-A closure", max_distance=distance)
+
+
+def build_description_search_index(cursor):
+    """(Re)build the full-text index of the terms of active descriptions.
+
+    Like build_is_a_closure(), this must be run after all descriptions have been
+    imported.
+    """
+
+    description_table = Description._meta.db_table
+
+    logger.info("Building description search index")
+    cursor.execute(f"DROP TABLE IF EXISTS {DESCRIPTION_SEARCH_TABLE}")
+    cursor.execute(
+        f"""
+        CREATE VIRTUAL TABLE {DESCRIPTION_SEARCH_TABLE}
+        USING fts5(term, concept_id UNINDEXED, tokenize = 'trigram')
+        """
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO {DESCRIPTION_SEARCH_TABLE} (term, concept_id)
+        SELECT term, concept_id FROM {description_table} WHERE active
+        """
+    )
+    logger.info("Built description search index")
+
+
 def parse_date(datestr):
     return datetime.date(int(datestr[:4]), int(datestr[4:6]), int(datestr[6:]))
 
@@ -0,0 +1,34 @@
+"""
+Apply either a specific, or all pending migrations for the `snomedct` app to every release
+database
+"""
+
+from typing import Any
+
+from django.core.management import BaseCommand, call_command
+from django.core.management.base import CommandParser
+
+from coding_systems.versioning.models import (
+    CodingSystemRelease,
+    update_coding_system_database_connections,
+)
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("migration_name", nargs="?")
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        update_coding_system_database_connections()
+        migrate_args = ["snomedct"]
+        if options["migration_name"]:
+            migrate_args.append(options["migration_name"])
+        for release in CodingSystemRelease.objects.filter(coding_system="snomedct"):
+            call_command(
+                "migrate",
+                *migrate_args,
+                "--database",
+                release.database_alias,
+            )
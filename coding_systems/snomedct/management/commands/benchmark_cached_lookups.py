@@ -0,0 +1,76 @@
+"""
+Benchmark the "coding_systems" cache used by CodingSystem lookups (see
+BuilderCompatibleCodingSystem.cached_lookup) against querying the release database
+directly.
+
+For each batch size, a random batch of concepts is looked up with lookup_names(): once
+directly, once through the cache when it is empty (so that the result is also stored),
+and then repeatedly through the cache, as happens each time a version's pages are
+viewed.  The results are checked to be identical.
+
+./manage.py benchmark_cached_lookups --database-alias snomedct_3940_20240925
+"""
+
+import random
+from time import perf_counter
+
+from django.core.cache import caches
+from django.core.management import BaseCommand, CommandError
+
+from coding_systems.snomedct.coding_system import CodingSystem
+from coding_systems.snomedct.models import Concept
+from coding_systems.versioning.models import update_coding_system_database_connections
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database-alias")
+        parser.add_argument(
+            "--batch-sizes", type=int, nargs="+", default=[100, 1_000, 10_000]
+        )
+        parser.add_argument("--repeats", type=int, default=10)
+
+    def handle(self, database_alias, batch_sizes, repeats, **kwargs):
+        update_coding_system_database_connections()
+        coding_system = CodingSystem.get_by_release_or_most_recent(database_alias)
+        if not coding_system.is_cacheable:
+            raise CommandError(f"{coding_system.database_alias} is not ready to use")
+
+        all_codes = list(
+            Concept.objects.using(coding_system.database_alias).values_list(
+                "id", flat=True
+            )
+        )
+        cache = caches["coding_systems"]
+
+        for batch_size in batch_sizes:
+            codes = random.sample(all_codes, min(batch_size, len(all_codes)))
+
+            query_time = 0
+            for _ in range(repeats):
+                start = perf_counter()
+                expected = CodingSystem.lookup_names.__wrapped__(coding_system, codes)
+                query_time += perf_counter() - start
+
+            cache.clear()
+            start = perf_counter()
+            found = coding_system.lookup_names(codes)
+            miss_time = perf_counter() - start
+
+            hit_time = 0
+            for _ in range(repeats):
+                start = perf_counter()
+                found = coding_system.lookup_names(codes)
+                hit_time += perf_counter() - start
+
+            if found != expected:
+                raise CommandError(f"Results differ for a batch of {len(codes)} codes")
+
+            self.stdout.write(
+                f"{coding_system.database_alias}: {len(codes)} codes: "
+                f"query {query_time / repeats * 1000:.2f}ms, "
+                f"cache miss {miss_time * 1000:.2f}ms, "
+                f"cache hit {hit_time / repeats * 1000:.2f}ms"
+            )
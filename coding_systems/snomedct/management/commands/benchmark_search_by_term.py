@@ -0,0 +1,109 @@
+"""
+Benchmark CodingSystem.search_by_term, which uses the full-text description index,
+against searching the description table directly, as search_by_term used to.
+
+Each term is searched for with both, and the results are checked to be identical.  By
+default the most recent release is used, with a corpus of common clinical search
+terms.  Alternatively, pass a file with one search term per line.
+
+./manage.py benchmark_search_by_term --database-alias snomedct_3940_20240925
+"""
+
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+
+from coding_systems.snomedct.coding_system import CodingSystem
+from coding_systems.snomedct.models import Concept
+from coding_systems.versioning.models import update_coding_system_database_connections
+
+
+SEARCH_TERMS = [
+    "asthma",
+    "diabetes",
+    "type 2 diabetes",
+    "hypertension",
+    "copd",
+    "chronic obstructive",
+    "heart failure",
+    "atrial fibrillation",
+    "myocardial infarction",
+    "stroke",
+    "transient ischaemic",
+    "dementia",
+    "depression",
+    "anxiety",
+    "schizophrenia",
+    "bipolar",
+    "epilepsy",
+    "chronic kidney disease",
+    "ckd",
+    "cancer",
+    "malignant neoplasm",
+    "lymphoma",
+    "leukaemia",
+    "rheumatoid arthritis",
+    "psoriasis",
+    "crohn",
+    "ulcerative colitis",
+    "hiv",
+    "covid",
+    "coronavirus",
+    "pneumonia",
+    "influenza",
+    "pregnan",
+    "smoker",
+    "alcohol",
+    "obesity",
+    "body mass index",
+    "learning disability",
+    "osteoporosis",
+    "fracture",
+    "tennis elbow",
+    "frailty",
+    "sepsis",
+    "vaccination",
+    "ethnic",
+]
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database-alias")
+        parser.add_argument("--terms-file")
+
+    def handle(self, database_alias, terms_file, **kwargs):
+        update_coding_system_database_connections()
+        coding_system = CodingSystem.get_by_release_or_most_recent(database_alias)
+
+        if terms_file:
+            with open(terms_file) as f:
+                terms = [line.strip() for line in f if line.strip()]
+        else:
+            terms = SEARCH_TERMS
+
+        scan_time = 0
+        index_time = 0
+
+        for term in terms:
+            start = perf_counter()
+            expected = set(
+                Concept.objects.using(coding_system.database_alias)
+                .filter(descriptions__term__contains=term, descriptions__active=True)
+                .values_list("id", flat=True)
+            )
+            scan_time += perf_counter() - start
+
+            start = perf_counter()
+            found = coding_system.search_by_term(term)
+            index_time += perf_counter() - start
+
+            if found != expected:
+                raise CommandError(f"Results differ for '{term}'")
+
+        self.stdout.write(
+            f"{coding_system.database_alias}: {len(terms)} terms: "
+            f"description scan {scan_time:.3f}s, full-text index {index_time:.3f}s"
+        )
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_is_a_closure(apps, schema_editor):
+    # Release databases that were imported before the closure table existed need
+    # it populating from their relationships.  For a new release, the concept table
+    # is empty at this point and the closure is built at the end of the import.
+    #
+    # As in import_data.build_is_a_closure() at the time of this migration, the
+    # closure is built breadth-first, so that each pair is inserted with its shortest
+    # distance, using an index on distance that is dropped once the closure is built.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM snomedct_isaclosure")
+        cursor.execute("DROP INDEX IF EXISTS snomedct_isaclosure_distance_build")
+        cursor.execute(
+            """
+            INSERT INTO snomedct_isaclosure (ancestor_id, descendant_id, distance)
+            SELECT id, id, 0 FROM snomedct_concept
+            """
+        )
+        cursor.execute(
+            """
+            CREATE INDEX snomedct_isaclosure_distance_build
+            ON snomedct_isaclosure (distance)
+            """
+        )
+
+        distance = 0
+        while True:
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO snomedct_isaclosure
+                  (ancestor_id, descendant_id, distance)
+                SELECT r.destination_id, c.descendant_id, %s
+                FROM snomedct_isaclosure c
+                  INDEXED BY snomedct_isaclosure_distance_build
+                INNER JOIN snomedct_relationship r
+                  ON r.source_id = c.ancestor_id
+                WHERE c.distance = %s
+                  AND r.type_id = '116680003'
+                  AND r.active
+                """,
+                [distance + 1, distance],
+            )
+            if cursor.rowcount <= 0:
+                break
+            distance += 1
+
+        cursor.execute("DROP INDEX snomedct_isaclosure_distance_build")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomedct', '0005_alter_concept_sources'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IsAClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.IntegerField()),
+                ('ancestor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='descendant_closure', to='snomedct.concept')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_closure', to='snomedct.concept')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(
+            populate_is_a_closure,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:20
+
+from django.db import migrations
+
+
+def create_description_search_index(apps, schema_editor):
+    # Release databases that were imported before the search index existed need it
+    # building from their descriptions.  For a new release, the description table is
+    # empty at this point and the index is rebuilt at the end of the import.
+    #
+    # This is the same as import_data.build_description_search_index() at the time of
+    # this migration.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS snomedct_descriptionsearch")
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE snomedct_descriptionsearch
+            USING fts5(term, concept_id UNINDEXED, tokenize = 'trigram')
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO snomedct_descriptionsearch (term, concept_id)
+            SELECT term, concept_id FROM snomedct_description WHERE active
+            """
+        )
+
+
+def drop_description_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS snomedct_descriptionsearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomedct', '0006_isaclosure'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_description_search_index,
+            reverse_code=drop_description_search_index,
+        ),
+    ]
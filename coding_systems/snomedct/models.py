@@ -117,3 +117,38 @@ class Relationship(models.Model):
     modifier = models.ForeignKey(
         "Concept", on_delete=models.CASCADE, related_name="+", db_index=False
     )
+
+
+# The FTS5 table indexing the terms of active descriptions, which is used by
+# CodingSystem.search_by_term().  It uses the trigram tokenizer, so that it can be used
+# to find terms containing any substring (of at least three characters).  It is not a
+# Django model, since Django cannot manage virtual tables, and is built at import time
+# by import_data.build_description_search_index().
+DESCRIPTION_SEARCH_TABLE = "snomedct_descriptionsearch"
+
+
+class IsAClosure(models.Model):
+    """The transitive closure of the active IS-A relationships in a release.
+
+    There is one row for every (ancestor, descendant) pair, with distance being the
+    length of the shortest path between them.  Every concept is also recorded as its
+    own ancestor at distance 0, so that hierarchy queries starting from a set of codes
+    can be answered with a single join.
+
+    This is not part of the RF2 release, and is built at import time by
+    import_data.build_is_a_closure().
+    """
+
+    ancestor = models.ForeignKey(
+        "Concept",
+        on_delete=models.CASCADE,
+        related_name="descendant_closure",
+        db_index=False,
+    )
+    descendant = models.ForeignKey(
+        "Concept", on_delete=models.CASCADE, related_name="ancestor_closure"
+    )
+    distance = models.IntegerField()
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
@@ -0,0 +1,20 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from coding_systems.snomedct.management.commands.benchmark_search_by_term import (
+    SEARCH_TERMS,
+)
+
+
+def test_benchmark_search_by_term(snomedct_data):
+    out = StringIO()
+    call_command(
+        "benchmark_search_by_term",
+        database_alias="snomedct_test_20200101",
+        stdout=out,
+    )
+
+    assert out.getvalue().startswith(
+        f"snomedct_test_20200101: {len(SEARCH_TERMS)} terms: "
+    )
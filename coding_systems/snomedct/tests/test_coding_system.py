@@ -1,6 +1,7 @@
 import pytest
 
 from coding_systems.snomedct.coding_system import CodingSystem
+from coding_systems.snomedct.models import IS_A, Concept, Relationship
 
 
 @pytest.fixture
@@ -46,3 +47,58 @@ def test_matching_codes(snomedct_data, coding_system):
         "705115006",
         "239964003",
     }
+
+
+def _walk_relationships(coding_system, codes, key, other):
+    # Build the expected relationships by walking active IS-A relationships directly
+    relationships = Relationship.objects.using(coding_system.database_alias).filter(
+        type_id=IS_A, active=True
+    )
+    edges = set(relationships.values_list("destination_id", "source_id"))
+    found = set()
+    todo = set(codes)
+    while todo:
+        code = todo.pop()
+        for edge in edges:
+            if edge[key] == code and edge not in found:
+                found.add(edge)
+                todo.add(edge[other])
+    return found
+
+
+def test_ancestor_relationships(snomedct_data, coding_system):
+    # Lateral epicondylitis, and an inactive concept with no relationships
+    codes = ["202855006", "156659008"]
+    expected = _walk_relationships(coding_system, codes, key=1, other=0)
+
+    assert expected
+    assert set(coding_system.ancestor_relationships(codes)) == expected
+
+
+def test_descendant_relationships(snomedct_data, coding_system):
+    # Disorder of elbow
+    codes = ["128133004"]
+    expected = _walk_relationships(coding_system, codes, key=0, other=1)
+
+    assert expected
+    assert set(coding_system.descendant_relationships(codes)) == expected
+
+
+@pytest.mark.parametrize(
+    "term",
+    ["elbow", "ELBOW", "Tennis", "epicondylitis", "lesion of", "ow", "x", "%", "_"],
+)
+def test_search_by_term(snomedct_data, coding_system, term):
+    # The full-text index gives the same results as searching descriptions directly
+    expected = set(
+        Concept.objects.using(coding_system.database_alias)
+        .filter(descriptions__term__contains=term, descriptions__active=True)
+        .values_list("id", flat=True)
+    )
+
+    assert coding_system.search_by_term(term) == expected
+
+
+def test_concept_changes_with_same_release(snomedct_data, coding_system):
+    changes = coding_system.concept_changes(coding_system)
+    assert not changes.codes
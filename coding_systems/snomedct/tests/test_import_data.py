@@ -7,7 +7,7 @@ from django.conf import settings
 from coding_systems.base.tests.dynamic_db_classes import DynamicDatabaseTestCase
 from coding_systems.conftest import mock_migrate_coding_system
 from coding_systems.snomedct.import_data import import_data
-from coding_systems.snomedct.models import Concept
+from coding_systems.snomedct.models import Concept, IsAClosure
 from coding_systems.versioning.models import CodingSystemRelease
 
 from .conftest import MOCK_SNOMEDCT_IMPORT_DATA_PATH
@@ -63,3 +63,19 @@ class TestImportData(DynamicDatabaseTestCase):
             "312421000119107",
             "15636001000119108",
         }
+
+        # The IS-A closure has been built, with each concept as its own ancestor
+        closure = IsAClosure.objects.using(cs_release.database_alias)
+        assert closure.filter(distance=0).count() == 6
+        assert set(
+            closure.filter(descendant_id="15636001000119108").values_list(
+                "ancestor_id", "distance"
+            )
+        ) == {
+            ("15636001000119108", 0),
+            ("312411000119100", 1),
+            ("312421000119107", 1),
+            ("202855006", 2),
+            ("439656005", 3),
+            ("3723001", 4),
+        }
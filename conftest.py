@@ -1,4 +1,5 @@
 import pytest
+from django.core.cache import caches
 from django.db import connections
 from django.test import TestCase
 from opentelemetry import trace
@@ -8,6 +9,9 @@ from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import SimpleSpanProcessor
 from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
 
+from codelists.diff import diff_cache
+from codelists.hierarchy_cache import hierarchy_cache
+from codelists.render_cache import render_cache
 from services.tracing import response_hook
 
 
@@ -96,6 +100,24 @@ def reset_connections():
         del connections.databases[db]
 
 
+@pytest.fixture(autouse=True)
+def clear_hierarchy_cache():
+    """Hierarchies, page data and diffs are cached in memory by version id, and ids are
+    reused between tests, so clear the caches after each test."""
+    yield
+    hierarchy_cache.clear()
+    render_cache.clear()
+    diff_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_coding_systems_cache():
+    """Coding system lookups are cached by database alias, but the contents of test
+    coding system databases vary between tests, so clear the cache after each test."""
+    yield
+    caches["coding_systems"].clear()
+
+
 @pytest.fixture(autouse=True)
 def fast_password_hasher(settings):
     """Use a faster password hashing algorithm when running tests, as the test
@@ -1,10 +1,10 @@
 import csv
 import gzip
 
-from django.db import transaction
+from django.db import connection, transaction
 from tqdm import tqdm
 
-from .models import Mapping
+from .models import Mapping, MappingClosure
 
 
 def import_data(filename):
@@ -17,3 +17,36 @@ def import_data(filename):
     with transaction.atomic():
         for vpid, vpidprev in tqdm(load_records(), desc="Loading records"):
             Mapping.objects.get_or_create(id=vpid, vpidprev=vpidprev)
+        build_mapping_closure()
+
+
+@transaction.atomic
+def build_mapping_closure():
+    """(Re)build MappingClosure from all mappings.
+
+    Chains of mappings are followed with a recursive query.  UNION discards pairs that
+    have already been found, so this terminates even if the mappings contain a cycle.
+    """
+
+    closure_table = MappingClosure._meta.db_table
+    mapping_table = Mapping._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {closure_table}")
+        cursor.execute(
+            f"""
+            INSERT INTO {closure_table} (vpid, vpidprev)
+            WITH RECURSIVE closure(vpid, vpidprev) AS (
+              SELECT id, vpidprev FROM {mapping_table} WHERE id != vpidprev
+
+              UNION
+
+              SELECT c.vpid, m.vpidprev
+              FROM closure c
+              INNER JOIN {mapping_table} m
+                ON m.id = c.vpidprev
+              WHERE m.id != m.vpidprev
+            )
+            SELECT vpid, vpidprev FROM closure WHERE vpid != vpidprev
+            """
+        )
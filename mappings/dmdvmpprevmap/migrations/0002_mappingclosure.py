@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+def populate_mapping_closure(apps, schema_editor):
+    # This is the same as import_data.build_mapping_closure() at the time of this
+    # migration.  Chains of mappings are followed with a recursive query, and UNION
+    # discards pairs that have already been found, so this terminates even if the
+    # mappings contain a cycle.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM dmdvmpprevmap_mappingclosure")
+        cursor.execute(
+            """
+            INSERT INTO dmdvmpprevmap_mappingclosure (vpid, vpidprev)
+            WITH RECURSIVE closure(vpid, vpidprev) AS (
+              SELECT id, vpidprev FROM dmdvmpprevmap_mapping WHERE id != vpidprev
+
+              UNION
+
+              SELECT c.vpid, m.vpidprev
+              FROM closure c
+              INNER JOIN dmdvmpprevmap_mapping m
+                ON m.id = c.vpidprev
+              WHERE m.id != m.vpidprev
+            )
+            SELECT vpid, vpidprev FROM closure WHERE vpid != vpidprev
+            """
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dmdvmpprevmap', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MappingClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vpid', models.CharField(max_length=18)),
+                ('vpidprev', models.CharField(db_index=True, max_length=18)),
+            ],
+            options={
+                'unique_together': {('vpid', 'vpidprev')},
+            },
+        ),
+        migrations.RunPython(
+            populate_mapping_closure,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -4,3 +4,21 @@ from django.db import models
 class Mapping(models.Model):
     id = models.CharField(primary_key=True, max_length=18)
     vpidprev = models.CharField(max_length=18)
+
+
+class MappingClosure(models.Model):
+    """The transitive closure of the mappings from VMP ids to previous ids.
+
+    There is one row for every (vpid, vpidprev) pair where vpidprev was a previous id
+    of vpid, either directly or via a chain of mappings, so that the previous and
+    subsequent ids of a set of codes can be found with a single query.  Mappings from
+    an id to itself are ignored.
+
+    This is built by import_data.build_mapping_closure() whenever mappings are updated.
+    """
+
+    vpid = models.CharField(max_length=18)
+    vpidprev = models.CharField(max_length=18, db_index=True)
+
+    class Meta:
+        unique_together = ("vpid", "vpidprev")
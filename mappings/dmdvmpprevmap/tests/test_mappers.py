@@ -1,5 +1,6 @@
+from mappings.dmdvmpprevmap.import_data import build_mapping_closure
 from mappings.dmdvmpprevmap.mappers import vmp_ids_to_previous, vmpprev_full_mappings
-from mappings.dmdvmpprevmap.models import Mapping
+from mappings.dmdvmpprevmap.models import Mapping, MappingClosure
 
 
 def test_codes_to_previous_no_previous():
@@ -12,6 +13,7 @@ def test_codes_to_previous_with_retired_previous():
     # give two of the VMPs previous IDs that are only have one previous
     Mapping.objects.create(id="11", vpidprev="2")
     Mapping.objects.create(id="22", vpidprev="3")
+    build_mapping_closure()
 
     vmp_to_previous_tuples = vmp_ids_to_previous()
     assert vmp_to_previous_tuples == [
@@ -27,6 +29,7 @@ def test_codes_to_previous_with_chained_previous():
     Mapping.objects.create(id="1", vpidprev="0")
     Mapping.objects.create(id="2", vpidprev="1")
     Mapping.objects.create(id="3", vpidprev="2")
+    build_mapping_closure()
 
     vmp_to_previous_tuples = vmp_ids_to_previous()
     assert sorted(vmp_to_previous_tuples) == [
@@ -44,6 +47,7 @@ def test_codes_to_previous_with_self_previous():
     # Presumably this is an error; in any case, there's no need to include it in
     # the mapping
     Mapping.objects.create(id="1", vpidprev="1")
+    build_mapping_closure()
     vmp_to_previous_tuples = vmp_ids_to_previous()
     assert vmp_to_previous_tuples == []
 
@@ -59,6 +63,7 @@ def test_codes_to_previous_with_codes():
     Mapping.objects.create(id="4", vpidprev="3")
     # This mapping doesn't affect specified codes
     Mapping.objects.create(id="5", vpidprev="6")
+    build_mapping_closure()
 
     vmp_to_previous_tuples = vmpprev_full_mappings(codes=["1", "2"])
 
@@ -74,3 +79,23 @@ def test_codes_to_previous_with_codes():
         ("4", "1"),
         ("4", "2"),
     ]
+
+
+def test_codes_to_previous_with_cycle():
+    # A chain of mappings that leads back to its start doesn't prevent the closure
+    # from being built
+    Mapping.objects.create(id="1", vpidprev="2")
+    Mapping.objects.create(id="2", vpidprev="1")
+    build_mapping_closure()
+
+    vmp_to_previous_tuples = vmp_ids_to_previous()
+    assert vmp_to_previous_tuples == [("1", "2"), ("2", "1")]
+
+
+def test_build_mapping_closure_replaces_existing_closure():
+    Mapping.objects.create(id="1", vpidprev="0")
+    build_mapping_closure()
+    Mapping.objects.create(id="2", vpidprev="1")
+    build_mapping_closure()
+
+    assert MappingClosure.objects.count() == 3
@@ -3,19 +3,47 @@ from io import StringIO
 
 
 def csv_data_to_rows(csv_data):
-    return list(csv.reader(StringIO(csv_data)))
+    return list(iter_csv_data_rows(csv_data))
+
+
+def iter_csv_data_rows(csv_data):
+    """Yield the rows of CSV data, one at a time."""
+
+    return csv.reader(StringIO(csv_data))
 
 
 def rows_to_csv_data(rows):
+    return "".join(iter_csv_data(rows))
+
+
+def dict_rows_to_csv_data(headers, rows):
+    return "".join(iter_dict_rows_csv_data(headers, rows))
+
+
+def iter_csv_data(rows):
+    """Yield the CSV data for rows, one line at a time."""
+
     buf = StringIO()
     writer = csv.writer(buf)
-    writer.writerows(rows)
-    return buf.getvalue()
+    for row in rows:
+        writer.writerow(row)
+        yield _flush(buf)
 
 
-def dict_rows_to_csv_data(headers, rows):
+def iter_dict_rows_csv_data(headers, rows):
+    """Yield the CSV data for a header row and rows of dicts, one line at a time."""
+
     buf = StringIO()
     writer = csv.DictWriter(buf, headers)
     writer.writeheader()
-    writer.writerows(rows)
-    return buf.getvalue()
+    yield _flush(buf)
+    for row in rows:
+        writer.writerow(row)
+        yield _flush(buf)
+
+
+def _flush(buf):
+    value = buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+    return value
@@ -1,8 +1,18 @@
+import json
+
 from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.expressions import RawSQL
 
 from codelists.coding_systems import CODING_SYSTEMS
 
 
+# SQLite limits the number of parameters in a query (to 999 before 3.32, and 32766
+# since), and parsing a query with a very long IN list is slow.  Beyond this many
+# values, in_values() and in_values_sql() pass the values as a single JSON array
+# parameter, which is expanded with SQLite's json_each table-valued function.
+MAX_IN_PARAMS = 500
+
+
 def query(sql, params=None, database=None):
     database = database or DEFAULT_DB_ALIAS
     with connections[database].cursor() as c:
@@ -10,6 +20,99 @@ def query(sql, params=None, database=None):
         return c.fetchall()
 
 
+def in_values_sql(values):
+    """Return (sql, params) for matching any of the given values in raw SQL, where sql
+    is to be used as `column IN ({sql})`.
+
+    For a small number of values, sql is a list of placeholders.  For a large number, it
+    is a subquery selecting the values from a single JSON parameter.
+    """
+
+    values = list(values)
+    if len(values) <= MAX_IN_PARAMS:
+        return ", ".join(["%s"] * len(values)), values
+    return "SELECT value FROM json_each(%s)", [json.dumps(values)]
+
+
+def in_values(values):
+    """Return the right-hand side of an `__in` filter for matching any of the given
+    values.  See in_values_sql()."""
+
+    values = list(values)
+    if len(values) <= MAX_IN_PARAMS:
+        return values
+    return RawSQL(*in_values_sql(values))
+
+
+def like_contains_sql(column, term, database):
+    """Return (sql, params) for a WHERE clause matching rows whose column contains term,
+    in the same way as Django's `contains` and `icontains` lookups do (that is, with
+    SQLite's LIKE, which is case-insensitive for ASCII characters only)."""
+
+    pattern = connections[database].ops.prep_for_like_query(term)
+    return f"{column} LIKE %s ESCAPE '\\'", [f"%{pattern}%"]
+
+
+def fts_phrase(term):
+    """Return the full-text query for rows of an FTS5 table with the trigram tokenizer
+    that contain term, or None if the index can't find it.
+
+    A quoted string is matched as a phrase, ie a substring.  The trigram tokenizer can
+    only find substrings of three or more characters.
+    """
+
+    if len(term) < 3:
+        return None
+    return '"' + term.replace('"', '""') + '"'
+
+
+def fts_contains_sql(column, term, database):
+    """Return (sql, params) for a WHERE clause matching rows of an FTS5 table with the
+    trigram tokenizer whose column contains term.
+
+    This matches in the same way as like_contains_sql().  The full-text index is used to
+    find candidate rows, which are then filtered with LIKE, since FTS5 can't use the
+    index for a LIKE with an ESCAPE clause.  Terms that the index can't find (see
+    fts_phrase()) are matched with LIKE alone.
+    """
+
+    sql, params = like_contains_sql(column, term, database)
+    phrase = fts_phrase(term)
+    if phrase is not None:
+        sql = f"{column} MATCH %s AND {sql}"
+        params.insert(0, phrase)
+    return sql, params
+
+
+def iter_changed_rows(sql, previous_database, database):
+    """Yield (added, row) for each row that sql returns from only one of two databases,
+    where added is True if row is returned from database, and False if it is returned
+    from previous_database.
+
+    sql must return distinct rows in sorted order, with no NULLs, so that the results
+    can be compared without loading either of them into memory.
+    """
+
+    with (
+        connections[previous_database].cursor() as previous_cursor,
+        connections[database].cursor() as cursor,
+    ):
+        previous_cursor.execute(sql)
+        cursor.execute(sql)
+        previous_row = previous_cursor.fetchone()
+        row = cursor.fetchone()
+        while previous_row is not None or row is not None:
+            if row is None or (previous_row is not None and previous_row < row):
+                yield False, previous_row
+                previous_row = previous_cursor.fetchone()
+            elif previous_row is None or row < previous_row:
+                yield True, row
+                row = cursor.fetchone()
+            else:
+                previous_row = previous_cursor.fetchone()
+                row = cursor.fetchone()
+
+
 class CodingSystemReleaseRouter:
     """
     A router to ensure coding system models always use a named release database.
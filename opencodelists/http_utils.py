@@ -0,0 +1,107 @@
+"""Helpers for streaming large responses, such as CSV downloads, with bounded memory.
+
+The data for a response is produced by a generator of strings.  The strings are
+collected into chunks of about CHUNK_SIZE bytes, which are compressed as they are
+produced if the client accepts a content encoding that we support.  The decoded bytes
+of the response are the same whichever encoding is used.
+"""
+
+import zlib
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+
+CHUNK_SIZE = 64 * 1024
+
+# The content encodings that we can compress responses with, in order of preference
+SUPPORTED_ENCODINGS = ["gzip"]
+
+
+def choose_content_encoding(request):
+    """Return the supported content encoding that the request's Accept-Encoding
+    header gives the highest quality value, or None if it accepts none of them.
+
+    Encodings with equal quality values are chosen in order of our preference.
+    """
+
+    qualities = {}
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        encoding, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if encoding:
+            qualities[encoding.lower()] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def iter_chunks(strings, size=CHUNK_SIZE):
+    """Yield the strings encoded as UTF-8, collected into chunks of about size
+    bytes."""
+
+    pending = []
+    pending_size = 0
+    for string in strings:
+        data = string.encode("utf8")
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= size:
+            yield b"".join(pending)
+            pending = []
+            pending_size = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def iter_slices(data, size=CHUNK_SIZE):
+    """Yield consecutive slices of a string, so that a string that has already been
+    built can be streamed without encoding all of it at once."""
+
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def compress_chunks(chunks, encoding):
+    """Yield chunks of bytes compressed with the given content encoding."""
+
+    if encoding == "gzip":
+        # wbits=31 writes a gzip header and trailer.  The header's mtime is zero, so
+        # the compressed bytes are the same for every request for the same data.
+        compressor = zlib.compressobj(wbits=31)
+    else:
+        raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+def streaming_csv_response(request, strings, filename):
+    """Return a response that streams the CSV data produced by strings as an attachment
+    with the given filename, compressed if the client accepts it."""
+
+    chunks = iter_chunks(strings)
+    encoding = choose_content_encoding(request)
+    if encoding:
+        chunks = compress_chunks(chunks, encoding)
+
+    response = StreamingHttpResponse(chunks, content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
@@ -2,7 +2,13 @@ import sys
 
 from django.conf import settings
 from django.core.management import BaseCommand, call_command
+from django.db import connections
 
+from coding_systems.dmd.import_data import build_search_index
+from coding_systems.snomedct.import_data import (
+    build_description_search_index,
+    build_is_a_closure,
+)
 from coding_systems.versioning.models import (
     CodingSystemRelease,
     build_db_path,
@@ -75,6 +81,10 @@ class Command(BaseCommand):
             database="snomedct_test_20200101",
         )
 
+        with connections["snomedct_test_20200101"].cursor() as cursor:
+            build_is_a_closure(cursor)
+            build_description_search_index(cursor)
+
         # migrate dmd test db and load test fixture
         call_command("migrate", "dmd", database="dmd_test_20200101")
 
@@ -84,6 +94,9 @@ class Command(BaseCommand):
             database="dmd_test_20200101",
         )
 
+        with connections["dmd_test_20200101"].cursor() as cursor:
+            build_search_index(cursor)
+
         # migrate bnf test db and load test fixture
         call_command("migrate", "bnf", database="bnf_test_20200101")
 
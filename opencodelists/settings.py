@@ -227,8 +227,68 @@ DATABASES = {
 DATABASE_DIR = Path(os.environ.get("DATABASE_DIR", default=BASE_DIR))
 # location of sqlite files e.g. /storage/
 CODING_SYSTEMS_DATABASE_DIR = DATABASE_DIR / "coding_systems"
+
+# Load cached hierarchies into the compact, integer-indexed CompactHierarchy rather
+# than the dict-of-sets Hierarchy.  See codelists/hierarchy.py.
+COMPACT_HIERARCHIES = os.environ.get("COMPACT_HIERARCHIES", default="False") == "True"
+
+# The number of parsed hierarchies each process keeps in memory.  See
+# codelists/hierarchy_cache.py.  Most codelists' hierarchies take well under 1MB, but
+# the hierarchy of a codelist with 100,000 concepts takes around 50MB (15MB with
+# COMPACT_HIERARCHIES), before its memo caches, so a full cache can take several
+# hundred MB in each gunicorn worker.  A size of zero disables the cache.
+HIERARCHY_CACHE_SIZE = int(os.environ.get("HIERARCHY_CACHE_SIZE", default="8"))
+
+# The number of versions whose page data each process keeps in memory.  See
+# codelists/render_cache.py.  An entry holds a version's tree, search results and table,
+# which take a few tens of MB for a codelist with 100,000 concepts.
+RENDER_CACHE_SIZE = int(os.environ.get("RENDER_CACHE_SIZE", default="8"))
+
+# The number of diffs between pairs of versions each process keeps in memory.  See
+# codelists/diff.py.  An entry holds the codes of both versions and summaries of them,
+# which take a few tens of MB for codelists with 100,000 concepts.
+DIFF_CACHE_SIZE = int(os.environ.get("DIFF_CACHE_SIZE", default="8"))
+
+# The number of processes used to refresh the cached download data of dm+d codelist
+# versions after a new dm+d release is imported.  See coding_systems/dmd/import_data.py.
+DMD_DOWNLOAD_DATA_WORKERS = int(
+    os.environ.get("DMD_DOWNLOAD_DATA_WORKERS", default="1")
+)
+
+# The number of processes used to check the compatibility of codelist versions with a
+# newly imported coding system release.  See coding_systems/base/import_data_utils.py.
+COMPATIBILITY_CHECK_WORKERS = int(
+    os.environ.get("COMPATIBILITY_CHECK_WORKERS", default="1")
+)
+
 DATABASE_ROUTERS = ["opencodelists.db_utils.CodingSystemReleaseRouter"]
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+#
+# The "coding_systems" cache holds the results of lookups (names, synonyms, etc) of
+# batches of codes in coding system releases, which never change once they are ready to
+# use.  See coding_systems/base/coding_system_base.py.
+#
+# Each process has its own cache, of at most CODING_SYSTEMS_CACHE_SIZE entries.  An
+# entry holds the result of looking up one batch of codes, such as a version's codes, so
+# its size grows with the batch: tens of KB for a typical codelist, and a few MB for the
+# largest.  A size of zero disables the cache.
+CODING_SYSTEMS_CACHE_SIZE = int(
+    os.environ.get("CODING_SYSTEMS_CACHE_SIZE", default="256")
+)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "coding_systems": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "coding_systems",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": max(CODING_SYSTEMS_CACHE_SIZE, 1)},
+    },
+}
+
 # Default type for auto-created primary keys
 # https://docs.djangoproject.com/en/3.2/releases/3.2/#customizing-type-of-auto-created-primary-keys
 
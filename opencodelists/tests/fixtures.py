@@ -108,6 +108,7 @@ from pathlib import Path
 import pytest
 from django.conf import settings
 from django.core.management import call_command
+from django.db import connections
 from django.db.models import Model
 
 from builder.actions import create_search, save, update_code_statuses
@@ -121,9 +122,16 @@ from codelists.actions import (
     export_to_builder,
 )
 from codelists.coding_systems import CODING_SYSTEMS, most_recent_database_alias
+from codelists.listing import refresh_listing
 from codelists.models import Status
 from codelists.search import do_search
+from codelists.search_index import refresh_search_index
 from coding_systems.base.coding_system_base import BuilderCompatibleCodingSystem
+from coding_systems.dmd.import_data import build_search_index
+from coding_systems.snomedct.import_data import (
+    build_description_search_index,
+    build_is_a_closure,
+)
 from coding_systems.versioning.models import CodingSystemRelease, ReleaseState
 from opencodelists.actions import (
     add_user_to_organisation,
@@ -204,6 +212,11 @@ def snomedct_data(setup_coding_systems, django_db_setup, django_db_blocker):
             SNOMED_FIXTURES_PATH / "tennis-toe.snomedct_test_20200101.json",
             database="snomedct_test_20200101",
         )
+        # the IS-A closure and description search index are built at import time, so
+        # must be rebuilt from the relationships and descriptions in the fixtures
+        with connections["snomedct_test_20200101"].cursor() as cursor:
+            build_is_a_closure(cursor)
+            build_description_search_index(cursor)
 
 
 @pytest.fixture(scope=get_fixture_scope)
@@ -215,6 +228,10 @@ def dmd_data(setup_coding_systems, django_db_setup, django_db_blocker):
             DMD_FIXTURES_PATH / "asthma-medication.dmd_test_20200101.json",
             database="dmd_test_20200101",
         )
+        # the search index is built at import time, so must be rebuilt from the
+        # products and ingredients in the fixtures
+        with connections["dmd_test_20200101"].cursor() as cursor:
+            build_search_index(cursor)
 
 
 @pytest.fixture(scope=get_fixture_scope)
@@ -786,6 +803,12 @@ def build_fixtures():
 
     add_experimental_coding_system()
 
+    # Some fixtures are changed without actions, so the listing and the search index are
+    # refreshed as they are in production by the refresh_codelists_listing and
+    # refresh_codelists_search_index commands.
+    refresh_listing()
+    refresh_search_index()
+
     return locals()
 
 
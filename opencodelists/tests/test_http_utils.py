@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+from django.test import RequestFactory
+
+from opencodelists.http_utils import (
+    choose_content_encoding,
+    compress_chunks,
+    iter_chunks,
+    iter_slices,
+    streaming_csv_response,
+)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("GZIP", "gzip"),
+        ("gzip, deflate, br", "gzip"),
+        ("gzip;q=0", None),
+        ("gzip;q=0.5, *;q=0", "gzip"),
+        ("*", "gzip"),
+        ("zstd", None),
+        ("zstd, gzip;q=0.5", "gzip"),
+        ("gzip;q=nonsense", None),
+    ],
+)
+def test_choose_content_encoding(accept_encoding, expected):
+    request = RequestFactory().get("/", headers={"Accept-Encoding": accept_encoding})
+    assert choose_content_encoding(request) == expected
+
+
+def test_iter_chunks():
+    strings = ["abc", "dé", "f", "ghij"]
+    chunks = list(iter_chunks(strings, size=4))
+    assert chunks == [b"abcd\xc3\xa9", b"fghij"]
+
+
+def test_iter_slices():
+    assert list(iter_slices("abcdefg", size=3)) == ["abc", "def", "g"]
+    assert list(iter_slices("", size=3)) == []
+
+
+def test_compress_chunks_gzip():
+    chunks = [b"code,term\r\n", b"1234,Asthma\r\n" * 1000]
+    compressed = b"".join(compress_chunks(chunks, "gzip"))
+    assert gzip.decompress(compressed) == b"".join(chunks)
+
+    # the compressed data is the same each time
+    assert b"".join(compress_chunks(chunks, "gzip")) == compressed
+
+
+def test_compress_chunks_unsupported():
+    with pytest.raises(ValueError):
+        list(compress_chunks([b"data"], "zstd"))
+
+
+def test_streaming_csv_response():
+    request = RequestFactory().get("/", headers={"Accept-Encoding": "gzip"})
+    rsp = streaming_csv_response(request, iter(["a,b\r\n", "1,2\r\n"]), "data.csv")
+
+    assert rsp["Content-Type"] == "text/csv"
+    assert rsp["Content-Disposition"] == 'attachment; filename="data.csv"'
+    assert rsp["Content-Encoding"] == "gzip"
+    assert rsp["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(rsp.getvalue()) == b"a,b\r\n1,2\r\n"